@@ -0,0 +1,225 @@
+import asyncio
+
+from engine_events import EVENT_JOB_END
+from playlist_expander import PlaylistExpander
+from progress_protocol import ProgressRateLimiter, parse_progress_line
+from retry_scheduler import FAILURE_UNKNOWN
+
+# Orquestrador alternativo sobre asyncio (modo de execução 'async').
+# Todos os subprocessos do yt-dlp são lidos por um único event loop, sem uma
+# thread bloqueada em readline() por job; os jobs são tarefas limitadas por
+# vagas (semáforo), tratadas na ordem em que terminam, e o botão de parar
+# cancela de uma vez as tarefas pendentes e as em andamento. Só existem tarefas
+# para a janela de submissão do motor: a lista de URLs é consumida aos poucos.
+
+STREAM_LIMIT = 1024 * 1024  # Linhas longas do yt-dlp (ex.: JSON) estouram o limite padrão de 64 KiB
+STOP_POLL_INTERVAL = 0.1
+
+
+class AsyncProcessHandle:
+    """Imita subprocess.Popen (poll/terminate) para DownloadEngine.stop(), que roda em outra thread."""
+
+    def __init__(self, process, loop):
+        self.process = process
+        self.loop = loop
+
+    def poll(self):
+        return self.process.returncode
+
+    def terminate(self):
+        self.loop.call_soon_threadsafe(self.terminate_now)
+
+    def terminate_now(self):
+        if self.process.returncode is None:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass
+
+
+class AsyncJobSlots:
+    """Vagas de jobs no event loop; segue o limite de engine.job_slots (ajustado pelo controle adaptativo)."""
+
+    def __init__(self, job_slots):
+        self.job_slots = job_slots
+        self.active = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            self.job_slots.waiting += 1
+            try:
+                while self.active >= self.job_slots.limit:
+                    try:
+                        # O limite pode subir em outra thread: reavalia periodicamente
+                        await asyncio.wait_for(self.condition.wait(), 0.5)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.job_slots.waiting -= 1
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+class AsyncOrchestrator:
+    """Agenda o lote do DownloadEngine como tarefas asyncio (bloqueia a thread chamadora até o fim)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.loop = None
+        self.slots = None
+        self.window = None
+        self.tasks = set()
+
+    def run(self, url_list):
+        asyncio.run(self.main(url_list))
+
+    async def main(self, url_list):
+        engine = self.engine
+        self.loop = asyncio.get_running_loop()
+        self.slots = AsyncJobSlots(engine.job_slots)
+        self.window = asyncio.Semaphore(engine.submit_window)
+        watcher = self.loop.create_task(self.watch_stop())
+        # Retentativas: a thread do agendador espera a tarefa ser criada no loop antes de seguir
+        engine.submit_job = lambda url: asyncio.run_coroutine_threadsafe(self.spawn_later(url), self.loop).result()
+        try:
+            # A expansão continua na sua thread; cada URL pronta vira uma tarefa
+            entries = iter(PlaylistExpander(engine, url_list).start())
+            seen_keys = set()
+            while True:
+                url = await self.loop.run_in_executor(None, next, entries, None)
+                if url is None:
+                    break
+                if engine.stop_event.is_set():
+                    continue # Só esvazia o que a expansão já tinha lido
+                if engine.admit(url, seen_keys):
+                    await self.window.acquire()
+                    self.spawn(url)
+                engine.update_total()
+            engine.update_total(final=True)
+            engine.report_admission()
+
+            # Resultados tratados conforme os jobs terminam, não na ordem de submissão
+            while self.tasks or not engine.retry_scheduler.idle():
+                if self.tasks:
+                    await asyncio.wait(set(self.tasks), return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(STOP_POLL_INTERVAL) # Só há retentativas aguardando o horário
+        finally:
+            watcher.cancel()
+
+    async def watch_stop(self):
+        """Ao sinal de parada, cancela todas as tarefas (aguardando vaga ou em execução)."""
+        while not self.engine.stop_event.is_set():
+            await asyncio.sleep(STOP_POLL_INTERVAL)
+        for task in list(self.tasks):
+            task.cancel()
+
+    def spawn(self, url):
+        task = self.loop.create_task(self.download_job(url))
+        self.tasks.add(task)
+        task.add_done_callback(self.reap)
+
+    async def spawn_later(self, url):
+        await self.window.acquire()
+        self.spawn(url)
+
+    def reap(self, task):
+        self.tasks.discard(task)
+        self.window.release()
+        if not task.cancelled() and task.exception() is not None:
+            self.engine.log_message(f"🚨 [ERRO NA TAREFA DE DOWNLOAD]: {task.exception()}", 'error')
+
+    # --- Jobs ---
+    async def download_job(self, url):
+        engine = self.engine
+        if engine.defer_for_cooldown(url):
+            return
+        await self.loop.run_in_executor(None, engine.wait_for_staging_space, url)
+        async with self.slots:
+            if engine.stop_event.is_set():
+                return # Parado enquanto aguardava vaga: a tarefa é descartada como as canceladas
+            if not engine.begin_job(url):
+                return
+
+            downloaded_files, collect_file = engine.file_collector(url)
+            handed_off = False
+            try:
+                cache_key, info_json = engine.lookup_metadata(url)
+                # Pode esperar uma fatia livre do orçamento: fora do event loop
+                await self.loop.run_in_executor(None, engine.allocate_bandwidth, url)
+                engine.update_downloading(+1)
+                try:
+                    return_code = await self.run_process(url, engine.build_command(url, cache_key, info_json),
+                                                         on_record=collect_file)
+                finally:
+                    engine.release_bandwidth(url)
+                    engine.update_downloading(-1)
+                engine.store_metadata(url, cache_key, info_json, return_code)
+                # A entrega à conversão pode bloquear com a fila cheia: fica fora do event loop. A thread
+                # segue mesmo se a tarefa for cancelada, então o JOB_END passa a ser dela (ou da conversão)
+                handed_off = True
+                await self.loop.run_in_executor(None, self.complete_job, url, return_code, downloaded_files)
+
+            except asyncio.CancelledError:
+                engine.log_message(f"🚫 [CANCELADO] Tarefa interrompida: {url[:40]}...", 'warn')
+                raise
+
+            except Exception as e:
+                engine.record_failure(url, FAILURE_UNKNOWN, str(e))
+                engine.record_result(url, False)
+                engine.log_message(f"🚨 [ERRO FATAL] Falha em {url[:50]}: {e}", 'error')
+
+            finally:
+                if not handed_off:
+                    engine.emit(EVENT_JOB_END, url)
+
+    def complete_job(self, url, return_code, downloaded_files):
+        """Fim do job na thread do executor: emite o JOB_END uma única vez, se não houve entrega à conversão."""
+        engine = self.engine
+        handed_off = False
+        try:
+            handed_off = engine.complete_download(url, return_code, downloaded_files)
+        except Exception as e:
+            engine.record_failure(url, FAILURE_UNKNOWN, str(e))
+            engine.record_result(url, False)
+            engine.log_message(f"🚨 [ERRO FATAL] Falha em {url[:50]}: {e}", 'error')
+        finally:
+            if not handed_off:
+                engine.emit(EVENT_JOB_END, url)
+
+    async def run_process(self, url, command, on_record=None):
+        """Equivalente assíncrono de DownloadEngine.run_process()."""
+        engine = self.engine
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT, limit=STREAM_LIMIT)
+        handle = AsyncProcessHandle(process, self.loop)
+        engine.active_processes[url] = handle
+        engine.process_spawned(url)
+        rate_limiter = ProgressRateLimiter(engine.max_progress_rate)
+        try:
+            while True:
+                raw_line = await process.stdout.readline()
+                if not raw_line:
+                    break
+                line = raw_line.decode('utf-8', errors='replace')
+                record = parse_progress_line(line)
+                if record is None:
+                    if line.strip():
+                        engine.observe_output(url, line)
+                        engine.log_message(line.rstrip(), 'process')
+                    continue
+                engine.handle_record(url, record, rate_limiter, on_record)
+            return await process.wait()
+        except asyncio.CancelledError:
+            handle.terminate_now()
+            await process.wait()
+            raise
+        finally:
+            if engine.active_processes.get(url) is handle:
+                del engine.active_processes[url]
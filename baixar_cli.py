@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from progress_protocol import DEFAULT_MAX_PROGRESS_RATE
+from warm_workers import DEFAULT_YTDLP_MODULE
+from download_index import DownloadIndex
+from batch_journal import find_resumable
+from concurrency_controller import (DEFAULT_MIN_JOBS, DEFAULT_MAX_JOBS, DEFAULT_MIN_FRAGMENTS,
+                                    DEFAULT_MAX_FRAGMENTS)
+from retry_scheduler import DEFAULT_MAX_RETRIES, DEFAULT_BASE_DELAY, DEFAULT_HOST_COOLDOWN
+from profiling_hook import PROFILE_MODES
+from url_source import UrlLines, UrlFileSource
+from metadata_cache import DEFAULT_CACHE_DIR, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+from staging_area import DEFAULT_STAGING_DIR
+from bandwidth_budget import parse_rate, parse_host_limit
+from work_queue import DEFAULT_ADDRESS, DEFAULT_PORT, DEFAULT_LEASE_TIMEOUT, parse_address
+from transcode_stage import DEFAULT_TRANSCODE_WORKERS, DEFAULT_HANDOFF_SIZE, DEFAULT_MP3_ENCODER, MP3_ENCODERS
+from download_engine import (DownloadEngine, DEFAULT_MAX_WORKERS, DEFAULT_CONCURRENT_FRAGMENTS,
+                             EXECUTION_SUBPROCESS, EXECUTION_WARM, EXECUTION_ASYNC, EXECUTION_REMOTE, EVENT_LOG, EVENT_PROGRESS)
+
+# Ponto de entrada de linha de comando (sem Tk).
+# Uso: python baixar_cli.py urls.txt -o downloads/
+# Cada evento do motor é escrito no stdout como uma linha JSON.
+
+
+def read_url_file(path):
+    """
+    Fonte de URLs (uma por linha; vazias e comentários '#' ignorados). Arquivos são lidos sob
+    demanda durante o lote; o stdin é lido de uma vez para que o diário permita a retomada.
+    """
+    if path == '-':
+        source = UrlLines(sys.stdin)
+        urls = list(source)
+        if source.describe_invalid():
+            print(source.describe_invalid(), file=sys.stderr)
+        return urls
+    return UrlFileSource(path)
+
+
+class JsonLinesReporter:
+    """Serializa os eventos do motor como JSON por linha (chamado de várias threads)."""
+
+    def __init__(self, stream=sys.stdout, verbose=False):
+        self.stream = stream
+        self.verbose = verbose
+        self.lock = threading.Lock()
+
+    def __call__(self, event_type, url, data):
+        # Linhas brutas do yt-dlp (nível 'process') só saem em modo verboso
+        if event_type == EVENT_LOG and data[1] == 'process' and not self.verbose:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event_type, 'url': url}
+        if event_type == EVENT_LOG:
+            record['message'], record['level'] = data
+        elif event_type == EVENT_PROGRESS:
+            record.update(data.to_dict())
+        elif isinstance(data, dict):
+            record.update(data)
+        elif data is not None:
+            record['data'] = data
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Downloader de MP3 em lote (modo sem interface).")
+    parser.add_argument('url_file', nargs='?', help="Arquivo com uma URL por linha ('-' para stdin).")
+    parser.add_argument('-o', '--output-dir', default='downloads', help="Diretório de saída dos MP3.")
+    parser.add_argument('-q', '--audio-quality', default='0', help="Qualidade do yt-dlp (0 = melhor, 10 = pior).")
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Downloads simultâneos.")
+    parser.add_argument('--fragments', type=int, default=DEFAULT_CONCURRENT_FRAGMENTS,
+                        help="Fragmentos concorrentes por download.")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Ajusta jobs e fragmentos conforme vazão, erros, throttling e CPU "
+                             "(-j/--fragments viram os valores iniciais).")
+    parser.add_argument('--min-jobs', type=int, default=DEFAULT_MIN_JOBS, help="Limite inferior de jobs (--adaptive).")
+    parser.add_argument('--max-jobs', type=int, default=DEFAULT_MAX_JOBS, help="Limite superior de jobs (--adaptive).")
+    parser.add_argument('--min-fragments', type=int, default=DEFAULT_MIN_FRAGMENTS,
+                        help="Limite inferior de fragmentos por job (--adaptive).")
+    parser.add_argument('--max-fragments', type=int, default=DEFAULT_MAX_FRAGMENTS,
+                        help="Limite superior de fragmentos por job (--adaptive).")
+    parser.add_argument('--retries', type=int, default=DEFAULT_MAX_RETRIES,
+                        help="Retentativas para falhas transitórias (throttling/rede); 0 desativa.")
+    parser.add_argument('--retry-delay', type=float, default=DEFAULT_BASE_DELAY,
+                        help="Atraso base (s) do backoff exponencial entre tentativas.")
+    parser.add_argument('--host-cooldown', type=float, default=DEFAULT_HOST_COOLDOWN,
+                        help="Pausa (s) de um host após throttling.")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Grava tempos por fase e estatísticas do lote (JSON + Prometheus) no diretório de saída.")
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None,
+                        help="Perfila a thread orquestradora (cProfile) ou as alocações (tracemalloc).")
+    parser.add_argument('--split-transcode', action='store_true',
+                        help="Separa download (pool de I/O) e conversão para MP3 (pool de CPU).")
+    parser.add_argument('--transcode-workers', type=int, default=DEFAULT_TRANSCODE_WORKERS,
+                        help="Conversões simultâneas no modo --split-transcode (padrão: núcleos).")
+    parser.add_argument('--handoff-size', type=int, default=DEFAULT_HANDOFF_SIZE,
+                        help="Tamanho máximo da fila entre download e conversão.")
+    parser.add_argument('--prefer-copy', action='store_true',
+                        help="Prefere fontes que já são MP3 com a qualidade pedida e as copia sem recodificar.")
+    parser.add_argument('--mp3-encoder', choices=MP3_ENCODERS, default=DEFAULT_MP3_ENCODER,
+                        help="Codificador MP3 do ffmpeg quando a recodificação é necessária.")
+    parser.add_argument('--ffmpeg-threads', type=int, default=None,
+                        help="Threads do ffmpeg por conversão (padrão: escolha do ffmpeg).")
+    parser.add_argument('--staging-dir', default=None,
+                        help="Diretório local (tmpfs/SSD) para os arquivos temporários; os MP3 prontos são movidos "
+                             f"para o diretório de saída (sugestão: {DEFAULT_STAGING_DIR}).")
+    parser.add_argument('--staging-max-mb', type=float, default=None,
+                        help="Espaço máximo do staging (MB); acima dele novos jobs aguardam.")
+    parser.add_argument('--max-connections', type=int, default=None,
+                        help="Total de conexões (fragmentos) divididas entre os downloads simultâneos.")
+    parser.add_argument('--max-rate', default=None,
+                        help="Banda total dividida entre os downloads (ex.: 500K, 8M por segundo).")
+    parser.add_argument('--host-limit', metavar='HOST=CONEXÕES[:TAXA]', action='append', default=[],
+                        help="Limite de um host e seus subdomínios (ex.: youtube.com=16:2M); pode repetir.")
+    execution = parser.add_mutually_exclusive_group()
+    execution.add_argument('--async', dest='async_orchestrator', action='store_true',
+                           help="Lê todos os subprocessos do yt-dlp em um único event loop asyncio "
+                                "(sem uma thread por job; útil com centenas de jobs simultâneos).")
+    execution.add_argument('--warm-workers', action='store_true',
+                        help="Usa workers persistentes que importam o yt-dlp uma vez (API YoutubeDL).")
+    execution.add_argument('--coordinator', metavar='[HOST:]PORTA', default=None,
+                           help="Serve a fila do lote por HTTP para workers remotos (--worker) em vez de "
+                                f"executar os jobs aqui (ex.: 0.0.0.0:{DEFAULT_PORT} para outras máquinas).")
+    parser.add_argument('--worker', metavar='URL', default=None,
+                        help="Executa jobs arrendados do coordenador (ex.: http://host:8765) até o lote acabar.")
+    parser.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT,
+                        help="Segundos sem heartbeat até um job de um worker voltar para a fila (--coordinator).")
+    parser.add_argument('--ytdlp-module', default=DEFAULT_YTDLP_MODULE,
+                        help="Módulo importado pelos workers persistentes (padrão: yt_dlp).")
+    parser.add_argument('--ffmpeg', default=None, help="Comando alternativo para o ffmpeg.")
+    parser.add_argument('--progress-rate', type=float, default=DEFAULT_MAX_PROGRESS_RATE,
+                        help="Máximo de eventos de progresso por segundo por download.")
+    parser.add_argument('--ytdlp', default=None,
+                        help="Comando alternativo para o yt-dlp (ex.: 'python fake_ytdlp.py').")
+    parser.add_argument('--no-index', action='store_true',
+                        help="Não consulta nem atualiza o índice de itens já baixados.")
+    parser.add_argument('--no-expand', action='store_true',
+                        help="Não expande playlists/canais em jobs por entrada.")
+    parser.add_argument('--metadata-cache', default=DEFAULT_CACHE_DIR,
+                        help="Diretório do cache de metadados extraídos (info json).")
+    parser.add_argument('--no-metadata-cache', action='store_true', help="Desativa o cache de metadados.")
+    parser.add_argument('--metadata-ttl', type=float, default=DEFAULT_TTL_SECONDS,
+                        help="Validade (s) de uma entrada do cache de metadados.")
+    parser.add_argument('--metadata-cache-mb', type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="Tamanho máximo do cache de metadados (MB, descarte LRU).")
+    parser.add_argument('--resume', action='store_true',
+                        help="Retoma o lote interrompido registrado no diário do diretório de saída.")
+    parser.add_argument('--no-journal', action='store_true', help="Não grava o diário do lote (sem retomada).")
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help="Reescaneia o diretório de saída, reconstrói o índice e sai.")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Emite também os logs de nível 'process' (linhas brutas do yt-dlp).")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.rebuild_index:
+        os.makedirs(args.output_dir, exist_ok=True)
+        index = DownloadIndex(args.output_dir)
+        kept, removed, added = index.rebuild()
+        index.close()
+        print(json.dumps({'event': 'INDEX_REBUILT', 'kept': kept, 'removed': removed, 'added': added}))
+        return 0
+    if args.worker:
+        if args.resume or args.url_file or args.async_orchestrator or args.coordinator:
+            parser.error("--worker não aceita lista de URLs, --resume, --async nem --coordinator")
+        args.worker = args.worker if '://' in args.worker else 'http://' + args.worker
+    try:
+        max_rate = parse_rate(args.max_rate)
+        host_limits = [parse_host_limit(limit) for limit in args.host_limit]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.max_connections is not None and args.max_connections < 1:
+        parser.error("--max-connections deve ser pelo menos 1")
+    snapshot = None
+    if args.resume:
+        snapshot = find_resumable(args.output_dir)
+        if snapshot is None:
+            print("Nenhum lote interrompido para retomar.", file=sys.stderr)
+            return 2
+    elif args.url_file is None and not args.worker:
+        parser.error("informe o arquivo de URLs (ou use --rebuild-index / --resume)")
+
+    # Na retomada a lista de URLs vem do diário (ou do arquivo que ele registrou)
+    if snapshot is not None:
+        url_list = UrlFileSource(snapshot.source) if snapshot.source else snapshot.urls
+    elif args.worker:
+        url_list = [] # As URLs vêm do coordenador
+    else:
+        url_list = read_url_file(args.url_file)
+    if isinstance(url_list, UrlFileSource):
+        if not os.path.isfile(url_list.path):
+            print(f"Arquivo de URLs não encontrado: {url_list.path}", file=sys.stderr)
+            return 2
+    elif not url_list and not args.worker:
+        print("Nenhuma URL encontrada.", file=sys.stderr)
+        return 2
+
+    engine = DownloadEngine(
+        args.output_dir,
+        audio_quality_flag=args.audio_quality,
+        max_workers=args.workers,
+        concurrent_fragments=args.fragments,
+        ytdlp_executable=args.ytdlp.split() if args.ytdlp else None,
+        max_progress_rate=args.progress_rate,
+        split_transcode=args.split_transcode,
+        transcode_workers=args.transcode_workers,
+        handoff_size=args.handoff_size,
+        ffmpeg_executable=args.ffmpeg.split() if args.ffmpeg else None,
+        execution_mode=(EXECUTION_WARM if args.warm_workers else
+                        EXECUTION_ASYNC if args.async_orchestrator else
+                        EXECUTION_REMOTE if args.coordinator else EXECUTION_SUBPROCESS),
+        ytdlp_module=args.ytdlp_module,
+        use_index=not args.no_index,
+        expand_playlists=not args.no_expand,
+        metadata_cache_dir=None if args.no_metadata_cache else args.metadata_cache,
+        metadata_ttl=args.metadata_ttl,
+        metadata_cache_max_bytes=int(args.metadata_cache_mb * 1024 * 1024),
+        use_journal=not args.no_journal and not args.worker,
+        resume=snapshot is not None,
+        adaptive=args.adaptive,
+        min_jobs=args.min_jobs,
+        max_jobs=args.max_jobs,
+        min_fragments=args.min_fragments,
+        max_fragments=args.max_fragments,
+        max_retries=args.retries,
+        retry_base_delay=args.retry_delay,
+        host_cooldown=args.host_cooldown,
+        metrics=args.metrics,
+        profile_mode=args.profile,
+        prefer_copy=args.prefer_copy,
+        mp3_encoder=args.mp3_encoder,
+        transcode_threads=args.ffmpeg_threads,
+        staging_dir=args.staging_dir,
+        staging_max_bytes=int(args.staging_max_mb * 1024 * 1024) if args.staging_max_mb else None,
+        coordinator_address=parse_address(args.coordinator) if args.coordinator else DEFAULT_ADDRESS,
+        lease_timeout=args.lease_timeout,
+        work_queue_url=args.worker,
+        max_connections=args.max_connections,
+        max_rate=max_rate,
+        host_limits=host_limits,
+    )
+    engine.subscribe(JsonLinesReporter(verbose=args.verbose))
+
+    # Ctrl+C / SIGTERM encerram os subprocessos ativos como o botão de parar da GUI
+    def handle_signal(signum, frame):
+        engine.stop()
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    orchestrator_thread = engine.start(url_list)
+    while orchestrator_thread.is_alive():
+        orchestrator_thread.join(0.2)
+
+    if engine.stop_event.is_set():
+        return 130
+    return 0 if engine.failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
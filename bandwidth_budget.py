@@ -0,0 +1,184 @@
+import re
+import threading
+from collections import namedtuple
+
+from engine_events import EVENT_BANDWIDTH
+from progress_protocol import format_bytes
+from retry_scheduler import url_host
+
+# Orçamento global de conexões e banda dividido entre os jobs.
+# Sem ele cada job abre seus próprios --concurrent-fragments sem limite de
+# taxa: 4 jobs x 64 fragmentos disputam o mesmo uplink e provocam throttling.
+# Cada download que começa recebe uma fatia justa do total (conexões e
+# bytes/s) entre os jobs que devem rodar juntos, limitada ao que ainda está
+# livre e aos limites opcionais do host: a soma das fatias nunca passa do
+# orçamento. Se o que resta não comporta nem a fatia mínima, o job espera uma
+# fatia ser devolvida, o que acontece quando um download termina ou passa para
+# o pós-processamento. O yt-dlp recebe a fatia ao iniciar (--concurrent-fragments/
+# --limit-rate), então mudanças de orçamento valem a partir do próximo job.
+
+MIN_JOB_RATE = 32 * 1024   # Menor fatia de bytes/s (abaixo disso o job espera outra ser devolvida)
+WAIT_POLL_INTERVAL = 0.5   # Espera por fatia livre: intervalo para conferir o botão de parar
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$', re.IGNORECASE)
+
+Allocation = namedtuple('Allocation', 'host connections rate')
+
+
+def parse_rate(text):
+    """'8M', '500K', '1.5MiB/s' ou bytes -> bytes/s (None para vazio ou '0')."""
+    if text is None or not str(text).strip():
+        return None
+    match = RATE_PATTERN.match(str(text))
+    if match is None:
+        raise ValueError(f"taxa inválida: {text!r} (ex.: 500K, 8M)")
+    rate = float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+    return int(rate) or None
+
+
+def parse_host_limit(text):
+    """'host=CONEXÕES[:TAXA]' ou 'host=:TAXA' -> (host, conexões ou None, bytes/s ou None)."""
+    host, separator, limits = text.partition('=')
+    connections, _, rate = limits.partition(':')
+    if not separator or not host.strip() or not (connections.strip() or rate.strip()) \
+            or (connections.strip() and not connections.strip().isdigit()):
+        raise ValueError(f"limite de host inválido: {text!r} (ex.: youtube.com=16:2M)")
+    return (host.strip().lower(), max(1, int(connections)) if connections.strip() else None,
+            parse_rate(rate))
+
+
+def fair_share(requested, total, used, sharers, minimum):
+    """
+    Fatia de um novo job: total/sharers (ao menos o mínimo), limitada ao pedido e ao que está
+    livre. 0 quando o livre não comporta o mínimo e há fatias a devolver (o job deve esperar).
+    """
+    if total is None:
+        return requested
+    share = max(total / sharers, minimum)
+    if requested is not None:
+        share = min(share, requested)
+    share = min(share, total - used)
+    if share < minimum and used:
+        return 0
+    return share
+
+
+class BandwidthBudget:
+    """Conexões e bytes/s reservados pelos downloads em andamento; limites ajustáveis durante o lote."""
+
+    def __init__(self, engine, max_connections=None, max_rate=None, host_limits=None):
+        self.engine = engine
+        self.max_connections = max_connections
+        self.max_rate = max_rate
+        self.host_limits = {host: (connections, rate) for host, connections, rate in (host_limits or ())}
+        self.lock = threading.Condition() # Notificada quando uma fatia é devolvida ou o orçamento muda
+        self.allocations = {}
+
+    @property
+    def enabled(self):
+        return (self.max_connections is not None or self.max_rate is not None
+                or any(limit != (None, None) for limit in self.host_limits.values()))
+
+    def set_limits(self, max_connections=None, max_rate=None):
+        """Novo orçamento global (ex.: pela GUI durante o lote); vale para os próximos downloads."""
+        with self.lock:
+            self.max_connections = max_connections
+            self.max_rate = max_rate
+            self.lock.notify_all()
+        self.engine.log_message(f"🚦 Orçamento: {self.describe_limits()}.", 'info')
+        self.emit_state()
+
+    def describe_limits(self):
+        connections = 'sem limite' if self.max_connections is None else self.max_connections
+        rate = 'sem limite' if self.max_rate is None else f"{format_bytes(self.max_rate)}/s"
+        text = f"conexões {connections}, banda {rate}"
+        for host, (host_connections, host_rate) in sorted(self.host_limits.items()):
+            text += (f"; {host}: {'-' if host_connections is None else host_connections} conexões, "
+                     f"{'-' if host_rate is None else format_bytes(host_rate) + '/s'}")
+        return text
+
+    # --- Reservas ---
+    def allocate(self, url, fragments, sharers):
+        """
+        Reserva a fatia de um download que vai começar; sharers = jobs que devem dividir o orçamento.
+        Bloqueia enquanto o orçamento livre não comportar a fatia mínima; None se o lote for parado.
+        """
+        host = url_host(url)
+        waiting = False
+        with self.lock:
+            while True:
+                allocation = self.slice_for(host, fragments, sharers)
+                if allocation is not None:
+                    break
+                if self.engine.stop_event.is_set():
+                    return None
+                if not waiting:
+                    waiting = True
+                    self.engine.log_message(f"🚦 Orçamento esgotado; aguardando uma fatia livre: {url[:50]}...",
+                                            'process')
+                self.lock.wait(WAIT_POLL_INTERVAL)
+            self.allocations[url] = allocation
+        self.emit_state()
+        return allocation
+
+    def slice_for(self, host, fragments, sharers):
+        """Fatia para um job novo do host (chamado com a trava), ou None se ela ainda não couber."""
+        active = list(self.allocations.values())
+        sharers = max(sharers, len(active) + 1)
+        connections = fair_share(fragments, self.max_connections, sum(a.connections for a in active),
+                                 sharers, 1)
+        rate = fair_share(None, self.max_rate, sum(a.rate or 0 for a in active), sharers, MIN_JOB_RATE)
+        host, host_connections, host_rate = self.limits_for(host)
+        if host_connections is not None or host_rate is not None:
+            # Sem saber quantos itens do lote são do host, divide o limite dele como o global
+            on_host = [a for a in active if a.host == host]
+            connections = min(connections, fair_share(fragments, host_connections,
+                                                      sum(a.connections for a in on_host), sharers, 1))
+            if host_rate is not None:
+                host_share = fair_share(None, host_rate, sum(a.rate or 0 for a in on_host), sharers,
+                                        MIN_JOB_RATE)
+                rate = host_share if rate is None else min(rate, host_share)
+        if connections < 1 or rate == 0:
+            return None
+        return Allocation(host, int(connections), None if rate is None else max(1, int(rate)))
+
+    def limits_for(self, host):
+        """
+        (chave, conexões, bytes/s) do host ou do domínio pai mais próximo com limite: 'youtube.com'
+        vale para 'www.youtube.com' e 'm.youtube.com', que passam a dividir o mesmo limite.
+        """
+        parts = (host or '').split('.')
+        for index in range(max(1, len(parts) - 1)):
+            key = '.'.join(parts[index:])
+            if key in self.host_limits:
+                return (key,) + self.host_limits[key]
+        return host, None, None
+
+    def release(self, url):
+        with self.lock:
+            released = self.allocations.pop(url, None) is not None
+            self.lock.notify_all()
+        if released:
+            self.emit_state()
+        return released
+
+    def allocation(self, url):
+        return self.allocations.get(url)
+
+    # --- Estado ---
+    def snapshot(self):
+        with self.lock:
+            active = list(self.allocations.values())
+            hosts = {}
+            for allocation in active:
+                state = hosts.setdefault(allocation.host, {'jobs': 0, 'connections': 0, 'rate': 0})
+                state['jobs'] += 1
+                state['connections'] += allocation.connections
+                state['rate'] += allocation.rate or 0
+            return {'jobs': len(active),
+                    'connections': sum(a.connections for a in active), 'max_connections': self.max_connections,
+                    'rate': sum(a.rate or 0 for a in active), 'max_rate': self.max_rate,
+                    'hosts': hosts}
+
+    def emit_state(self):
+        self.engine.emit(EVENT_BANDWIDTH, None, self.snapshot())
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+
+# Diário (journal) do lote, só de acréscimo, no diretório de saída.
+# Cada transição de estado de um job vira uma linha JSON gravada e descarregada
+# na hora; se o app fechar ou travar no meio do lote, a próxima execução lê o
+# diário, pula o que já terminou e retoma os itens em andamento a partir dos
+# arquivos .part deixados pelo yt-dlp.
+
+JOURNAL_FILENAME = '.mp3-baixar-journal.jsonl'
+
+# Estados de um job
+STATE_QUEUED = 'queued'
+STATE_DOWNLOADING = 'downloading'
+STATE_CONVERTING = 'converting'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+IN_FLIGHT_STATES = (STATE_DOWNLOADING, STATE_CONVERTING)
+
+
+class JournalSnapshot:
+    """Estado de um lote reconstruído a partir do diário (último estado de cada item)."""
+
+    def __init__(self, urls, states, finished, stopped, source=None):
+        self.urls = urls
+        self.source = source            # Arquivo de URLs importado (lido de novo na retomada)
+        self.states = states            # chave do vídeo -> último estado
+        self.finished = finished        # Lote chegou ao fim (registro 'end')
+        self.stopped = stopped          # ... mas por interrupção do usuário
+
+    @property
+    def done_keys(self):
+        return {key for key, state in self.states.items() if state == STATE_DONE}
+
+    def count(self, *states):
+        return sum(1 for state in self.states.values() if state in states)
+
+    @property
+    def resumable(self):
+        # Lotes encerrados normalmente não são oferecidos; as falhas já foram reportadas
+        return bool(self.urls or self.source) and (not self.finished or self.stopped)
+
+
+def load_journal(output_dir):
+    """Lê o diário do diretório de saída; retorna um JournalSnapshot ou None se não existir."""
+    path = os.path.join(output_dir, JOURNAL_FILENAME)
+    try:
+        handle = open(path, encoding='utf-8')
+    except OSError:
+        return None
+
+    urls = []
+    source = None
+    states = {}
+    finished = stopped = False
+    with handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Última linha truncada por um crash
+            kind = entry.get('event')
+            if kind == 'batch':
+                urls = entry.get('urls', [])
+                source = entry.get('source')
+                finished = stopped = False
+            elif kind == 'resume':
+                finished = stopped = False
+            elif kind == 'state':
+                states[entry['key']] = entry['state']
+            elif kind == 'end':
+                finished = True
+                stopped = entry.get('stopped', False)
+    return JournalSnapshot(urls, states, finished, stopped, source)
+
+
+def find_resumable(output_dir):
+    """Atalho para a GUI/CLI: o snapshot do lote interrompido, ou None se não houver o que retomar."""
+    snapshot = load_journal(output_dir)
+    return snapshot if snapshot is not None and snapshot.resumable else None
+
+
+class BatchJournal:
+    """Escritor thread-safe do diário; cada linha é descarregada (flush) assim que escrita."""
+
+    def __init__(self, output_dir, url_list=None, resume=False, source=None):
+        self.path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.lock = threading.Lock()
+        # Um lote novo recomeça o diário; a retomada continua o arquivo existente
+        self.handle = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if resume:
+            self.append({'event': 'resume'}, sync=True)
+        else:
+            self.append({'event': 'batch', 'urls': list(url_list or []), 'source': source}, sync=True)
+
+    def append(self, entry, sync=False):
+        entry['ts'] = round(time.time(), 3)
+        with self.lock:
+            if self.handle is None:
+                return
+            self.handle.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.handle.flush()
+            if sync:
+                os.fsync(self.handle.fileno())
+
+    def transition(self, key, url, state):
+        self.append({'event': 'state', 'key': key, 'url': url, 'state': state})
+
+    def close(self, stopped, failed):
+        self.append({'event': 'end', 'stopped': stopped, 'failed': failed}, sync=True)
+        with self.lock:
+            self.handle.close()
+            self.handle = None
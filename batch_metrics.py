@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+
+from progress_protocol import PHASE_DOWNLOAD
+
+# Métricas por job e do lote.
+# Cada job recebe marcas de tempo por fase (início, processo criado, primeiro
+# registro de download = fim da extração de metadados, primeiro byte, fim do
+# download, fim do pós-processamento) e os bytes transferidos. O agregado
+# (p50/p95 por fase, faixas/min, MB/s) é exportado como resumo JSON e como
+# arquivo de texto no formato do Prometheus (node_exporter textfile), reescrito
+# periodicamente durante o lote com troca atômica.
+
+METRICS_JSON_FILENAME = 'mp3-baixar-metricas.json'
+METRICS_PROM_FILENAME = 'mp3-baixar-metricas.prom'
+DEFAULT_EXPORT_INTERVAL = 5.0
+
+# Fases medidas: nome -> (marca inicial, marca final)
+PHASES = (
+    ('spawn', 'started', 'spawned'),                    # Criação do processo/worker
+    ('extraction', 'spawned', 'download_started'),      # Extração de metadados até o primeiro progresso
+    ('first_byte', 'download_started', 'first_byte'),
+    ('download', 'first_byte', 'download_done'),
+    ('postprocess', 'download_done', 'finished'),       # Conversão para MP3
+    ('total', 'started', 'finished'),
+)
+QUANTILES = (0.5, 0.95)
+
+
+def percentile(sorted_values, quantile):
+    """Percentil por interpolação linear de uma lista já ordenada."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class JobTiming:
+    def __init__(self, url):
+        self.url = url
+        self.marks = {}
+        self.file_bytes = {}
+        self.attempts = 0
+        self.ok = None
+
+    def mark(self, name, when=None):
+        # Só a primeira ocorrência conta (ex.: primeiro byte)
+        self.marks.setdefault(name, when if when is not None else time.monotonic())
+
+    @property
+    def bytes(self):
+        return sum(self.file_bytes.values())
+
+    def phase_durations(self):
+        durations = {}
+        for phase, start, end in PHASES:
+            if start in self.marks and end in self.marks:
+                durations[phase] = max(0.0, self.marks[end] - self.marks[start])
+        return durations
+
+    def average_speed(self):
+        elapsed = self.phase_durations().get('download')
+        return self.bytes / elapsed if elapsed else None
+
+
+class BatchMetrics:
+    """Coleta as marcas de tempo dos jobs e exporta o agregado (JSON + Prometheus)."""
+
+    def __init__(self, output_dir, interval=DEFAULT_EXPORT_INTERVAL):
+        self.json_path = os.path.join(output_dir, METRICS_JSON_FILENAME)
+        self.prom_path = os.path.join(output_dir, METRICS_PROM_FILENAME)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.batch_started = time.monotonic()
+        self.batch_started_wall = time.time()
+        self.finished_at = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # --- Coleta (threads dos workers) ---
+    def job_started(self, url):
+        with self.lock:
+            job = self.jobs.get(url)
+            attempts = job.attempts if job is not None else 0
+            # Uma retentativa mede as fases de novo, mantendo a contagem de tentativas
+            job = self.jobs[url] = JobTiming(url)
+            job.attempts = attempts + 1
+            job.mark('started')
+
+    def process_spawned(self, url):
+        with self.lock:
+            if url in self.jobs:
+                self.jobs[url].mark('spawned')
+
+    def observe_record(self, url, record):
+        if record.phase != PHASE_DOWNLOAD:
+            return
+        with self.lock:
+            job = self.jobs.get(url)
+            if job is None:
+                return
+            job.mark('download_started')
+            if record.downloaded_bytes:
+                job.mark('first_byte')
+                key = record.filename or ''
+                job.file_bytes[key] = max(job.file_bytes.get(key, 0), record.downloaded_bytes)
+            if record.status == 'finished':
+                # Item já baixado antes (sem progresso de bytes): o download "termina" na hora
+                job.mark('first_byte')
+                job.marks['download_done'] = time.monotonic()
+
+    def job_finished(self, url, ok):
+        with self.lock:
+            job = self.jobs.get(url)
+            if job is None:
+                return
+            job.marks.setdefault('download_done', time.monotonic())
+            job.mark('finished')
+            job.ok = ok
+
+    # --- Agregado ---
+    def summary(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+            end = self.finished_at or time.monotonic()
+        elapsed = max(1e-6, end - self.batch_started)
+        finished = [job for job in jobs if job.ok is not None]
+        completed = [job for job in finished if job.ok]
+        total_bytes = sum(job.bytes for job in jobs)
+
+        durations = [job.phase_durations() for job in completed]
+        phases = {}
+        for phase, _, _ in PHASES:
+            values = sorted(job_phases[phase] for job_phases in durations if phase in job_phases)
+            phases[phase] = {
+                'count': len(values),
+                'sum': sum(values),
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+            }
+
+        return {
+            'started_at': self.batch_started_wall,
+            'elapsed_seconds': elapsed,
+            'jobs_active': len(jobs) - len(finished),
+            'jobs_completed': len(completed),
+            'jobs_failed': len(finished) - len(completed),
+            'retries': sum(job.attempts - 1 for job in jobs),
+            'bytes_total': total_bytes,
+            'tracks_per_minute': len(completed) / (elapsed / 60.0),
+            'megabytes_per_second': total_bytes / elapsed / (1024 * 1024),
+            'phases': phases,
+            'jobs': [{
+                'url': job.url,
+                'ok': job.ok,
+                'attempts': job.attempts,
+                'bytes': job.bytes,
+                'average_speed': job.average_speed(),
+                'phases': job.phase_durations(),
+            } for job in finished],
+        }
+
+    def prometheus_text(self, summary):
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP mp3baixar_{name} {help_text}")
+            lines.append(f"# TYPE mp3baixar_{name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"mp3baixar_{name}{labels} {value}")
+
+        metric('jobs_completed_total', 'counter', 'Jobs concluidos no lote.', [('', summary['jobs_completed'])])
+        metric('jobs_failed_total', 'counter', 'Jobs com falha permanente no lote.', [('', summary['jobs_failed'])])
+        metric('jobs_active', 'gauge', 'Jobs em andamento.', [('', summary['jobs_active'])])
+        metric('retries_total', 'counter', 'Retentativas no lote.', [('', summary['retries'])])
+        metric('bytes_total', 'counter', 'Bytes baixados no lote.', [('', summary['bytes_total'])])
+        metric('tracks_per_minute', 'gauge', 'Faixas concluidas por minuto.',
+               [('', round(summary['tracks_per_minute'], 3))])
+        metric('throughput_bytes_per_second', 'gauge', 'Vazao media do lote.',
+               [('', round(summary['megabytes_per_second'] * 1024 * 1024, 1))])
+
+        samples = []
+        for phase, stats in summary['phases'].items():
+            for quantile in QUANTILES:
+                value = stats['p50'] if quantile == 0.5 else stats['p95']
+                if value is not None:
+                    samples.append((f'{{phase="{phase}",quantile="{quantile}"}}', round(value, 4)))
+        metric('phase_seconds', 'summary', 'Duracao de cada fase dos jobs concluidos.', samples)
+        for phase, stats in summary['phases'].items():
+            lines.append(f'mp3baixar_phase_seconds_sum{{phase="{phase}"}} {round(stats["sum"], 4)}')
+            lines.append(f'mp3baixar_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """Reescreve os dois arquivos de forma atômica (quem lê nunca vê um arquivo pela metade)."""
+        summary = self.summary()
+        for path, content in ((self.json_path, json.dumps(summary, ensure_ascii=False, indent=2)),
+                              (self.prom_path, self.prometheus_text(summary))):
+            partial = path + '.tmp'
+            with open(partial, 'w', encoding='utf-8') as handle:
+                handle.write(content)
+            os.replace(partial, path)
+        return summary
+
+    # --- Exportação periódica ---
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.export()
+            except OSError:
+                pass # Tenta de novo no próximo intervalo
+
+    def finish(self):
+        """Encerra a exportação periódica e grava o resumo final, que é retornado."""
+        self.finished_at = time.monotonic()
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        return self.export()
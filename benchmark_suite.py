@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from queue import Queue, Empty
+
+from batch_metrics import percentile
+from download_engine import (DownloadEngine, EXECUTION_SUBPROCESS, EXECUTION_WARM, EXECUTION_ASYNC,
+                             EVENT_ITEM_DONE)
+from fake_ytdlp import FAKE_PROFILE_ENV_VAR, DEFAULT_PROFILE
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Suíte de benchmarks offline (sem rede).
+# Cada cenário (modo de execução x interface x tamanho do lote) roda num
+# processo próprio contra o fake_ytdlp e mede a vazão do lote de ponta a ponta,
+# o atraso dos eventos na fila da UI (do put() no motor até a retirada na
+# thread principal), o tempo de CPU da thread principal e o pico de memória.
+# Na interface 'tk' o app completo (YouTubeDownloaderApp e check_ui_queue)
+# consome os eventos; sem display, use um virtual (ex.: xvfb-run). Os
+# resultados podem ser salvos como linha de base e comparados depois. Com
+# --playlist-size N o lote chega como playlists de N vídeos, e a listagem
+# (--flat-playlist do fake) entra na medição.
+#
+#   python benchmark_suite.py --sizes 10,100,1000 --save-baseline base.json
+#   python benchmark_suite.py --sizes 10,100,1000 --baseline base.json
+
+UI_HEADLESS = 'headless'
+UI_TK = 'tk'
+UI_MODES = (UI_HEADLESS, UI_TK)
+EXECUTION_MODES = (EXECUTION_SUBPROCESS, EXECUTION_ASYNC, EXECUTION_WARM)
+
+DEFAULT_SIZES = (10, 100, 1000)  # Lotes maiores (ex.: 10000) via --sizes
+DEFAULT_JOBS = 16
+DEFAULT_TOLERANCE = 0.10
+HEADLESS_DRAIN_INTERVAL = 0.05   # Mesmo intervalo do check_ui_queue da GUI
+FAKE_MODULE = 'fake_ytdlp'
+FAKE_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ytdlp.py')]
+
+# Métricas comparadas com a linha de base: (nome, maior é melhor?, variação absoluta abaixo da qual é ruído)
+COMPARED_METRICS = (
+    ('items_per_second', True, 0.0),
+    ('ui_lag_p95_ms', False, 5.0),
+    ('ui_lag_max_ms', False, 10.0),
+    ('main_cpu_seconds', False, 0.05),
+    ('peak_rss_mb', False, 2.0),
+)
+
+
+class TimedQueue(Queue):
+    """Queue que registra quanto tempo cada item esperou entre put() e get()."""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self.lags = []
+
+    def _put(self, item):
+        super()._put((time.perf_counter(), item))
+
+    def _get(self):
+        queued_at, item = super()._get()
+        self.lags.append(time.perf_counter() - queued_at)
+        return item
+
+
+def peak_rss_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa em KiB, macOS em bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    return None
+
+
+def scenario_key(scenario):
+    key = f"{scenario['execution']}/{scenario['ui']}/{scenario['size']}"
+    return f"{key}/pl{scenario['playlist_size']}" if scenario.get('playlist_size') else key
+
+
+def scenario_urls(size, playlist_size=0):
+    if playlist_size:
+        # O fake lista playlist_size vídeos por playlist; o lote é arredondado para cima
+        playlists = -(-size // playlist_size)
+        return [f"https://www.youtube.com/playlist?list=PLB{index:010d}" for index in range(playlists)]
+    return [f"https://www.youtube.com/watch?v=B{index:010d}" for index in range(size)]
+
+
+def scenario_items(scenario):
+    playlist_size = scenario.get('playlist_size')
+    return len(scenario_urls(scenario['size'], playlist_size)) * playlist_size if playlist_size else scenario['size']
+
+
+# --- Execução de um cenário (processo filho) ---
+def count_results(event, counts):
+    msg_type, _, data = event
+    if msg_type == EVENT_ITEM_DONE:
+        counts['ok' if data['ok'] else 'failed'] += 1
+
+
+def run_headless(scenario, output_dir, counts):
+    """O motor publica numa fila; a thread principal a drena a cada 50 ms como a GUI faria."""
+    events = TimedQueue()
+    engine = DownloadEngine(output_dir, max_workers=scenario['jobs'], ytdlp_executable=FAKE_COMMAND,
+                            execution_mode=scenario['execution'], ytdlp_module=FAKE_MODULE, max_retries=0,
+                            prefer_copy=scenario['prefer_copy'])
+    engine.subscribe(lambda msg_type, url, data: events.put((msg_type, url, data)))
+
+    started = time.perf_counter()
+    cpu_started = time.thread_time()
+    orchestrator_thread = engine.start(scenario_urls(scenario['size'], scenario.get('playlist_size')))
+    while orchestrator_thread.is_alive() or not events.empty():
+        while True:
+            try:
+                count_results(events.get_nowait(), counts)
+            except Empty:
+                break
+        time.sleep(HEADLESS_DRAIN_INTERVAL)
+    return time.perf_counter() - started, time.thread_time() - cpu_started, events.lags
+
+
+def run_tk(scenario, output_dir, counts):
+    """Roda o app completo num Tk real; o lote termina quando a GUI processa o BATCH_END."""
+    import tkinter as tk
+    from youtube_gui import YouTubeDownloaderApp
+
+    root = tk.Tk()
+    app = YouTubeDownloaderApp(root)
+    events = TimedQueue()
+    app.ui_update_queue = events
+    app.max_workers = scenario['jobs']
+    app.YTDLP_EXECUTABLE = FAKE_COMMAND
+    app.output_dir_var.set(output_dir)
+    app.use_index_var.set(False)
+    app.metadata_cache_var.set(False)
+    app.adaptive_var.set(False)
+    app.prefer_copy_var.set(scenario['prefer_copy'])
+    app.async_orchestrator_var.set(scenario['execution'] == EXECUTION_ASYNC)
+    app.url_text.insert(tk.END, "\n".join(scenario_urls(scenario['size'], scenario.get('playlist_size'))))
+
+    # Conta os resultados sem alterar o fluxo do app
+    handle_ui_event = app.handle_ui_event
+
+    def counting_handler(msg_type, url, data):
+        count_results((msg_type, url, data), counts)
+        handle_ui_event(msg_type, url, data)
+    app.handle_ui_event = counting_handler
+
+    timing = {}
+
+    def start():
+        timing['started'] = time.perf_counter()
+        app.start_downloads()
+        root.after(100, watch)
+
+    def watch():
+        if app.is_downloading or not events.empty():
+            root.after(100, watch)
+            return
+        timing['finished'] = time.perf_counter()
+        root.quit()
+
+    cpu_started = time.thread_time()
+    root.after(0, start)
+    root.mainloop()
+    cpu_seconds = time.thread_time() - cpu_started
+    root.destroy()
+    return timing['finished'] - timing['started'], cpu_seconds, events.lags
+
+
+def run_scenario(scenario):
+    """Executa um cenário e retorna o dicionário de resultados (chamado no processo filho)."""
+    os.environ[FAKE_PROFILE_ENV_VAR] = json.dumps(scenario['profile'])
+    output_dir = tempfile.mkdtemp(prefix='mp3-baixar-bench-')
+    counts = {'ok': 0, 'failed': 0}
+    try:
+        if scenario['ui'] == UI_TK:
+            if scenario['execution'] == EXECUTION_WARM:
+                # A GUI não expõe o módulo dos workers persistentes: usaria o yt-dlp real
+                return dict(scenario, skipped="modo 'warm' não é suportado com a interface tk")
+            try:
+                wall, main_cpu, lags = run_tk(scenario, output_dir, counts)
+            except Exception as e:
+                if type(e).__name__ != 'TclError':
+                    raise
+                return dict(scenario, skipped=f"Tk indisponível ({e}); tente com xvfb-run")
+        else:
+            wall, main_cpu, lags = run_headless(scenario, output_dir, counts)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    lags_ms = sorted(lag * 1000.0 for lag in lags)
+    peak = peak_rss_mb()
+    return dict(
+        scenario,
+        completed=counts['ok'],
+        failed=counts['failed'],
+        wall_seconds=round(wall, 3),
+        items_per_second=round(scenario_items(scenario) / wall, 3),
+        ui_events=len(lags_ms),
+        ui_lag_p50_ms=round(percentile(lags_ms, 0.5) or 0.0, 2),
+        ui_lag_p95_ms=round(percentile(lags_ms, 0.95) or 0.0, 2),
+        ui_lag_max_ms=round(lags_ms[-1] if lags_ms else 0.0, 2),
+        main_cpu_seconds=round(main_cpu, 3),
+        process_cpu_seconds=round(time.process_time(), 3),
+        peak_rss_mb=round(peak, 1) if peak is not None else None,
+    )
+
+
+# --- Orquestração dos cenários (processo pai) ---
+def run_in_subprocess(scenario):
+    # Processo novo por cenário: o pico de memória (ru_maxrss) não vaza de um cenário para o outro
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(scenario)],
+                               stdout=subprocess.PIPE, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return dict(scenario, skipped=f"o cenário terminou com código {completed.returncode}")
+    return json.loads(lines[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Compara cada métrica com a linha de base; retorna (linhas do relatório, número de regressões)."""
+    reference = {scenario_key(entry): entry for entry in baseline['results'] if 'skipped' not in entry}
+    lines = []
+    regressions = 0
+    for result in results:
+        base = reference.get(scenario_key(result))
+        if base is None or 'skipped' in result:
+            continue
+        settings = ('profile', 'jobs', 'prefer_copy')
+        if [base.get(name) for name in settings] != [result.get(name) for name in settings]:
+            lines.append(f"{scenario_key(result):<28} aviso: perfil do fake ou opções diferentes da linha de base")
+        for metric, higher_is_better, noise in COMPARED_METRICS:
+            current, previous = result.get(metric), base.get(metric)
+            if current is None or not previous:
+                continue
+            change = (current - previous) / previous
+            regressed = (abs(current - previous) > noise and
+                         (change < -tolerance if higher_is_better else change > tolerance))
+            regressions += regressed
+            lines.append(f"{scenario_key(result):<28} {metric:<20} {previous:>10} -> {current:>10} "
+                         f"({change * 100:+6.1f}%){'  REGRESSÃO' if regressed else ''}")
+    return lines, regressions
+
+
+def print_results(results):
+    print(f"{'cenário':<28} {'itens/s':>9} {'lag p50':>9} {'lag p95':>9} {'lag máx':>9} "
+          f"{'CPU princ.':>10} {'pico MB':>8} {'ok/falha':>10}")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{scenario_key(result):<28} pulado: {result['skipped']}")
+            continue
+        print(f"{scenario_key(result):<28} {result['items_per_second']:>9.2f} {result['ui_lag_p50_ms']:>8.1f}ms "
+              f"{result['ui_lag_p95_ms']:>8.1f}ms {result['ui_lag_max_ms']:>8.1f}ms {result['main_cpu_seconds']:>9.2f}s "
+              f"{result['peak_rss_mb'] if result['peak_rss_mb'] is not None else '?':>8} "
+              f"{result['completed']:>5}/{result['failed']:<4}")
+
+
+def parse_list(text, cast=str):
+    return [cast(item.strip()) for item in text.split(',') if item.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks offline do motor de download e da fila da UI.")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="Tamanhos de lote separados por vírgula (ex.: 10,100,1000,10000).")
+    parser.add_argument('--execution', default=EXECUTION_SUBPROCESS,
+                        help=f"Modos de execução separados por vírgula ({', '.join(EXECUTION_MODES)}).")
+    parser.add_argument('--ui', default=UI_HEADLESS,
+                        help=f"Interfaces separadas por vírgula ({', '.join(UI_MODES)}).")
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS, help="Downloads simultâneos.")
+    parser.add_argument('--duration', type=float, default=DEFAULT_PROFILE['duration'],
+                        help="Duração (s) do download simulado de cada item.")
+    parser.add_argument('--extract', type=float, default=DEFAULT_PROFILE['extract'],
+                        help="Duração (s) da extração de metadados simulada.")
+    parser.add_argument('--rate', type=float, default=DEFAULT_PROFILE['rate'],
+                        help="Linhas de progresso por segundo emitidas por item.")
+    parser.add_argument('--fail-ratio', type=float, default=DEFAULT_PROFILE['fail_ratio'],
+                        help="Proporção de itens que falham (0 a 1).")
+    parser.add_argument('--failure', default=DEFAULT_PROFILE['failure'],
+                        help="Tipo de falha simulada (unavailable, network, throttled).")
+    parser.add_argument('--mp3-ratio', type=float, default=DEFAULT_PROFILE['mp3_ratio'],
+                        help="Proporção de itens com um stream MP3 disponível (caminho de cópia).")
+    parser.add_argument('--playlist-size', type=int, default=0,
+                        help="Entrega o lote como playlists com tantos vídeos cada (0 = URLs de vídeo).")
+    parser.add_argument('--prefer-copy', action='store_true',
+                        help="Ativa a seleção de formato que prefere fontes MP3 (sem recodificação).")
+    parser.add_argument('--output', help="Grava os resultados em JSON.")
+    parser.add_argument('--save-baseline', help="Grava os resultados como linha de base.")
+    parser.add_argument('--baseline', help="Compara os resultados com uma linha de base salva.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Variação relativa tolerada antes de acusar regressão (0.10 = 10%%).")
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario))))
+        return 0
+
+    executions, uis = parse_list(args.execution), parse_list(args.ui)
+    unknown = (set(executions) - set(EXECUTION_MODES)) | (set(uis) - set(UI_MODES))
+    if unknown:
+        print(f"Valor desconhecido: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    profile = dict(DEFAULT_PROFILE, duration=args.duration, extract=args.extract, rate=args.rate,
+                   fail_ratio=args.fail_ratio, failure=args.failure, mp3_ratio=args.mp3_ratio,
+                   playlist_size=args.playlist_size or DEFAULT_PROFILE['playlist_size'])
+    scenarios = [{'execution': execution, 'ui': ui, 'size': size, 'jobs': args.jobs, 'profile': profile,
+                  'prefer_copy': args.prefer_copy, 'playlist_size': args.playlist_size}
+                 for execution in executions for ui in uis for size in parse_list(args.sizes, int)]
+
+    results = []
+    for scenario in scenarios:
+        print(f"▶ {scenario_key(scenario)}...", file=sys.stderr, flush=True)
+        results.append(run_in_subprocess(scenario))
+    print_results(results)
+
+    report = {'created_at': time.time(), 'python': sys.version.split()[0], 'platform': sys.platform,
+              'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            lines, regressions = compare(results, json.load(handle), args.tolerance)
+        print()
+        print("\n".join(lines) if lines else "Nenhum cenário em comum com a linha de base.")
+        if regressions:
+            print(f"\n{regressions} métricas pioraram além da tolerância de {args.tolerance * 100:.0f}%.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
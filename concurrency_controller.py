@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+import time
+
+from engine_events import EVENT_CONCURRENCY
+from progress_protocol import PHASE_DOWNLOAD, format_bytes
+
+try:
+    import psutil # Opcional: medição de CPU também no Windows
+except ImportError:
+    psutil = None
+
+# Controle adaptativo de concorrência.
+# Em vez de 4 jobs x 64 fragmentos fixos, um laço de controle mede a vazão
+# combinada, a taxa de erros, os sinais de throttling (HTTP 429/403) e a carga
+# de CPU a cada intervalo e ajusta, dentro de limites configuráveis, quantos
+# jobs rodam ao mesmo tempo e quantos fragmentos cada novo job usa.
+# Subidas são graduais (subida de colina); sinais de sobrecarga cortam rápido.
+
+DEFAULT_MIN_JOBS = 1
+DEFAULT_MAX_JOBS = 16
+DEFAULT_MIN_FRAGMENTS = 1
+DEFAULT_MAX_FRAGMENTS = 64
+DEFAULT_INTERVAL = 5.0
+
+THROTTLE_RE = re.compile(r'HTTP Error (429|403)|Too Many Requests|rate.?limit', re.IGNORECASE)
+ERROR_RATE_LIMIT = 0.2      # Fração de falhas na janela que força redução de jobs
+CPU_HIGH = 0.90             # Carga de CPU (0-1) acima da qual não se sobe mais jobs
+THROUGHPUT_DROP = 0.90      # Vazão abaixo de 90% da anterior desfaz o último aumento
+HOLD_TICKS = 3              # Intervalos sem aumentar depois de um recuo
+
+
+def cpu_load():
+    """Carga de CPU entre 0 e 1 (psutil, ou loadavg/núcleos no Unix); None se não houver como medir."""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None) / 100.0
+    if hasattr(os, 'getloadavg'):
+        return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+    return None
+
+
+class JobSlots:
+    """Semáforo com limite ajustável em tempo de execução (vagas de jobs simultâneos)."""
+
+    def __init__(self, limit, stop_event):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.stop_event = stop_event
+        self.condition = threading.Condition()
+
+    def set_limit(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def __enter__(self):
+        with self.condition:
+            self.waiting += 1
+            # Com o lote parado a vaga é liberada na hora: o job só registra o cancelamento
+            while self.active >= self.limit and not self.stop_event.is_set():
+                self.condition.wait(0.5)
+            self.waiting -= 1
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+
+class AdaptiveConcurrency:
+    """Laço de controle que ajusta engine.job_slots e engine.concurrent_fragments."""
+
+    def __init__(self, engine, min_jobs=DEFAULT_MIN_JOBS, max_jobs=DEFAULT_MAX_JOBS,
+                 min_fragments=DEFAULT_MIN_FRAGMENTS, max_fragments=DEFAULT_MAX_FRAGMENTS,
+                 interval=DEFAULT_INTERVAL):
+        self.engine = engine
+        self.min_jobs = max(1, min_jobs)
+        self.max_jobs = max(self.min_jobs, max_jobs)
+        self.min_fragments = max(1, min_fragments)
+        self.max_fragments = max(self.min_fragments, max_fragments)
+        self.interval = interval
+        self.jobs = min(self.max_jobs, max(self.min_jobs, engine.max_workers))
+        self.fragments = min(self.max_fragments, max(self.min_fragments, engine.concurrent_fragments))
+
+        self.lock = threading.Lock()
+        self.window_bytes = 0
+        self.window_ok = 0
+        self.window_failed = 0
+        self.window_throttled = 0
+        self.last_bytes = {}
+        self.last_throughput = None
+        self.last_change = None     # ('jobs'|'fragments', valor anterior) do último aumento
+        self.hold = 0
+        self.thread = None
+        self.finished = threading.Event()
+
+    # --- Observações (chamadas pelas threads dos workers) ---
+    def observe_record(self, url, record):
+        if record.phase != PHASE_DOWNLOAD or record.downloaded_bytes is None:
+            return
+        with self.lock:
+            key = (url, record.filename)
+            previous = self.last_bytes.get(key, 0)
+            if record.downloaded_bytes >= previous:
+                self.window_bytes += record.downloaded_bytes - previous
+            self.last_bytes[key] = record.downloaded_bytes
+            if record.status == 'finished':
+                del self.last_bytes[key]
+
+    def observe_output(self, line):
+        if THROTTLE_RE.search(line):
+            with self.lock:
+                self.window_throttled += 1
+
+    def observe_result(self, ok):
+        with self.lock:
+            if ok:
+                self.window_ok += 1
+            else:
+                self.window_failed += 1
+
+    # --- Laço de Controle ---
+    def start(self):
+        self.apply()
+        self.emit_state(None, None)
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.finished.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def loop(self):
+        window_start = time.monotonic()
+        cpu_load() # A primeira leitura do psutil sempre retorna 0
+        while not self.finished.wait(self.interval) and not self.engine.stop_event.is_set():
+            now = time.monotonic()
+            with self.lock:
+                throughput = self.window_bytes / max(1e-6, now - window_start)
+                results = self.window_ok + self.window_failed
+                error_rate = self.window_failed / results if results else 0.0
+                throttled = self.window_throttled
+                self.window_bytes = self.window_ok = self.window_failed = self.window_throttled = 0
+            window_start = now
+            self.tick(throughput, error_rate, throttled, cpu_load())
+
+    def tick(self, throughput, error_rate, throttled, cpu):
+        """Decide o próximo par (jobs, fragmentos) a partir das medições de uma janela."""
+        jobs, fragments = self.jobs, self.fragments
+        slots = self.engine.job_slots
+        backlog = slots.waiting if slots is not None else 0
+        reason = None
+
+        if throttled:
+            # Throttling: menos conexões por job e menos jobs, de uma vez
+            fragments = max(self.min_fragments, fragments // 2)
+            jobs = max(self.min_jobs, jobs - 1)
+            reason = f"{throttled} sinais de throttling"
+            self.last_change, self.hold = None, HOLD_TICKS
+        elif error_rate > ERROR_RATE_LIMIT:
+            jobs = max(self.min_jobs, jobs - 1)
+            reason = f"taxa de erros de {error_rate:.0%}"
+            self.last_change, self.hold = None, HOLD_TICKS
+        elif cpu is not None and cpu > CPU_HIGH and jobs > self.min_jobs:
+            jobs -= 1
+            reason = f"CPU em {cpu:.0%}"
+            self.last_change = None
+        elif (self.last_change is not None and self.last_throughput
+              and throughput < self.last_throughput * THROUGHPUT_DROP):
+            # O último aumento piorou a vazão: desfaz e espera antes de tentar de novo
+            kind, previous = self.last_change
+            if kind == 'jobs':
+                jobs = previous
+            else:
+                fragments = previous
+            reason = "vazão caiu após o último aumento"
+            self.last_change, self.hold = None, HOLD_TICKS
+        elif self.hold:
+            self.hold -= 1
+        elif backlog and jobs < self.max_jobs:
+            self.last_change = ('jobs', jobs)
+            jobs += 1
+            reason = f"{backlog} itens aguardando vaga"
+        elif self.engine.downloading and fragments < self.max_fragments:
+            self.last_change = ('fragments', fragments)
+            fragments = min(self.max_fragments, fragments * 2)
+            reason = "vazão estável, sem fila de jobs"
+        else:
+            self.last_change = None
+
+        self.last_throughput = throughput
+        if (jobs, fragments) != (self.jobs, self.fragments):
+            self.engine.log_message(
+                f"🎛️ [ADAPTATIVO] jobs {self.jobs}→{jobs}, fragmentos {self.fragments}→{fragments} "
+                f"(vazão {format_bytes(throughput)}/s, erros {error_rate:.0%}, throttling {throttled}, "
+                f"CPU {'?' if cpu is None else f'{cpu:.0%}'}): {reason}.", 'info')
+            self.jobs, self.fragments = jobs, fragments
+            self.apply()
+        self.emit_state(throughput, cpu)
+
+    def apply(self):
+        # Novos jobs leem concurrent_fragments ao montar o comando; os em andamento seguem como estão
+        self.engine.concurrent_fragments = self.fragments
+        if self.engine.job_slots is not None:
+            self.engine.job_slots.set_limit(self.jobs)
+
+    def emit_state(self, throughput, cpu):
+        self.engine.emit(EVENT_CONCURRENCY, None, {'jobs': self.jobs, 'fragments': self.fragments,
+                                                   'throughput': throughput, 'cpu': cpu, 'adaptive': True})
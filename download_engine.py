@@ -0,0 +1,989 @@
+import threading
+import subprocess
+import os
+import sys
+import time
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from engine_events import (EVENT_LOG, EVENT_BATCH_START, EVENT_BATCH_TOTAL, EVENT_JOB_START, EVENT_PROGRESS,
+                           EVENT_JOB_END, EVENT_ITEM_DONE, EVENT_BATCH_END, EVENT_STAGE_STATS,
+                           EVENT_CONCURRENCY)
+from progress_protocol import (DEFAULT_MAX_PROGRESS_RATE, ProgressRateLimiter, ProgressRecord, parse_progress_line,
+                               progress_template_args, format_bytes, PHASE_DOWNLOAD, PHASE_POSTPROCESS)
+from transcode_stage import (TranscodeStage, DEFAULT_TRANSCODE_WORKERS, DEFAULT_HANDOFF_SIZE, DEFAULT_MP3_ENCODER,
+                             AUDIO_PATH_COPY, AUDIO_PATH_TRANSCODE, COPY_MARKER, TRANSCODE_MARKER, format_selector,
+                             encoder_args)
+from download_index import DownloadIndex, extract_video_key
+from playlist_expander import PlaylistExpander, looks_like_collection
+from batch_journal import (BatchJournal, load_journal, IN_FLIGHT_STATES, STATE_QUEUED, STATE_DOWNLOADING,
+                           STATE_CONVERTING, STATE_DONE, STATE_FAILED)
+from concurrency_controller import (AdaptiveConcurrency, JobSlots, DEFAULT_MIN_JOBS, DEFAULT_MAX_JOBS,
+                                    DEFAULT_MIN_FRAGMENTS, DEFAULT_MAX_FRAGMENTS)
+from retry_scheduler import (RetryScheduler, classify_failure, DEFAULT_MAX_RETRIES, DEFAULT_BASE_DELAY,
+                             DEFAULT_HOST_COOLDOWN, JOB_OUTPUT_LINES, FAILURE_UNKNOWN)
+from batch_metrics import BatchMetrics, DEFAULT_EXPORT_INTERVAL
+from url_source import UrlFileSource
+from profiling_hook import ProfileHook
+from staging_area import StagingArea, SPACE_POLL_INTERVAL
+from bandwidth_budget import BandwidthBudget
+from metadata_cache import MetadataCache, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+from async_orchestrator import AsyncOrchestrator
+from warm_workers import WarmWorkerPool, DEFAULT_YTDLP_MODULE, MSG_PROGRESS, MSG_LOG
+from work_queue import (WorkQueueCoordinator, WorkQueueWorker, DEFAULT_ADDRESS, DEFAULT_LEASE_TIMEOUT,
+                        MSG_LEASED)
+
+# Motor de download sem interface gráfica.
+# Toda a orquestração (pool de workers, subprocessos do yt-dlp e leitura do
+# progresso) vive aqui; a GUI e a CLI apenas assinam os eventos emitidos.
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CONCURRENT_FRAGMENTS = 64
+DEFAULT_YTDLP_EXECUTABLE = [sys.executable, '-m', 'yt_dlp']
+
+# Modos de execução do yt-dlp
+EXECUTION_SUBPROCESS = 'subprocess'   # Um interpretador novo por URL
+EXECUTION_WARM = 'warm'               # Workers persistentes usando a API YoutubeDL
+EXECUTION_ASYNC = 'async'             # Um único event loop asyncio lê todos os subprocessos
+EXECUTION_REMOTE = 'remote'           # Coordenador: os jobs são executados por workers remotos (work_queue)
+
+FAILURE_REPORT_FILENAME = 'mp3-baixar-falhas.json'
+
+# Nome dos arquivos gerados: o ID no nome permite reconstruir o índice a partir da pasta (download_index)
+OUTPUT_TEMPLATE = '%(title)s [%(id)s].%(ext)s'
+
+# Jobs agendados e ainda não concluídos, por vaga do pool: a lista é consumida aos poucos,
+# então o primeiro download começa na hora e o estado por job fica limitado aos jobs em
+# andamento. Só a deduplicação cresce com o lote: uma chave curta por item (O(N))
+SUBMIT_WINDOW_FACTOR = 2
+
+
+class DownloadEngine:
+    """
+    Executa um lote de downloads/conversões para MP3 sem depender do Tk.
+    Os eventos são entregues aos callbacks registrados via subscribe(), sempre
+    na thread que os gerou (orquestrador ou workers).
+    """
+
+    def __init__(self, output_dir, audio_quality_flag='0', max_workers=DEFAULT_MAX_WORKERS,
+                 concurrent_fragments=DEFAULT_CONCURRENT_FRAGMENTS, ytdlp_executable=None,
+                 max_progress_rate=DEFAULT_MAX_PROGRESS_RATE, split_transcode=False,
+                 transcode_workers=DEFAULT_TRANSCODE_WORKERS, handoff_size=DEFAULT_HANDOFF_SIZE,
+                 ffmpeg_executable=None, execution_mode=EXECUTION_SUBPROCESS,
+                 ytdlp_module=DEFAULT_YTDLP_MODULE, use_index=False, expand_playlists=True,
+                 metadata_cache_dir=None, metadata_ttl=DEFAULT_TTL_SECONDS,
+                 metadata_cache_max_bytes=DEFAULT_MAX_BYTES, use_journal=False, resume=False,
+                 adaptive=False, min_jobs=DEFAULT_MIN_JOBS, max_jobs=DEFAULT_MAX_JOBS,
+                 min_fragments=DEFAULT_MIN_FRAGMENTS, max_fragments=DEFAULT_MAX_FRAGMENTS,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_base_delay=DEFAULT_BASE_DELAY,
+                 host_cooldown=DEFAULT_HOST_COOLDOWN, metrics=False, metrics_interval=DEFAULT_EXPORT_INTERVAL,
+                 profile_mode=None, prefer_copy=False, mp3_encoder=DEFAULT_MP3_ENCODER, transcode_threads=None,
+                 staging_dir=None, staging_max_bytes=None, coordinator_address=DEFAULT_ADDRESS,
+                 lease_timeout=DEFAULT_LEASE_TIMEOUT, work_queue_url=None, max_connections=None, max_rate=None,
+                 host_limits=None):
+        self.output_dir = output_dir
+        self.audio_quality_flag = audio_quality_flag
+        self.max_workers = max_workers
+        self.concurrent_fragments = concurrent_fragments
+        self.YTDLP_EXECUTABLE = list(ytdlp_executable or DEFAULT_YTDLP_EXECUTABLE)
+        self.max_progress_rate = max_progress_rate
+
+        # Pipeline em duas etapas: download (I/O) e conversão (CPU) com pools separados
+        # (no coordenador os arquivos ficam nos workers, que fazem a própria conversão)
+        self.split_transcode = split_transcode and execution_mode != EXECUTION_REMOTE
+        self.transcode_stage = (TranscodeStage(self, workers=transcode_workers, handoff_size=handoff_size,
+                                               ffmpeg_executable=ffmpeg_executable)
+                                if self.split_transcode else None)
+        self.downloading = 0
+
+        # Fontes MP3 com a qualidade pedida são copiadas; as demais passam pelo codificador escolhido
+        self.prefer_copy = prefer_copy
+        self.mp3_encoder = mp3_encoder
+        self.transcode_threads = transcode_threads
+        self.audio_paths = {}
+        self.remote_files = {}      # url -> MP3 gerado por um worker remoto (coordenador)
+        self.copied = 0
+        self.transcoded = 0
+
+        self.execution_mode = execution_mode
+        self.ytdlp_module = ytdlp_module
+        self.warm_pool = None
+
+        # Fila de jobs compartilhada: coordenador (modo 'remote') ou worker (work_queue_url)
+        self.coordinator_address = coordinator_address
+        self.lease_timeout = lease_timeout
+        self.work_queue = None
+        self.work_queue_url = work_queue_url
+
+        # Índice persistente (SQLite no diretório de saída) para pular itens já baixados
+        self.use_index = use_index
+        self.index = None
+        self.video_keys = {}
+
+        # Playlists/canais viram um job por entrada; o total do lote cresce durante a expansão
+        self.expand_playlists = expand_playlists
+        self.total_items = 0
+        self.total_final = False
+        self.last_total_emit = 0.0
+
+        # Cache de info dicts: itens com metadados frescos pulam a extração (--load-info-json)
+        self.metadata_cache_dir = metadata_cache_dir
+        self.metadata_ttl = metadata_ttl
+        self.metadata_cache_max_bytes = metadata_cache_max_bytes
+        self.metadata_cache = None
+
+        # Diário do lote no diretório de saída; resume=True continua o lote interrompido
+        self.use_journal = use_journal
+        self.resume = resume
+        self.journal = None
+        self.resume_done_keys = set()
+        self.resumed = 0
+
+        # Concorrência adaptativa: max_workers/concurrent_fragments viram os valores iniciais
+        self.adaptive = adaptive
+        self.concurrency_limits = (min_jobs, max_jobs, min_fragments, max_fragments)
+        self.controller = None
+        self.job_slots = None
+
+        # Retentativas: falhas transitórias voltam para a fila (submit_job é definido pelo orquestrador)
+        self.retry_options = (max_retries, retry_base_delay, host_cooldown)
+        self.retry_scheduler = None
+        self.submit_job = None
+        self.submit_window = None
+        self.job_output = {}
+
+        # Tempos por fase de cada job, exportados como JSON + Prometheus no diretório de saída
+        self.metrics_enabled = metrics
+        self.metrics_interval = metrics_interval
+        self.metrics = None
+        # Profiling opcional da thread orquestradora ('cprofile' ou 'tracemalloc')
+        self.profile_mode = profile_mode
+
+        # Orçamento global de conexões/banda dividido entre os downloads (limites None = sem limite)
+        self.bandwidth_limits = (max_connections, max_rate, host_limits)
+        self.budget = None
+
+        # Staging em disco local: o I/O temporário fica fora do diretório de saída até a publicação
+        self.staging_dir = staging_dir
+        self.staging_max_bytes = staging_max_bytes
+        self.staging = None
+
+        # --- Estado de Execução e Interrupção ---
+        self.stop_event = threading.Event()
+        self.active_processes = {}
+        self.listeners = []
+        self.counter_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.duplicates = 0
+
+    # --- API de Eventos ---
+    def subscribe(self, callback):
+        """Registra um callback(tipo, url, dados) para receber os eventos do motor."""
+        self.listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def emit(self, event_type, url=None, data=None):
+        for callback in list(self.listeners):
+            try:
+                callback(event_type, url, data)
+            except Exception as e:
+                # Um assinante com erro não deve derrubar o lote
+                print(f"Erro em assinante de eventos: {e}", file=sys.stderr)
+
+    def log_message(self, message, level='process'):
+        self.emit(EVENT_LOG, None, (message, level))
+
+    def emit_stage_stats(self):
+        """Publica ocupação de cada etapa e a profundidade da fila entre elas."""
+        stage = self.transcode_stage
+        self.emit(EVENT_STAGE_STATS, None, {
+            'downloading': self.downloading,
+            'download_workers': self.job_slots.limit if self.job_slots else self.max_workers,
+            'handoff_queue': stage.queue_depth() if stage else 0,
+            'handoff_size': stage.handoff_queue.maxsize if stage else 0,
+            'transcoding': stage.active if stage else 0,
+            'transcode_workers': stage.workers if stage else 0,
+        })
+
+    # --- Controle ---
+    def start(self, url_list):
+        """Executa o lote em uma thread de orquestração e a retorna."""
+        orchestrator_thread = threading.Thread(target=self.run, args=(url_list,), daemon=True)
+        orchestrator_thread.start()
+        return orchestrator_thread
+
+    def stop(self):
+        """Sinaliza e tenta encerrar processos ativos."""
+        if self.stop_event.is_set():
+            return
+
+        self.log_message("🚨 [INTERRUPÇÃO] Sinal de parada enviado. Tentando encerrar processos ativos...", 'warn')
+        self.stop_event.set()
+        if self.retry_scheduler is not None:
+            self.retry_scheduler.cancel_pending()
+
+        # Tentativa de Terminar Processos
+        for url, process in list(self.active_processes.items()):
+            if process.poll() is None:
+                try:
+                    process.terminate()
+                    self.log_message(f"🚫 Terminado: {url[:40]}...", 'warn')
+                except Exception as e:
+                    self.log_message(f"Erro ao terminar processo {url[:40]}: {e}", 'error')
+
+    # --- Funções de Processamento ---
+    def build_command(self, url, cache_key=None, info_json=None):
+        # Com o pipeline separado o yt-dlp só baixa o áudio original; a conversão fica com o TranscodeStage
+        extract_args = [] if self.split_transcode else [
+            '-x',
+            '--audio-format', 'mp3',
+            '--audio-quality', self.audio_quality_flag,
+        ]
+        if info_json is not None:
+            # Metadados em cache: nada de extração, o download começa direto
+            source_args = ['--load-info-json', info_json]
+        elif cache_key is not None:
+            source_args = ['--write-info-json', '-o', f'infojson:{self.metadata_cache.target_base(cache_key)}', url]
+        else:
+            source_args = [url]
+        output_args = self.ffmpeg_output_args()
+        if output_args and not self.split_transcode:
+            extract_args += ['--postprocessor-args', 'ExtractAudio+ffmpeg_o:' + ' '.join(output_args)]
+        fragments, rate = self.transfer_limits(url)
+        if rate is not None:
+            extract_args += ['--limit-rate', str(rate)]
+        return self.YTDLP_EXECUTABLE + extract_args + [
+            '--concurrent-fragments', str(fragments),
+            '-f', format_selector(self.audio_quality_flag, self.prefer_copy),
+            '-o', self.output_template(url),
+        ] + progress_template_args() + source_args
+
+    def output_template(self, url):
+        """Template -o do job: diretório de saída ou, com staging, o diretório do job na área local."""
+        directory = self.output_dir
+        staging = self.staging
+        if staging is not None:
+            directory = staging.job_dir(self.video_keys.get(url, url))
+        return os.path.join(directory, OUTPUT_TEMPLATE)
+
+    def ffmpeg_output_args(self):
+        """Codificador/threads escolhidos para o ExtractAudio do yt-dlp, ou None para o padrão dele."""
+        if self.mp3_encoder == DEFAULT_MP3_ENCODER and not self.transcode_threads:
+            return None
+        return encoder_args(self.audio_quality_flag, self.mp3_encoder, self.transcode_threads)
+
+    def build_ytdl_options(self, url, cache_key=None):
+        """Equivalente de build_command() para a API YoutubeDL dos workers persistentes."""
+        output_template = self.output_template(url)
+        fragments, rate = self.transfer_limits(url)
+        options = {
+            'format': format_selector(self.audio_quality_flag, self.prefer_copy),
+            'outtmpl': output_template,
+            'concurrent_fragment_downloads': fragments,
+            'quiet': True,
+            'noprogress': True,
+        }
+        if rate is not None:
+            options['ratelimit'] = rate
+        if cache_key is not None:
+            options['writeinfojson'] = True
+            options['outtmpl'] = {'default': output_template,
+                                  'infojson': self.metadata_cache.target_base(cache_key)}
+        if not self.split_transcode:
+            options['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': self.audio_quality_flag,
+            }]
+            output_args = self.ffmpeg_output_args()
+            if output_args:
+                options['postprocessor_args'] = {'extractaudio+ffmpeg_o': output_args}
+        return options
+
+    # --- Orçamento de Banda ---
+    def transfer_limits(self, url):
+        """(fragmentos, bytes/s ou None) do download: a fatia reservada no orçamento global."""
+        allocation = self.budget.allocation(url) if self.budget is not None else None
+        if allocation is None:
+            return self.concurrent_fragments, None
+        return allocation.connections, allocation.rate
+
+    def allocate_bandwidth(self, url):
+        """Reserva a fatia do orçamento para o download que vai começar (pode esperar uma fatia livre)."""
+        budget = self.budget
+        if budget is None or not budget.enabled or self.work_queue is not None:
+            return # Sem limites não há o que dividir; no coordenador cada worker tem o próprio orçamento
+        slots = self.job_slots
+        sharers = slots.limit if slots is not None else self.max_workers
+        if self.total_final:
+            # Fim do lote: os últimos jobs dividem o orçamento só entre si
+            sharers = min(sharers, max(1, self.total_items - self.completed - self.failed))
+        allocation = budget.allocate(url, self.concurrent_fragments, sharers)
+        if allocation is None:
+            return # Parado enquanto esperava: o subprocesso, se iniciar, é encerrado na primeira linha
+        rate = 'sem limite' if allocation.rate is None else f"{format_bytes(allocation.rate)}/s"
+        self.log_message(f"🚦 {allocation.connections} conexões, {rate}: {url[:50]}...", 'process')
+
+    def release_bandwidth(self, url):
+        # Só emite estado se o job tinha reserva (não há nenhuma com o orçamento desligado)
+        if self.budget is not None:
+            self.budget.release(url)
+
+    def set_bandwidth_limits(self, max_connections=None, max_rate=None):
+        """Ajusta o orçamento global, inclusive durante o lote (vale a partir do próximo download)."""
+        self.bandwidth_limits = (max_connections, max_rate, self.bandwidth_limits[2])
+        if self.budget is not None:
+            self.budget.set_limits(max_connections, max_rate)
+
+    def update_downloading(self, delta):
+        with self.counter_lock:
+            self.downloading += delta
+        self.emit_stage_stats()
+
+    def process_spawned(self, url):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.process_spawned(url)
+
+    def observe_output(self, url, line):
+        """Linha de saída (não-progresso) de um job: guardada para classificar falhas e vista pelo controle."""
+        output = self.job_output.get(url)
+        if output is not None:
+            output.append(line)
+        if COPY_MARKER in line:
+            self.audio_paths[url] = AUDIO_PATH_COPY
+        elif TRANSCODE_MARKER in line:
+            self.audio_paths[url] = AUDIO_PATH_TRANSCODE
+        controller = self.controller
+        if controller is not None:
+            controller.observe_output(line)
+
+    def journal_state(self, url, state):
+        if self.journal is not None:
+            self.journal.transition(self.video_keys.get(url, url), url, state)
+
+    def record_result(self, url, ok, return_code=None, skipped=False, audio_path=None):
+        with self.counter_lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self.journal_state(url, STATE_DONE if ok else STATE_FAILED)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.job_finished(url, ok)
+        controller = self.controller
+        if controller is not None and not skipped:
+            controller.observe_result(ok)
+        self.emit(EVENT_ITEM_DONE, url, {'total': self.total_items, 'ok': ok, 'return_code': return_code,
+                                         'skipped': skipped, 'audio_path': audio_path})
+        # Resultado final do item (retentativas não passam por aqui): a chave só fica em seen_keys
+        self.video_keys.pop(url, None)
+
+    def schedule_retry(self, url, category):
+        """Devolve o job à fila se a falha for transitória; retorna True se uma retentativa foi agendada."""
+        scheduler = self.retry_scheduler
+        delay = scheduler.retry(url, category) if scheduler is not None else None
+        if delay is None:
+            return False
+        self.log_message(f"🔁 [RETENTATIVA {scheduler.attempts[url]}/{scheduler.max_retries}] Falha de {category}; "
+                         f"nova tentativa em {delay:.0f}s: {url[:50]}...", 'warn')
+        self.journal_state(url, STATE_QUEUED)
+        controller = self.controller
+        if controller is not None:
+            controller.observe_result(False)
+        return True
+
+    def record_failure(self, url, category, detail, return_code=None):
+        """Registra uma falha permanente para o relatório do fim do lote."""
+        if self.retry_scheduler is not None:
+            self.retry_scheduler.mark_permanent(url, category, detail, return_code)
+
+    def defer_for_cooldown(self, url):
+        """Adia (sem ocupar vaga) um job cujo host está em resfriamento por throttling."""
+        scheduler = self.retry_scheduler
+        if scheduler is None or self.stop_event.is_set():
+            return False
+        remaining = scheduler.cooldown_remaining(url)
+        if remaining <= 0:
+            return False
+        self.log_message(f"⏸️ Host em resfriamento por {remaining:.0f}s, adiando: {url[:50]}...", 'process')
+        scheduler.defer(url)
+        return True
+
+    def finish_job(self, url, ok, return_code, files=None, category=None, audio_path=None):
+        """Atualização de Progresso Geral e Log Final de um item."""
+        output = self.job_output.pop(url, ())
+        # Pipeline separado informa o caminho; com -x ele foi visto na saída do yt-dlp
+        detected_path = self.audio_paths.pop(url, None)
+        audio_path = audio_path or detected_path
+        remote_file = self.remote_files.pop(url, None)
+        staging = self.staging
+        if ok and staging is not None:
+            try:
+                files = staging.publish(self.video_keys.get(url, url), self.output_dir)
+            except OSError as e:
+                self.log_message(f"🚨 Falha ao publicar {url[:50]} no diretório de saída: {e}", 'error')
+                ok = False
+                category = FAILURE_UNKNOWN
+        if not ok:
+            detected, detail = classify_failure(output)
+            category = category or detected
+            # Na retentativa o diretório do job fica no staging para o yt-dlp continuar os .part
+            if self.schedule_retry(url, category):
+                return
+            self.record_failure(url, category, detail, return_code)
+            if staging is not None and not self.stop_event.is_set():
+                staging.discard(self.video_keys.get(url, url)) # Job interrompido pelo stop: fica para o --resume
+
+        if ok and self.index is not None and files and len(files) == 1:
+            # Só itens de um único arquivo entram no índice (uma playlist não é "um vídeo concluído")
+            mp3_path = os.path.splitext(files[0])[0] + '.mp3'
+            if os.path.isfile(mp3_path):
+                self.index.record(self.video_keys.get(url, url), url, mp3_path, self.audio_quality_flag)
+        if ok and self.index is not None and remote_file is not None:
+            # Coordenador: o MP3 está na máquina do worker, o índice daqui guarda onde
+            self.index.record_remote(self.video_keys.get(url, url), url, remote_file['worker'],
+                                     remote_file['path'], remote_file['size'], remote_file['quality'])
+        if ok:
+            with self.counter_lock:
+                if audio_path == AUDIO_PATH_COPY:
+                    self.copied += 1
+                elif audio_path == AUDIO_PATH_TRANSCODE:
+                    self.transcoded += 1
+        self.record_result(url, ok, return_code, audio_path=audio_path if ok else None)
+        if ok:
+            label = {AUDIO_PATH_COPY: " (cópia, sem recodificar)", AUDIO_PATH_TRANSCODE: " (recodificado)"}
+            self.log_message(f"✅ [SUCESSO] Concluído{label.get(audio_path, '')}: {url[:50]}...", 'success')
+        else:
+            self.log_message(f"❌ [FALHA] URL falhou com código {return_code} ({category}): {url[:50]}...", 'warn')
+
+    def run_process(self, url, command, on_record=None):
+        """
+        Executa um subprocesso registrado em active_processes (para stop()) e lê sua saída.
+        Linhas de progresso estruturado viram ProgressRecord; as demais viram log.
+        """
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        self.active_processes[url] = process
+        self.process_spawned(url)
+        rate_limiter = ProgressRateLimiter(self.max_progress_rate)
+        try:
+            # Parse do progresso estruturado nesta thread; as demais linhas viram log
+            for line in iter(process.stdout.readline, ''):
+                if self.stop_event.is_set():
+                    self.log_message(f"🚫 [INTERROMPENDO] Encerrando subprocesso de {url[:40]}...", 'warn')
+                    process.terminate()
+                    break
+
+                record = parse_progress_line(line)
+                if record is None:
+                    if line.strip():
+                        self.observe_output(url, line)
+                        self.log_message(line.rstrip(), 'process')
+                    continue
+                self.handle_record(url, record, rate_limiter, on_record)
+
+            process.stdout.close()
+            return process.wait()
+        finally:
+            if self.active_processes.get(url) is process:
+                del self.active_processes[url]
+
+    def handle_record(self, url, record, rate_limiter, on_record=None):
+        if on_record is not None:
+            on_record(record)
+        if record.phase == PHASE_POSTPROCESS:
+            # Conversão do -x no mesmo processo: as conexões já foram fechadas
+            self.release_bandwidth(url)
+        controller = self.controller
+        if controller is not None:
+            controller.observe_record(url, record)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.observe_record(url, record)
+        if rate_limiter.allow(record):
+            self.emit(EVENT_PROGRESS, url, record)
+
+    def run_warm_job(self, url, on_record=None, cache_key=None, info_json=None):
+        """Executa a URL em um worker persistente; o handle entra em active_processes para stop()."""
+        rate_limiter = ProgressRateLimiter(self.max_progress_rate)
+        handles = []
+
+        def on_start(handle):
+            handles.append(handle)
+            self.active_processes[url] = handle
+            self.process_spawned(url)
+
+        def on_message(message):
+            if message[0] == MSG_PROGRESS:
+                self.handle_record(url, message[1], rate_limiter, on_record)
+            elif message[0] == MSG_LOG:
+                self.observe_output(url, message[1])
+                self.log_message(message[1], message[2])
+
+        try:
+            return self.warm_pool.run_job(url, self.build_ytdl_options(url, cache_key if info_json is None else None),
+                                          self.max_progress_rate, on_message, on_start=on_start,
+                                          info_json=info_json)
+        finally:
+            if handles and self.active_processes.get(url) is handles[0]:
+                del self.active_processes[url]
+
+    def run_remote_job(self, url, on_record=None):
+        """Entrega a URL à fila do coordenador e espera o resultado de um worker remoto."""
+        rate_limiter = ProgressRateLimiter(self.max_progress_rate)
+        handles = []
+
+        def on_start(handle):
+            handles.append(handle)
+            self.active_processes[url] = handle
+
+        def on_message(message):
+            if message[0] == MSG_PROGRESS:
+                self.handle_record(url, message[1], rate_limiter, on_record)
+            elif message[0] == MSG_LEASED:
+                self.process_spawned(url)
+                self.log_message(f"🌐 [WORKER {message[1]}] {url[:50]}...", 'process')
+            elif message[0] == MSG_LOG:
+                self.log_message(message[1], message[2])
+
+        try:
+            result = self.work_queue.run_job(url, on_message, on_start=on_start)
+        finally:
+            if handles and self.active_processes.get(url) is handles[0]:
+                del self.active_processes[url]
+        if result.get('detail'):
+            # A linha de erro do worker passa pela mesma classificação (retentativas e resfriamento daqui)
+            self.observe_output(url, result['detail'])
+        if result.get('audio_path'):
+            self.audio_paths[url] = result['audio_path']
+        if result.get('file') and result.get('worker'):
+            self.remote_files[url] = dict(result['file'], worker=result['worker'])
+        return result['return_code']
+
+    def lookup_metadata(self, url):
+        """Retorna (chave do cache, .info.json fresco ou None) para a URL; (None, None) sem cache."""
+        if self.metadata_cache is None or looks_like_collection(url):
+            return None, None
+        cache_key = self.video_keys.get(url) or extract_video_key(url)
+        return cache_key, self.metadata_cache.lookup(cache_key)
+
+    def store_metadata(self, url, cache_key, info_json, return_code):
+        if cache_key is None or self.stop_event.is_set():
+            return
+        if info_json is None:
+            # O yt-dlp escreve o info json antes do download: serve para retentativas mesmo em falha
+            self.metadata_cache.commit(cache_key)
+        elif return_code != 0:
+            self.log_message(f"🗃️ Metadados em cache descartados após falha: {url[:50]}...", 'warn')
+            self.metadata_cache.invalidate(cache_key)
+
+    def download_single_url(self, url):
+        """Lógica de download para uma única URL em uma thread."""
+        if self.defer_for_cooldown(url):
+            return
+        self.wait_for_staging_space(url)
+        # A vaga (limite ajustável) cobre só a etapa de download; a conversão separada tem seu pool
+        with self.job_slots:
+            self.download_job(url)
+
+    def wait_for_staging_space(self, url):
+        """Segura um job novo enquanto o staging estiver acima do limite e outros jobs puderem liberá-lo."""
+        staging = self.staging
+        key = self.video_keys.get(url, url)
+        if staging is None or staging.max_bytes is None or staging.has_job_dir(key):
+            return # Retentativas já ocupam o seu espaço: não esperam (nem travam as demais)
+        waiting = False
+        while staging.full() and staging.active_jobs() and not self.stop_event.is_set():
+            if not waiting:
+                waiting = True
+                self.log_message(f"💽 Staging cheio ({format_bytes(staging.usage())} de "
+                                 f"{format_bytes(staging.max_bytes)}); aguardando espaço: {url[:50]}...", 'process')
+            time.sleep(SPACE_POLL_INTERVAL)
+
+    def begin_job(self, url):
+        """Anuncia o job; retorna False (e encerra o job) se o lote já foi parado."""
+        self.emit(EVENT_JOB_START, url)
+
+        if self.stop_event.is_set():
+            self.log_message(f"🚫 [CANCELADO] Pulando {url[:40]}... (Orquestrador Parou)", 'warn')
+            self.emit(EVENT_JOB_END, url)
+            return False
+
+        self.log_message(f"[INÍCIO] Processando URL: {url[:50]}...", 'process')
+        self.journal_state(url, STATE_DOWNLOADING)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.job_started(url)
+        self.job_output[url] = deque(maxlen=JOB_OUTPUT_LINES)
+        return True
+
+    def file_collector(self, url):
+        """Retorna (lista de arquivos baixados, callback on_record que a preenche)."""
+        downloaded_files = []
+        converting = []
+
+        def collect_file(record):
+            if record.phase == PHASE_DOWNLOAD and record.status == 'finished' and record.filename:
+                if record.filename not in downloaded_files:
+                    downloaded_files.append(record.filename)
+            elif record.phase == PHASE_POSTPROCESS and not converting:
+                # Conversão feita pelo próprio yt-dlp (-x)
+                converting.append(True)
+                self.journal_state(url, STATE_CONVERTING)
+
+        return downloaded_files, collect_file
+
+    def complete_download(self, url, return_code, downloaded_files):
+        """
+        Encerra a etapa de download: entrega à conversão (pipeline separado) ou registra o
+        resultado. Retorna True se o job foi entregue ao TranscodeStage (que emite o JOB_END).
+        """
+        if self.stop_event.is_set():
+            return False
+        if return_code == 0 and self.transcode_stage is not None:
+            if not downloaded_files:
+                self.log_message(f"🚨 Arquivo baixado não identificado para conversão: {url[:50]}", 'error')
+                self.finish_job(url, False, return_code)
+                return False
+            # Libera o slot de download; a conversão segue no pool de CPU
+            self.emit(EVENT_PROGRESS, url, ProgressRecord(PHASE_POSTPROCESS, 'queued'))
+            self.journal_state(url, STATE_CONVERTING)
+            self.transcode_stage.submit(url, downloaded_files)
+            return True
+        self.finish_job(url, return_code == 0, return_code, downloaded_files)
+        return False
+
+    def download_job(self, url):
+        if not self.begin_job(url):
+            return
+
+        downloaded_files, collect_file = self.file_collector(url)
+        handed_off = False
+        try:
+            cache_key, info_json = self.lookup_metadata(url)
+            self.allocate_bandwidth(url)
+            self.update_downloading(+1)
+            try:
+                if self.work_queue is not None:
+                    return_code = self.run_remote_job(url, on_record=collect_file)
+                elif self.warm_pool is not None:
+                    return_code = self.run_warm_job(url, on_record=collect_file,
+                                                    cache_key=cache_key, info_json=info_json)
+                else:
+                    return_code = self.run_process(url, self.build_command(url, cache_key, info_json),
+                                                   on_record=collect_file)
+            finally:
+                self.release_bandwidth(url)
+                self.update_downloading(-1)
+            self.store_metadata(url, cache_key, info_json, return_code)
+            handed_off = self.complete_download(url, return_code, downloaded_files)
+
+        except Exception as e:
+            self.record_failure(url, FAILURE_UNKNOWN, str(e))
+            self.record_result(url, False)
+            self.log_message(f"🚨 [ERRO FATAL] Falha em {url[:50]}: {e}", 'error')
+
+        finally:
+            if not handed_off:
+                self.emit(EVENT_JOB_END, url)
+
+    def update_total(self, final=False):
+        """Publica o total atual do lote (limitado a ~4 eventos/s enquanto cresce)."""
+        now = time.monotonic()
+        if final or now - self.last_total_emit >= 0.25:
+            self.last_total_emit = now
+            self.total_final = final
+            self.emit(EVENT_BATCH_TOTAL, None, {'total': self.total_items, 'final': final})
+
+    def admit(self, url, seen_keys):
+        """
+        Decide o destino de uma URL já expandida: False para duplicadas (mesmo vídeo no lote)
+        e para itens que o índice já marca como completos; True se deve ser agendada.
+        """
+        key = extract_video_key(url)
+        if key in seen_keys:
+            self.duplicates += 1
+            return False
+        seen_keys.add(key)
+        self.video_keys[url] = key
+        self.total_items += 1
+
+        if self.index is not None and self.index.lookup(key, self.audio_quality_flag,
+                                                        remote=self.execution_mode == EXECUTION_REMOTE):
+            # Itens já presentes no índice contam como concluídos sem iniciar processo algum
+            self.skipped += 1
+            self.log_message(f"⏭️ [JÁ BAIXADO] Pulando: {url[:50]}...", 'process')
+            self.record_result(url, True, skipped=True)
+            return False
+
+        if key in self.resume_done_keys:
+            # Concluído antes da interrupção do lote (diário)
+            self.resumed += 1
+            self.log_message(f"⏭️ [JÁ CONCLUÍDO NO LOTE] Pulando: {url[:50]}...", 'process')
+            self.record_result(url, True, skipped=True)
+            return False
+        self.journal_state(url, STATE_QUEUED)
+        return True
+
+    def open_journal(self, url_list):
+        """Abre o diário do lote; na retomada carrega os itens concluídos antes da interrupção."""
+        # Um arquivo importado é registrado pelo caminho (relido na retomada), não copiado para o diário
+        source = url_list.path if isinstance(url_list, UrlFileSource) else None
+        snapshot = load_journal(self.output_dir) if self.resume else None
+        if snapshot is not None:
+            self.resume_done_keys = snapshot.done_keys
+            # O yt-dlp continua dos .part/.ytdl existentes (--continue é o padrão)
+            self.log_message(f"♻️ Retomando lote interrompido: {len(self.resume_done_keys)} itens concluídos serão "
+                             f"pulados, {snapshot.count(*IN_FLIGHT_STATES)} em andamento continuarão "
+                             f"dos arquivos parciais.", 'info')
+        self.journal = BatchJournal(self.output_dir, None if source else url_list, resume=snapshot is not None,
+                                    source=source)
+
+    def report_admission(self):
+        """Resumo do que a admissão descartou (chamado quando a expansão termina)."""
+        if self.duplicates:
+            self.log_message(f"🔁 {self.duplicates} URLs duplicadas removidas do lote.", 'info')
+        if self.skipped:
+            self.log_message(f"⏭️ {self.skipped} itens já baixados foram pulados (índice).", 'info')
+        if self.resumed:
+            self.log_message(f"♻️ {self.resumed} itens concluídos antes da interrupção foram pulados.", 'info')
+
+    def report_failures(self, failures):
+        """Loga as falhas permanentes do lote e as grava em FAILURE_REPORT_FILENAME no diretório de saída."""
+        report_path = os.path.join(self.output_dir, FAILURE_REPORT_FILENAME)
+        if not failures:
+            # Um relatório de um lote anterior não deve parecer deste
+            try:
+                os.remove(report_path)
+            except OSError:
+                pass
+            return
+        self.log_message(f"📋 Relatório de falhas: {len(failures)} itens falharam de forma permanente.", 'warn')
+        for failure in failures:
+            self.log_message(f"   [{failure['category']}] {failure['url']} "
+                             f"({failure['attempts']} tentativas): {failure['detail'][:120]}", 'warn')
+        try:
+            with open(report_path, 'w', encoding='utf-8') as report_file:
+                json.dump({'generated_at': time.time(), 'failures': failures}, report_file,
+                          ensure_ascii=False, indent=2)
+            self.log_message(f"📋 Relatório salvo em {report_path}", 'info')
+        except OSError as e:
+            self.log_message(f"🚨 Falha ao salvar o relatório de falhas: {e}", 'error')
+
+    def finish_metrics(self):
+        """Grava o resumo final das métricas e o retorna (sem a lista por job), ou None se desativadas."""
+        metrics = self.metrics
+        if metrics is None:
+            return None
+        self.metrics = None
+        try:
+            summary = metrics.finish()
+        except OSError as e:
+            self.log_message(f"🚨 Falha ao exportar as métricas: {e}", 'error')
+            return None
+        phases = summary['phases']
+
+        def quantiles(phase):
+            stats = phases[phase]
+            if stats['p50'] is None:
+                return "?"
+            return f"{stats['p50']:.1f}s/{stats['p95']:.1f}s"
+
+        self.log_message(f"📈 Métricas: {summary['tracks_per_minute']:.1f} faixas/min, "
+                         f"{summary['megabytes_per_second']:.2f} MB/s; p50/p95 extração {quantiles('extraction')}, "
+                         f"download {quantiles('download')}, conversão {quantiles('postprocess')}, "
+                         f"total {quantiles('total')}.", 'info')
+        self.log_message(f"📈 Métricas salvas em {metrics.json_path} e {metrics.prom_path}", 'info')
+        return {key: value for key, value in summary.items() if key != 'jobs'}
+
+    def run_threaded(self, url_list, pool_size):
+        """Agendamento com um Pool de Threads: cada job ativo ocupa uma thread (modos subprocess e warm)."""
+        # Janela de submissão: o orquestrador (e o agendador de retentativas) bloqueiam com a janela cheia
+        window = threading.Semaphore(self.submit_window)
+        outstanding = [0]
+        outstanding_changed = threading.Condition()
+
+        def job_done(future):
+            window.release()
+            try:
+                future.result()
+            except Exception as e:
+                self.log_message(f"🚨 [ERRO NA THREAD DE DOWNLOAD]: {e}", 'error')
+            with outstanding_changed:
+                outstanding[0] -= 1
+                outstanding_changed.notify_all()
+
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            def submit_job(url):
+                window.acquire()
+                with outstanding_changed:
+                    outstanding[0] += 1
+                executor.submit(self.download_single_url, url).add_done_callback(job_done)
+            self.submit_job = submit_job
+
+            # As entradas chegam da expansão em segundo plano e são agendadas conforme a janela libera
+            seen_keys = set()
+            for url in PlaylistExpander(self, url_list).start():
+                if self.stop_event.is_set():
+                    continue # Só esvazia o que a expansão já tinha lido
+                if self.admit(url, seen_keys):
+                    self.submit_job(url)
+                self.update_total()
+            self.update_total(final=True)
+            self.report_admission()
+
+            # Aguarda os jobs (inclusive retentativas). Sob a trava a contagem não muda: uma
+            # retentativa ainda em trânsito mantém o agendador não ocioso até ser contada
+            with outstanding_changed:
+                while outstanding[0] or not self.retry_scheduler.idle():
+                    outstanding_changed.wait(0.2)
+
+    def run(self, url_list):
+        """Orquestra o lote (bloqueante): preparação, agendamento no modo escolhido e encerramento."""
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.total_items = 0
+        self.resumed = 0
+        self.resume_done_keys = set()
+        self.video_keys = {}
+        self.job_output = {}
+        self.audio_paths = {}
+        self.remote_files = {}
+        self.copied = 0
+        self.transcoded = 0
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        profiler = ProfileHook(self.profile_mode, self.output_dir, 'orchestrator').start() if self.profile_mode else None
+        self.emit(EVENT_BATCH_START, None, 0)
+        if self.metrics_enabled:
+            self.metrics = BatchMetrics(self.output_dir, interval=self.metrics_interval)
+            self.metrics.start()
+        if self.use_index:
+            self.index = DownloadIndex(self.output_dir)
+        if self.use_journal:
+            self.open_journal(url_list)
+        if self.staging_dir:
+            self.staging = StagingArea(self.staging_dir, self.output_dir, max_bytes=self.staging_max_bytes)
+            removed = self.staging.open()
+            self.log_message(f"💽 Staging local em {self.staging.batch_dir}"
+                             f"{f' ({removed} lotes abandonados removidos)' if removed else ''}.", 'info')
+        if self.metadata_cache_dir and self.execution_mode != EXECUTION_REMOTE:
+            self.metadata_cache = MetadataCache(self.metadata_cache_dir, ttl=self.metadata_ttl,
+                                                max_bytes=self.metadata_cache_max_bytes)
+        if self.transcode_stage is not None:
+            self.transcode_stage.start()
+        max_connections, max_rate, host_limits = self.bandwidth_limits
+        self.budget = BandwidthBudget(self, max_connections=max_connections, max_rate=max_rate,
+                                      host_limits=host_limits)
+        if self.budget.enabled:
+            self.log_message(f"🚦 Orçamento global: {self.budget.describe_limits()}.", 'info')
+            self.budget.emit_state()
+        max_retries, retry_base_delay, host_cooldown = self.retry_options
+        if self.work_queue_url is not None:
+            max_retries = 0 # No worker cada arrendamento é uma tentativa; quem reagenda é o coordenador
+        self.retry_scheduler = RetryScheduler(self, max_retries=max_retries, base_delay=retry_base_delay,
+                                              host_cooldown=host_cooldown)
+
+        # O pool de threads é dimensionado pelo teto; quem limita os jobs simultâneos são as vagas
+        pool_size = self.max_workers
+        self.job_slots = JobSlots(self.max_workers, self.stop_event)
+        if self.adaptive:
+            min_jobs, max_jobs, min_fragments, max_fragments = self.concurrency_limits
+            self.controller = AdaptiveConcurrency(self, min_jobs=min_jobs, max_jobs=max_jobs,
+                                                  min_fragments=min_fragments, max_fragments=max_fragments)
+            pool_size = self.controller.max_jobs
+            self.controller.start()
+            self.log_message(f"🎛️ Concorrência adaptativa: {self.controller.min_jobs}-{self.controller.max_jobs} jobs, "
+                             f"{self.controller.min_fragments}-{self.controller.max_fragments} fragmentos.", 'info')
+        else:
+            self.emit(EVENT_CONCURRENCY, None, {'jobs': self.max_workers, 'fragments': self.concurrent_fragments,
+                                                'throughput': None, 'cpu': None, 'adaptive': False})
+        self.submit_window = pool_size * SUBMIT_WINDOW_FACTOR
+
+        try:
+            if self.execution_mode == EXECUTION_ASYNC:
+                AsyncOrchestrator(self).run(url_list)
+            else:
+                if self.execution_mode == EXECUTION_WARM:
+                    self.log_message(f"♨️ Iniciando {pool_size} workers persistentes do yt-dlp...", 'info')
+                    self.warm_pool = WarmWorkerPool(pool_size, ytdlp_module=self.ytdlp_module)
+                if self.execution_mode == EXECUTION_REMOTE:
+                    self.work_queue = WorkQueueCoordinator(self.coordinator_address,
+                                                           lease_timeout=self.lease_timeout).start()
+                    self.log_message(f"🌐 Coordenador aguardando workers em {self.work_queue.url} "
+                                     f"({pool_size} jobs remotos simultâneos).", 'info')
+                if self.work_queue_url is not None:
+                    # Worker: as URLs vêm arrendadas do coordenador, uma por vaga livre
+                    WorkQueueWorker(self, self.work_queue_url).run(pool_size)
+                else:
+                    self.run_threaded(url_list, pool_size)
+
+        except Exception as e:
+            self.log_message(f"🚨 [ERRO FATAL NO ORQUESTRADOR]: {e}", 'error')
+        finally:
+            if self.controller is not None:
+                self.controller.stop()
+                self.controller = None
+            failures = self.retry_scheduler.failures
+            self.retry_scheduler.close()
+            if self.warm_pool is not None:
+                self.warm_pool.close()
+                self.warm_pool = None
+            if self.work_queue is not None:
+                self.work_queue.close()
+                self.work_queue = None
+            self.budget = None
+            if self.transcode_stage is not None:
+                # Downloads encerrados: espera a etapa de conversão esvaziar a fila
+                self.transcode_stage.finish()
+            if self.staging is not None:
+                # Nada a publicar: num lote parado os .part ficam para o --resume; senão só restam falhas
+                self.staging.close(keep=self.stop_event.is_set() and self.journal is not None)
+                self.staging = None
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+            if self.journal is not None:
+                self.journal.close(stopped=self.stop_event.is_set(), failed=self.failed)
+                self.journal = None
+            cache_stats = None
+            if self.metadata_cache is not None:
+                cache_stats = self.metadata_cache.stats()
+                self.log_message(f"🗃️ Cache de metadados: {cache_stats['hits']} acertos, "
+                                 f"{cache_stats['misses']} falhas.", 'info')
+                self.metadata_cache.close()
+                self.metadata_cache = None
+            self.report_failures(failures)
+            if self.copied:
+                self.log_message(f"⏩ {self.copied} itens copiados sem recodificar, {self.transcoded} recodificados.",
+                                 'info')
+            metrics_summary = self.finish_metrics()
+            if profiler is not None:
+                self.log_message(f"🔬 Profiling do orquestrador salvo em {profiler.stop()}", 'info')
+            self.emit(EVENT_BATCH_END, None, {'total': self.total_items,
+                                              'completed': self.completed,
+                                              'failed': self.failed,
+                                              'stopped': self.stop_event.is_set(),
+                                              'metadata_cache': cache_stats,
+                                              'retried': self.retry_scheduler.retried,
+                                              'failures': failures,
+                                              'audio_paths': {AUDIO_PATH_COPY: self.copied,
+                                                              AUDIO_PATH_TRANSCODE: self.transcoded},
+                                              'metrics': metrics_summary})
+        return self.failed == 0 and not self.stop_event.is_set()
@@ -0,0 +1,150 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Índice persistente dos downloads concluídos (SQLite no diretório de saída).
+# Mapeia o ID do vídeo para o MP3 gerado, permitindo pular itens já baixados
+# sem iniciar nenhum processo e colapsar URLs duplicadas antes do agendamento.
+# No coordenador (work_queue) as entradas apontam para o MP3 na máquina do
+# worker que o gerou: não há como conferir o arquivo, então só valem para
+# outros lotes coordenados.
+
+INDEX_FILENAME = '.mp3-baixar-index.sqlite3'
+
+YOUTUBE_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                 'youtube-nocookie.com', 'www.youtube-nocookie.com')
+# Parâmetros que não mudam o conteúdo apontado pela URL
+IGNORED_QUERY_PARAMS = {'feature', 'si', 'pp', 'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content'}
+# Nome de arquivo gerado pelo motor (download_engine.OUTPUT_TEMPLATE): "Título [ID].mp3", ou
+# "Título [ID] (2).mp3" nas saídas antigas, em que a publicação ainda numerava duplicatas
+FILENAME_ID_RE = re.compile(r'\[([0-9A-Za-z_-]{11})\](?: \(\d+\))?\.mp3$')
+
+
+def extract_video_key(url):
+    """
+    Chave estável do conteúdo apontado pela URL: 'youtube:<ID>' para as várias formas de
+    link do YouTube (watch, youtu.be, shorts, embed, live) ou 'url:<URL normalizada>'.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    path_segments = [segment for segment in parts.path.split('/') if segment]
+
+    video_id = None
+    if host in ('youtu.be', 'www.youtu.be') and path_segments:
+        video_id = path_segments[0]
+    elif host in YOUTUBE_HOSTS:
+        query = dict(parse_qsl(parts.query))
+        if path_segments[:1] == ['watch']:
+            video_id = query.get('v')
+        elif len(path_segments) >= 2 and path_segments[0] in ('shorts', 'embed', 'live', 'v'):
+            video_id = path_segments[1]
+    if video_id and YOUTUBE_ID_RE.match(video_id):
+        return f'youtube:{video_id}'
+
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_QUERY_PARAMS)
+    normalized = urlunsplit((parts.scheme.lower() or 'https', host, parts.path.rstrip('/'), urlencode(query), ''))
+    return f'url:{normalized}'
+
+
+class DownloadIndex:
+    """Tabela video_key -> (arquivo, tamanho, qualidade) com acesso thread-safe."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, INDEX_FILENAME)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    video_key TEXT PRIMARY KEY,
+                    url TEXT,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    quality TEXT,
+                    completed_at REAL
+                )""")
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(downloads)')}
+            if 'worker' not in columns:
+                # Índices anteriores à fila distribuída
+                self.conn.execute('ALTER TABLE downloads ADD COLUMN worker TEXT')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def lookup(self, video_key, quality=None, remote=False):
+        """
+        Retorna o caminho do MP3 se o item já estiver completo (arquivo presente e na qualidade pedida).
+        remote=True (coordenador) aceita também os itens gerados por workers, sem conferir o arquivo.
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT path, size, quality, worker FROM downloads WHERE video_key = ?',
+                                    (video_key,)).fetchone()
+        if row is None:
+            return None
+        path, size, recorded_quality, worker = row
+        # Qualidade desconhecida (entrada vinda de rebuild sem flag) é aceita
+        if quality is not None and recorded_quality is not None and recorded_quality != quality:
+            return None
+        if worker is not None:
+            return f"{worker}:{path}" if remote else None
+        try:
+            if os.path.getsize(path) != size:
+                return None
+        except OSError:
+            return None
+        return path
+
+    def record(self, video_key, url, path, quality):
+        self.insert(video_key, url, os.path.abspath(path), os.path.getsize(path), quality, None)
+
+    def record_remote(self, video_key, url, worker, path, size, quality):
+        """Item concluído por um worker remoto (o caminho é o da máquina dele)."""
+        self.insert(video_key, url, path, size, quality, worker)
+
+    def insert(self, video_key, url, path, size, quality, worker):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO downloads (video_key, url, path, size, quality, '
+                              'completed_at, worker) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (video_key, url, path, size, quality, time.time(), worker))
+
+    def rebuild(self):
+        """
+        Reconcilia o índice com o diretório de saída: remove entradas cujo arquivo sumiu,
+        atualiza tamanhos e adiciona MP3 com o ID do YouTube no nome ("Título [ID].mp3"),
+        com qualidade desconhecida (NULL). Entradas de workers remotos são mantidas.
+        Retorna (mantidos, removidos, adicionados).
+        """
+        kept = removed = added = 0
+        with self.lock, self.conn:
+            known_paths = set()
+            for video_key, path, worker in self.conn.execute(
+                    'SELECT video_key, path, worker FROM downloads').fetchall():
+                if worker is not None:
+                    kept += 1 # Arquivo em outra máquina: nada a conferir aqui
+                elif os.path.isfile(path):
+                    self.conn.execute('UPDATE downloads SET size = ? WHERE video_key = ?',
+                                      (os.path.getsize(path), video_key))
+                    known_paths.add(os.path.abspath(path))
+                    kept += 1
+                else:
+                    self.conn.execute('DELETE FROM downloads WHERE video_key = ?', (video_key,))
+                    removed += 1
+
+            for entry in os.scandir(self.output_dir):
+                if not entry.is_file() or os.path.abspath(entry.path) in known_paths:
+                    continue
+                match = FILENAME_ID_RE.search(entry.name)
+                if match:
+                    cursor = self.conn.execute('INSERT OR IGNORE INTO downloads (video_key, path, size, completed_at) '
+                                               'VALUES (?, ?, ?, ?)',
+                                               (f'youtube:{match.group(1)}', os.path.abspath(entry.path),
+                                                entry.stat().st_size, entry.stat().st_mtime))
+                    added += cursor.rowcount
+        return kept, removed, added
@@ -0,0 +1,14 @@
+# Tipos de evento emitidos pelo motor de download.
+# Cada evento é entregue aos assinantes como (tipo, url, dados).
+
+EVENT_LOG = 'LOG'                   # dados: (mensagem, nível)
+EVENT_BATCH_START = 'BATCH_START'   # dados: total de itens conhecido no início
+EVENT_BATCH_TOTAL = 'BATCH_TOTAL'   # dados: dict {'total', 'final'} (o total cresce com a expansão de playlists)
+EVENT_JOB_START = 'JOB_START'       # dados: None
+EVENT_PROGRESS = 'PROGRESS'         # dados: progress_protocol.ProgressRecord
+EVENT_JOB_END = 'JOB_END'           # dados: None
+EVENT_ITEM_DONE = 'ITEM_DONE'       # dados: dict {'total', 'ok', 'return_code'}
+EVENT_BATCH_END = 'BATCH_END'       # dados: dict {'total', 'completed', 'failed', 'stopped', 'metadata_cache'}
+EVENT_STAGE_STATS = 'STAGE_STATS'   # dados: dict {'downloading', 'download_workers', 'handoff_queue', 'handoff_size', 'transcoding', 'transcode_workers'}
+EVENT_CONCURRENCY = 'CONCURRENCY'   # dados: dict {'jobs', 'fragments', 'throughput', 'cpu', 'adaptive'}
+EVENT_BANDWIDTH = 'BANDWIDTH'       # dados: dict {'jobs', 'connections', 'max_connections', 'rate', 'max_rate', 'hosts'}
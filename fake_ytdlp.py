@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from urllib.parse import urlsplit, parse_qsl
+
+# Substituto local do yt-dlp para benchmarks e testes offline.
+# Como comando (--ytdlp "python fake_ytdlp.py") aceita os argumentos que o
+# DownloadEngine monta e imprime a saída do yt-dlp real, inclusive as linhas do
+# --progress-template; como módulo (ytdlp_module='fake_ytdlp') oferece a classe
+# YoutubeDL usada pelos workers persistentes. Duração, taxa de progresso,
+# tamanho e proporção de falhas vêm de um perfil JSON na variável de ambiente
+# MP3_BAIXAR_FAKE_YTDLP, herdada pelos subprocessos e workers. Nada é baixado:
+# cada item gera um MP3 de enchimento (quadros MPEG válidos, áudio mudo). Com
+# --flat-playlist, playlists e abas de canal listam playlist_size vídeos e a
+# raiz de um canal lista as abas /videos e /shorts, como o yt-dlp real.
+
+FAKE_PROFILE_ENV_VAR = 'MP3_BAIXAR_FAKE_YTDLP'
+
+DEFAULT_PROFILE = {
+    'extract': 0.05,            # Extração de metadados (s)
+    'duration': 0.2,            # Download (s)
+    'rate': 20.0,               # Linhas de progresso por segundo
+    'size': 4 * 1024 * 1024,    # Tamanho anunciado do download (bytes)
+    'file_bytes': 16 * 1024,    # Tamanho do MP3 de enchimento gravado em disco
+    'postprocess': 0.02,        # Conversão para MP3 (s)
+    'fail_ratio': 0.0,          # Proporção de URLs que falham (determinística por URL e seed)
+    'failure': 'unavailable',   # Tipo de falha: chave de FAILURE_MESSAGES
+    'mp3_ratio': 0.0,           # Proporção de URLs que também oferecem um stream MP3
+    'mp3_abr': 320,             # Bitrate (kbps) desse stream MP3
+    'playlist_size': 5,         # Entradas listadas por playlist/aba de canal (--flat-playlist)
+    'playlist_fail_after': None, # Listagem falha (código 1) depois de tantas entradas
+    'seed': 0,
+}
+
+FAILURE_MESSAGES = {
+    'unavailable': "ERROR: [youtube] {id}: Video unavailable",
+    'network': "ERROR: Unable to download video data: <urlopen error [Errno 104] Connection reset by peer>",
+    'throttled': "ERROR: Unable to download video data: HTTP Error 429: Too Many Requests",
+}
+
+# Quadro MPEG-1 Layer III, 128 kbps, 44.1 kHz, estéreo: 417 bytes
+MP3_FRAME = b'\xff\xfb\x90\x64' + bytes(413)
+ID3_HEADER = b'ID3\x04\x00\x00' + struct.pack('>I', 0)
+
+UNAVAILABLE = 'NA'
+
+
+class DownloadError(Exception):
+    """Mesmo nome do erro do yt-dlp (o worker persistente não o reporta de novo)."""
+
+
+def load_profile():
+    profile = dict(DEFAULT_PROFILE)
+    raw = os.environ.get(FAKE_PROFILE_ENV_VAR)
+    if raw:
+        profile.update(json.loads(raw))
+    return profile
+
+
+def video_id(url):
+    return url.rstrip('/').rsplit('=', 1)[-1].rsplit('/', 1)[-1] or 'video'
+
+
+def url_bucket(url, profile, salt=''):
+    # crc32 em vez de hash(): o resultado não pode variar entre processos
+    return zlib.crc32(f"{profile['seed']}:{salt}{url}".encode('utf-8')) / 0xFFFFFFFF
+
+
+def should_fail(url, profile):
+    return url_bucket(url, profile) < profile['fail_ratio']
+
+
+def picks_mp3(url, format_spec, profile):
+    """True se a seleção de formato (-f) escolheria o stream MP3 simulado desta URL."""
+    if 'acodec=mp3' not in (format_spec or '') or url_bucket(url, profile, 'mp3:') >= profile['mp3_ratio']:
+        return False
+    minimum = re.search(r'abr>=\??(\d+)', format_spec)
+    return minimum is None or profile['mp3_abr'] >= int(minimum.group(1))
+
+
+def playlist_entries(url, profile):
+    """Entradas de --flat-playlist: abas para a raiz de um canal, vídeos para playlists e abas."""
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split('/') if segment]
+    channel = segments[:1] if segments[:1] and segments[0].startswith('@') else segments[:2]
+    if segments[:1] and (segments[0].startswith('@') or segments[0] in ('channel', 'c', 'user')):
+        if segments == channel:
+            base = url.split('?')[0].rstrip('/')
+            return [f"{base}/videos", f"{base}/shorts"]
+    elif 'list' not in dict(parse_qsl(parts.query)) and segments[:1] != ['playlist']:
+        return [url] # Não é uma coleção: o yt-dlp lista a própria URL
+    # IDs de 11 caracteres, estáveis e distintos entre coleções
+    prefix = hashlib.sha1(url.encode('utf-8')).hexdigest()[:7]
+    return [f"https://www.youtube.com/watch?v={prefix}{index:04d}" for index in range(int(profile['playlist_size']))]
+
+
+def list_playlist(url, profile, log):
+    time.sleep(profile['extract'])
+    fail_after = profile['playlist_fail_after']
+    for position, entry in enumerate(playlist_entries(url, profile)):
+        if fail_after is not None and position >= fail_after:
+            log(f"ERROR: [youtube:tab] {video_id(url)}: Unable to download API page: HTTP Error 500: Internal Server Error")
+            return 1
+        log(entry)
+    return 0
+
+
+def write_dummy_mp3(path, size):
+    frames = max(1, (size - len(ID3_HEADER)) // len(MP3_FRAME))
+    with open(path, 'wb') as handle:
+        handle.write(ID3_HEADER)
+        handle.write(MP3_FRAME * frames)
+
+
+def simulate(url, output_template, extract_audio, profile, on_download, on_postprocess, log, extract=True,
+             format_spec=None, rate_limit=None):
+    """
+    Executa um "download" conforme o perfil: on_download(status, baixados, total, velocidade,
+    eta, arquivo) e on_postprocess(status, pós-processador) seguem os hooks do yt-dlp.
+    rate_limit (bytes/s, como --limit-rate) alonga o download. Retorna o código de saída (0 ou 1).
+    """
+    vid = video_id(url)
+    mp3_source = picks_mp3(url, format_spec, profile)
+    if extract:
+        log(f"[youtube] Extracting URL: {url}")
+        log(f"[youtube] {vid}: Downloading webpage")
+        time.sleep(profile['extract'])
+        if should_fail(url, profile) and profile['failure'] == 'unavailable':
+            log(FAILURE_MESSAGES['unavailable'].format(id=vid))
+            return 1
+        log(f"[info] {vid}: Downloading 1 format(s): {'http_mp3_320' if mp3_source else '251'}")
+
+    base = output_template.replace('%(title)s', vid).replace('%(id)s', vid)
+    filename = base.replace('%(ext)s', 'mp3' if mp3_source else 'webm')
+    log(f"[download] Destination: {filename}")
+
+    size = int(profile['size'])
+    duration = float(profile['duration'])
+    if rate_limit:
+        duration = max(duration, size / rate_limit)
+    steps = max(1, int(duration * profile['rate']))
+    speed = size / duration if duration > 0 else None
+    failing = should_fail(url, profile)
+    for step in range(steps + 1):
+        downloaded = size * step // steps
+        eta = (steps - step) * duration / steps
+        if failing and step * 2 >= steps:
+            # Falha transitória no meio do download
+            log(FAILURE_MESSAGES.get(profile['failure'], FAILURE_MESSAGES['network']).format(id=vid))
+            return 1
+        on_download('finished' if step == steps else 'downloading', downloaded, size, speed,
+                    eta if step < steps else None, filename)
+        if step < steps:
+            time.sleep(duration / steps)
+
+    if not extract_audio:
+        write_dummy_mp3(filename, profile['file_bytes'])
+        return 0
+    on_postprocess('started', 'ExtractAudio')
+    if mp3_source:
+        write_dummy_mp3(filename, profile['file_bytes'])
+        log(f"[ExtractAudio] Not converting audio {filename}; file is already in target format mp3")
+        on_postprocess('finished', 'ExtractAudio')
+        return 0
+    mp3_name = base.replace('%(ext)s', 'mp3')
+    log(f"[ExtractAudio] Destination: {mp3_name}")
+    time.sleep(profile['postprocess'])
+    write_dummy_mp3(mp3_name, profile['file_bytes'])
+    log(f"Deleting original file {filename} (pass -k to keep)")
+    on_postprocess('finished', 'ExtractAudio')
+    return 0
+
+
+# --- Modo comando (subprocesso) ---
+def render(template, fields):
+    """Aplica um --progress-template como o yt-dlp (campos ausentes viram 'NA')."""
+    return template % {key: (UNAVAILABLE if value is None else value) for key, value in fields.items()}
+
+
+def main(argv):
+    profile = load_profile()
+    templates = {}
+    outputs = []
+    options = set()
+    info_json = None
+    format_spec = None
+    rate_limit = None
+    positional = []
+    index = 0
+    while index < len(argv):
+        arg = argv[index]
+        if arg == '--progress-template':
+            kind, _, template = argv[index + 1].partition(':')
+            templates[kind] = template
+            index += 2
+        elif arg == '-o':
+            outputs.append(argv[index + 1])
+            index += 2
+        elif arg == '--load-info-json':
+            info_json = argv[index + 1]
+            index += 2
+        elif arg == '-f':
+            format_spec = argv[index + 1]
+            index += 2
+        elif arg == '--limit-rate':
+            rate_limit = int(argv[index + 1]) # O engine sempre passa bytes/s inteiros
+            index += 2
+        elif arg in ('--audio-format', '--audio-quality', '--concurrent-fragments', '--postprocessor-args', '--print'):
+            index += 2
+        elif arg.startswith('-'):
+            options.add(arg)
+            index += 1
+        else:
+            positional.append(arg)
+            index += 1
+
+    def log(message):
+        print(message, flush=True)
+
+    if info_json is not None:
+        with open(info_json, encoding='utf-8') as handle:
+            url = json.load(handle)['webpage_url']
+    elif positional:
+        url = positional[-1]
+    else:
+        log("ERROR: You must provide at least one URL.")
+        return 2
+
+    if '--flat-playlist' in options:
+        return list_playlist(url, profile, log)
+
+    output_template = '%(title)s [%(id)s].%(ext)s'
+    for output in outputs:
+        if output.startswith('infojson:'):
+            if '--write-info-json' in options:
+                with open(output[len('infojson:'):] + '.info.json', 'w', encoding='utf-8') as handle:
+                    json.dump({'id': video_id(url), 'webpage_url': url}, handle)
+        else:
+            output_template = output
+
+    def on_download(status, downloaded, total, speed, eta, filename):
+        if 'download' in templates:
+            log(render(templates['download'], {
+                'progress.status': status, 'progress.downloaded_bytes': downloaded,
+                'progress.total_bytes': total, 'progress.total_bytes_estimate': None,
+                'progress.speed': speed, 'progress.eta': eta, 'progress.filename': filename}))
+        elif status == 'downloading':
+            log(f"[download] {downloaded * 100.0 / total:5.1f}% of {total} at {speed} ETA {eta}")
+
+    def on_postprocess(status, postprocessor):
+        if 'postprocess' in templates:
+            log(render(templates['postprocess'], {'progress.status': status, 'progress.postprocessor': postprocessor}))
+
+    return simulate(url, output_template, '-x' in options, profile, on_download, on_postprocess, log,
+                    extract=info_json is None, format_spec=format_spec, rate_limit=rate_limit)
+
+
+# --- Modo módulo (workers persistentes) ---
+class YoutubeDL:
+    """Subconjunto da API YoutubeDL usado por warm_workers.worker_main."""
+
+    def __init__(self, params):
+        self.params = params
+        self.profile = load_profile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def download(self, urls, extract=True):
+        params = self.params
+        logger = params['logger']
+        output_template = params['outtmpl']
+        if isinstance(output_template, dict):
+            if params.get('writeinfojson'):
+                with open(output_template['infojson'] + '.info.json', 'w', encoding='utf-8') as handle:
+                    json.dump({'id': video_id(urls[0]), 'webpage_url': urls[0]}, handle)
+            output_template = output_template['default']
+
+        def on_download(status, downloaded, total, speed, eta, filename):
+            for hook in params.get('progress_hooks', []):
+                hook({'status': status, 'downloaded_bytes': downloaded, 'total_bytes': total,
+                      'speed': speed, 'eta': eta, 'filename': filename})
+
+        def on_postprocess(status, postprocessor):
+            for hook in params.get('postprocessor_hooks', []):
+                hook({'status': status, 'postprocessor': postprocessor})
+
+        def log(message):
+            (logger.error if message.startswith('ERROR') else logger.debug)(message)
+
+        extract_audio = any(pp.get('key') == 'FFmpegExtractAudio' for pp in params.get('postprocessors', []))
+        return simulate(urls[0], output_template, extract_audio, self.profile, on_download, on_postprocess, log,
+                        extract=extract, format_spec=params.get('format'), rate_limit=params.get('ratelimit'))
+
+    def download_with_info_file(self, path):
+        with open(path, encoding='utf-8') as handle:
+            return self.download([json.load(handle)['webpage_url']], extract=False)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,123 @@
+import tkinter as tk
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import deque
+
+# Console de log com limite fixo de linhas em memória.
+# O widget Text nunca passa de max_lines + trim_chunk linhas: o excedente é
+# removido em blocos e, opcionalmente, gravado em um arquivo de log rotativo.
+
+LOG_LEVELS = ('success', 'error', 'warn', 'info', 'process')
+
+DEFAULT_MAX_LINES = 5000
+DEFAULT_TRIM_CHUNK = 500
+
+
+class LogConsole:
+    """Buffer circular de (mensagem, nível) renderizado em um ScrolledText (somente thread principal)."""
+
+    def __init__(self, text_widget, max_lines=DEFAULT_MAX_LINES, trim_chunk=DEFAULT_TRIM_CHUNK):
+        self.text = text_widget
+        self.max_lines = max_lines
+        self.trim_chunk = trim_chunk
+        self.visible_levels = set(LOG_LEVELS)
+        self.records = deque()
+        self.rendered_lines = 0 # Linhas hoje presentes no widget
+        self.spill_logger = None
+        self.spill_handler = None
+
+    # --- Configuração ---
+    def set_max_lines(self, max_lines):
+        self.max_lines = max(100, int(max_lines))
+        self.trim_chunk = max(1, min(DEFAULT_TRIM_CHUNK, self.max_lines // 10))
+        self.trim()
+
+    def set_visible_levels(self, levels):
+        """Altera o filtro de níveis e re-renderiza o conteúdo ainda em memória."""
+        self.visible_levels = set(levels) & set(LOG_LEVELS)
+        self.render_all()
+
+    def enable_spill(self, path, max_bytes=5 * 1024 * 1024, backup_count=3):
+        """Passa a gravar as linhas descartadas da memória em um arquivo rotativo."""
+        self.disable_spill()
+        self.spill_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.spill_handler.setFormatter(logging.Formatter('%(message)s'))
+        self.spill_logger = logging.getLogger(f'mp3_baixar.console.{id(self)}')
+        self.spill_logger.propagate = False
+        self.spill_logger.setLevel(logging.INFO)
+        self.spill_logger.addHandler(self.spill_handler)
+
+    def disable_spill(self):
+        if self.spill_logger is not None:
+            self.spill_logger.removeHandler(self.spill_handler)
+            self.spill_handler.close()
+        self.spill_logger = None
+        self.spill_handler = None
+
+    # --- Escrita ---
+    def write(self, message, level='process'):
+        self.write_many([(message, level)])
+
+    def write_many(self, entries):
+        """Acrescenta várias mensagens com um único insert no widget."""
+        args = []
+        for message, level in entries:
+            self.records.append((message, level))
+            if level in self.visible_levels:
+                args.extend((message + "\n", level))
+                self.rendered_lines += message.count("\n") + 1
+
+        if args:
+            self.text.config(state='normal')
+            self.text.insert(tk.END, *args)
+            self.text.config(state='disabled')
+
+        if len(self.records) > self.max_lines + self.trim_chunk:
+            self.trim()
+
+        if args:
+            self.text.see(tk.END)
+
+    def trim(self):
+        """Descarta em bloco as linhas mais antigas que excedem o limite."""
+        excess = len(self.records) - self.max_lines
+        if excess <= 0:
+            return
+
+        dropped_lines = 0
+        spilled = []
+        for _ in range(excess):
+            message, level = self.records.popleft()
+            if level in self.visible_levels:
+                dropped_lines += message.count("\n") + 1
+            if self.spill_logger is not None:
+                spilled.append(f"[{level}] {message}")
+
+        if spilled:
+            self.spill_logger.info("\n".join(spilled))
+
+        if dropped_lines:
+            self.text.config(state='normal')
+            self.text.delete('1.0', f'{dropped_lines + 1}.0')
+            self.text.config(state='disabled')
+            self.rendered_lines -= dropped_lines
+
+    def render_all(self):
+        """Reconstrói o widget a partir do buffer em memória (ex.: após trocar o filtro)."""
+        args = []
+        self.rendered_lines = 0
+        for message, level in self.records:
+            if level in self.visible_levels:
+                args.extend((message + "\n", level))
+                self.rendered_lines += message.count("\n") + 1
+
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        if args:
+            self.text.insert(tk.END, *args)
+        self.text.config(state='disabled')
+        self.text.see(tk.END)
+
+    def clear(self):
+        self.records.clear()
+        self.render_all()
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Cache em disco dos info dicts extraídos pelo yt-dlp (arquivos .info.json).
+# Um item com metadados frescos é baixado com --load-info-json, pulando as
+# idas e voltas de extração. O TTL garante que URLs de stream expiradas sejam
+# renovadas e o limite de tamanho descarta as entradas menos usadas (LRU).
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mp3-baixar', 'info')
+DEFAULT_TTL_SECONDS = 2 * 60 * 60            # URLs de stream do YouTube expiram em ~6h
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+INDEX_FILENAME = 'cache.sqlite3'
+
+
+class MetadataCache:
+    """Índice SQLite de chave -> arquivo .info.json, com TTL, LRU por tamanho e contadores de acerto."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, INDEX_FILENAME), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            self.conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    # --- Caminhos ---
+    def target_base(self, key):
+        """Caminho (sem extensão) onde o yt-dlp deve escrever o info json da chave."""
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def target_path(self, key):
+        return self.target_base(key) + '.info.json'
+
+    # --- Consulta e Registro ---
+    def lookup(self, key):
+        """Retorna o .info.json se a entrada existir e ainda estiver dentro do TTL (conta acerto/falha)."""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT path, created_at FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttl and os.path.isfile(row[0]):
+                self.conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+                self.hits += 1
+                return row[0]
+            if row is not None:
+                # Expirada ou arquivo sumiu: descarta para ser renovada nesta execução
+                self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self.misses += 1
+        return None
+
+    def commit(self, key):
+        """Registra o info json recém-escrito pelo yt-dlp para a chave e aplica o limite de tamanho."""
+        path = self.target_path(key)
+        if not os.path.isfile(path):
+            return False
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                              (key, path, os.path.getsize(path), now, now))
+        self.evict()
+        return True
+
+    def invalidate(self, key):
+        """Remove a entrada (ex.: download com metadados em cache falhou; as URLs podem ter expirado)."""
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT path FROM entries WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if row is not None:
+            try:
+                os.remove(row[0])
+            except OSError:
+                pass
+
+    def evict(self):
+        """Remove as entradas menos usadas recentemente até o total caber em max_bytes."""
+        with self.lock, self.conn:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            removed = []
+            for key, path, size in self.conn.execute('SELECT key, path, size FROM entries ORDER BY last_used'):
+                if total <= self.max_bytes:
+                    break
+                removed.append((key, path))
+                total -= size
+            self.conn.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key, _ in removed])
+        for _, path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
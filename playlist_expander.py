@@ -0,0 +1,133 @@
+import subprocess
+import threading
+from collections import deque
+from queue import Queue
+from urllib.parse import urlsplit, parse_qsl
+
+from download_index import YOUTUBE_HOSTS
+from url_source import UrlLines
+from retry_scheduler import classify_failure, JOB_OUTPUT_LINES
+
+# Pré-passo de expansão de playlists/canais.
+# Cada coleção é listada com --flat-playlist (sem extrair os vídeos) e suas
+# entradas viram jobs individuais no pool compartilhado. A expansão roda numa
+# thread própria e publica as URLs numa fila à medida que são descobertas, então
+# as primeiras entradas começam a baixar antes de a listagem terminar. A fila é
+# limitada: a lista de entrada (que pode ser um arquivo lido sob demanda) só
+# avança conforme o orquestrador consome. Entradas que também são coleções (as
+# abas /videos, /shorts... da raiz de um canal) são expandidas na sequência; uma
+# listagem que termina com erro entra no relatório de falhas do lote.
+
+COLLECTION_PATH_PREFIXES = ('/playlist', '/channel/', '/c/', '/user/', '/@')
+GENERIC_COLLECTION_MARKERS = ('/playlist', '/sets/', '/album/')
+OUTPUT_BUFFER = 256
+MAX_EXPAND_DEPTH = 2   # Canal -> abas -> vídeos
+
+
+def looks_like_collection(url):
+    """Heurística barata para decidir se a URL precisa do pré-passo de expansão."""
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    path = parts.path
+    if host in YOUTUBE_HOSTS:
+        if 'list' in dict(parse_qsl(parts.query)):
+            return True
+        return path.startswith(COLLECTION_PATH_PREFIXES)
+    return any(marker in path for marker in GENERIC_COLLECTION_MARKERS)
+
+
+class PlaylistExpander:
+    """Expande coleções numa thread de fundo e entrega as URLs finais por uma fila."""
+
+    DONE = None # Sentinela de fim da expansão
+
+    def __init__(self, engine, url_list):
+        self.engine = engine
+        self.url_list = url_list
+        self.output = Queue(maxsize=OUTPUT_BUFFER)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def __iter__(self):
+        """Consome as URLs (já expandidas) na ordem em que ficam prontas."""
+        while True:
+            url = self.output.get()
+            if url is self.DONE:
+                return
+            yield url
+
+    def build_command(self, url):
+        return self.engine.YTDLP_EXECUTABLE + [
+            '--flat-playlist', '--lazy-playlist',
+            '--ignore-errors', '--no-warnings',
+            '--print', 'url',
+            url
+        ]
+
+    def run(self):
+        try:
+            for url in self.url_list:
+                if self.engine.stop_event.is_set():
+                    break
+                if self.engine.expand_playlists and looks_like_collection(url):
+                    self.expand(url)
+                else:
+                    self.output.put(url)
+            invalid = self.url_list.describe_invalid() if isinstance(self.url_list, UrlLines) else None
+            if invalid:
+                self.engine.log_message(f"⚠️ {invalid}", 'warn')
+        except Exception as e:
+            # Ex.: arquivo importado removido antes da retomada
+            self.engine.log_message(f"🚨 Falha ao ler a lista de URLs: {e}", 'error')
+        finally:
+            self.output.put(self.DONE)
+
+    def expand(self, url, depth=0, expanded=None):
+        """Lista as entradas da coleção; se nada for listado, agenda a URL original como um job."""
+        engine = self.engine
+        expanded = expanded if expanded is not None else set()
+        expanded.add(url)
+        engine.log_message(f"📃 [PLAYLIST] Expandindo entradas de {url[:50]}...", 'info')
+        entries = 0
+        output = deque(maxlen=JOB_OUTPUT_LINES) # Linhas que não são entradas (erros do yt-dlp)
+        return_code = None
+        key = f'expand:{url}'
+        try:
+            process = subprocess.Popen(self.build_command(url), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       universal_newlines=True, bufsize=1)
+            engine.active_processes[key] = process
+            for line in iter(process.stdout.readline, ''):
+                entry = line.strip()
+                if engine.stop_event.is_set():
+                    process.terminate()
+                    break
+                if not entry.startswith(('http://', 'https://')):
+                    if entry:
+                        output.append(entry)
+                    continue
+                entries += 1
+                if depth < MAX_EXPAND_DEPTH and entry not in expanded and looks_like_collection(entry):
+                    # Ex.: aba /videos listada pela raiz de um canal
+                    self.expand(entry, depth + 1, expanded)
+                else:
+                    self.output.put(entry)
+            process.stdout.close()
+            return_code = process.wait()
+        except Exception as e:
+            engine.log_message(f"🚨 Falha ao expandir {url[:50]}: {e}", 'error')
+        finally:
+            engine.active_processes.pop(key, None)
+
+        if return_code and not engine.stop_event.is_set():
+            category, detail = classify_failure(output)
+            engine.record_failure(url, category, f"listagem incompleta ({entries} entradas): {detail}", return_code)
+            engine.log_message(f"⚠️ [PLAYLIST] Listagem de {url[:50]} terminou com código {return_code} após "
+                               f"{entries} entradas: {detail or 'sem mensagem de erro'}", 'warn')
+        if entries:
+            engine.log_message(f"📃 [PLAYLIST] {entries} entradas encontradas em {url[:50]}...", 'info')
+        elif not engine.stop_event.is_set():
+            # Não era uma coleção (ou a listagem falhou): segue como um job único
+            self.output.put(url)
@@ -0,0 +1,65 @@
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+
+# Gancho opcional de profiling para uso em execuções reais.
+# 'cprofile' perfila só a thread que chamou start() (orquestrador ou UI) e grava
+# um .pstats (abrir com `python -m pstats` ou snakeviz) e um resumo em texto;
+# 'tracemalloc' registra as alocações do processo e grava as maiores por linha.
+
+PROFILE_CPROFILE = 'cprofile'
+PROFILE_TRACEMALLOC = 'tracemalloc'
+PROFILE_MODES = (PROFILE_CPROFILE, PROFILE_TRACEMALLOC)
+PROFILE_ENV_VAR = 'MP3_BAIXAR_PROFILE'    # Ativa o profiling da thread da UI na GUI
+TOP_ENTRIES = 40
+
+
+class ProfileHook:
+    """start()/stop() em volta do trecho a perfilar; stop() grava os arquivos e retorna o caminho principal."""
+
+    def __init__(self, mode, output_dir, name):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de profiling desconhecido: {mode!r} (use {', '.join(PROFILE_MODES)})")
+        self.mode = mode
+        self.base_path = os.path.join(output_dir, f'mp3-baixar-profile-{name}')
+        self.profiler = None
+        self.started_tracing = False
+
+    def start(self):
+        if self.mode == PROFILE_CPROFILE:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            # tracemalloc é global: quem ligou é quem desliga (UI e orquestrador podem compartilhar)
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start(16)
+        return self
+
+    def stop(self):
+        if self.mode == PROFILE_CPROFILE:
+            self.profiler.disable()
+            stats_path = self.base_path + '.pstats'
+            self.profiler.dump_stats(stats_path)
+            report = io.StringIO()
+            pstats.Stats(self.profiler, stream=report).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+            self.write_text(report.getvalue())
+            return stats_path
+
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.started_tracing:
+            tracemalloc.stop()
+        lines = [f"Memória rastreada: atual {current / 1024 / 1024:.1f} MiB, pico {peak / 1024 / 1024:.1f} MiB", ""]
+        lines += [str(stat) for stat in snapshot.statistics('lineno')[:TOP_ENTRIES]]
+        return self.write_text('\n'.join(lines) + '\n')
+
+    def write_text(self, content):
+        path = self.base_path + '.txt'
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
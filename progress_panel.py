@@ -0,0 +1,145 @@
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+
+from progress_protocol import PHASE_DOWNLOAD, PHASE_POSTPROCESS
+
+# Painel de progresso individual com um conjunto fixo de linhas reaproveitadas.
+# Os widgets (Frame + Label + Progressbar) são criados uma única vez; cada job
+# ativo ocupa uma linha livre e, ao terminar, a devolve para o próximo. Jobs
+# além da capacidade ficam ocultos até uma linha vagar, e uma linha de resumo
+# mostra os totais (ativos, ocultos, na fila, concluídos, falhas). Uma linha
+# só é tocada quando o texto ou o percentual dela realmente mudam.
+
+DEFAULT_MAX_ROWS = 8
+
+
+class ProgressRow:
+    """Uma linha do painel (somente thread principal)."""
+
+    def __init__(self, parent, index):
+        self.frame = ttk.Frame(parent)
+        self.frame.grid(row=index, column=0, sticky='ew', pady=2)
+        self.frame.grid_columnconfigure(0, weight=1)
+        self.label_var = tk.StringVar()
+        self.progress_var = tk.DoubleVar(value=0.0)
+        ttk.Label(self.frame, textvariable=self.label_var, anchor='w',
+                  font=("Helvetica", 9, "bold")).grid(row=0, column=0, sticky='ew')
+        ttk.Progressbar(self.frame, orient='horizontal', mode='determinate',
+                        style="Red.Horizontal.TProgressbar", variable=self.progress_var).grid(row=1, column=0, sticky='ew')
+        self.frame.grid_remove() # Oculta até receber um job
+        self.url = None
+        self.text = None
+        self.percent = None
+
+    def show(self, url, text, percent):
+        self.url = url
+        self.render(text, percent)
+        self.frame.grid()
+
+    def hide(self):
+        self.url = None
+        self.frame.grid_remove()
+
+    def render(self, text, percent):
+        if text != self.text:
+            self.text = text
+            self.label_var.set(text)
+        if percent is not None and percent != self.percent:
+            self.percent = percent
+            self.progress_var.set(percent)
+
+
+class ProgressPanel:
+    """Mapeia os jobs ativos para o conjunto fixo de linhas e mantém a linha de resumo."""
+
+    def __init__(self, parent, max_rows=DEFAULT_MAX_ROWS):
+        self.parent = parent
+        self.parent.grid_columnconfigure(0, weight=1)
+        self.rows = [ProgressRow(parent, index) for index in range(max_rows)]
+        self.free_rows = list(reversed(self.rows))
+        self.visible = {}               # url -> ProgressRow
+        self.hidden = OrderedDict()     # url -> (texto, percentual) dos jobs sem linha
+        self.summary_var = tk.StringVar()
+        self.summary_text = None
+        ttk.Label(parent, textvariable=self.summary_var, anchor='w',
+                  foreground='#909090').grid(row=max_rows, column=0, sticky='ew', pady=(4, 0))
+        self.total = 0
+        self.finished = 0
+        self.failed = 0
+        self.update_summary()
+
+    # --- Jobs ---
+    def start_job(self, url):
+        if url in self.visible or url in self.hidden:
+            return
+        text = f"⏳ {url[:60]}... (0.0%)"
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.visible[url] = row
+            row.show(url, text, 0.0)
+        else:
+            self.hidden[url] = (text, 0.0)
+        self.update_summary()
+
+    def end_job(self, url):
+        row = self.visible.pop(url, None)
+        if row is None:
+            self.hidden.pop(url, None)
+        elif self.hidden:
+            # A linha passa direto para o job oculto mais antigo (sem esconder/mostrar)
+            next_url, (text, percent) = self.hidden.popitem(last=False)
+            self.visible[next_url] = row
+            row.url = next_url
+            row.render(text, percent)
+        else:
+            row.hide()
+            self.free_rows.append(row)
+        self.update_summary()
+
+    def update_job(self, url, progress):
+        """Aplica um ProgressRecord; só a linha do job é tocada (e só se algo mudou)."""
+        percent = progress.percent
+        if progress.phase == PHASE_DOWNLOAD:
+            percent_text = f"{percent:.1f}%" if percent is not None else "?%"
+            text = f"⬇️ {url[:60]}... ({percent_text}) - {progress.describe()}"
+        elif progress.phase == PHASE_POSTPROCESS:
+            text = f"🔄 {url[:60]}... (100%) - {progress.describe()}"
+        else:
+            return
+
+        row = self.visible.get(url)
+        if row is not None:
+            row.render(text, percent)
+        elif url in self.hidden:
+            previous_percent = self.hidden[url][1]
+            self.hidden[url] = (text, percent if percent is not None else previous_percent)
+
+    def clear(self):
+        for url in list(self.visible):
+            self.end_job(url)
+        self.hidden.clear()
+        self.update_summary()
+
+    # --- Resumo ---
+    def set_counts(self, total=None, finished=None, failed=None):
+        if total is not None:
+            self.total = total
+        if finished is not None:
+            self.finished = finished
+        if failed is not None:
+            self.failed = failed
+        self.update_summary()
+
+    def update_summary(self):
+        active = len(self.visible) + len(self.hidden)
+        queued = max(0, self.total - self.finished - active)
+        text = f"📊 Ativos: {active}"
+        if self.hidden:
+            text += f" ({len(self.hidden)} sem linha)"
+        text += f"  |  Na fila: {queued}  |  Concluídos: {self.finished}"
+        if self.failed:
+            text += f"  |  Falhas: {self.failed}"
+        if text != self.summary_text:
+            self.summary_text = text
+            self.summary_var.set(text)
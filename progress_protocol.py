@@ -0,0 +1,125 @@
+import time
+from collections import namedtuple
+
+# Protocolo estruturado de progresso entre o yt-dlp e o motor.
+# O yt-dlp é chamado com --progress-template para imprimir linhas marcadas com
+# PROGRESS_MARKER e campos separados por espaço; o worker converte cada linha em
+# um ProgressRecord e só esses registros chegam à thread principal.
+
+PROGRESS_MARKER = '[mp3b]'
+
+PHASE_DOWNLOAD = 'download'
+PHASE_POSTPROCESS = 'postprocess'
+
+DEFAULT_MAX_PROGRESS_RATE = 5 # Atualizações por segundo por download
+
+# Campos ausentes são impressos pelo yt-dlp como "NA"; o nome do arquivo vem por último
+# porque pode conter espaços.
+DOWNLOAD_TEMPLATE = (f'{PROGRESS_MARKER} {PHASE_DOWNLOAD} %(progress.status)s %(progress.downloaded_bytes)s '
+                     '%(progress.total_bytes)s %(progress.total_bytes_estimate)s %(progress.speed)s %(progress.eta)s '
+                     '%(progress.filename)s')
+POSTPROCESS_TEMPLATE = f'{PROGRESS_MARKER} {PHASE_POSTPROCESS} %(progress.status)s %(progress.postprocessor)s'
+
+
+def progress_template_args():
+    """Argumentos do yt-dlp que ativam o formato de progresso legível por máquina."""
+    return [
+        '--newline',
+        '--progress-template', f'download:{DOWNLOAD_TEMPLATE}',
+        '--progress-template', f'postprocess:{POSTPROCESS_TEMPLATE}',
+    ]
+
+
+def format_bytes(value):
+    if value is None:
+        return '?'
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024 or unit == 'GiB':
+            return f"{value:.1f}{unit}" if unit != 'B' else f"{int(value)}B"
+        value /= 1024.0
+
+
+class ProgressRecord(namedtuple('ProgressRecord',
+                                'phase status downloaded_bytes total_bytes speed eta postprocessor filename',
+                                defaults=(None, None, None, None, None, None))):
+    """Estado de progresso de um download (bytes, total, velocidade, ETA e fase)."""
+    __slots__ = ()
+
+    @property
+    def percent(self):
+        if self.phase == PHASE_POSTPROCESS:
+            return 100.0 if self.status == 'finished' else 99.0
+        if self.status == 'finished':
+            return 100.0
+        if self.downloaded_bytes is None or not self.total_bytes:
+            return None
+        return min(100.0, self.downloaded_bytes * 100.0 / self.total_bytes)
+
+    def describe(self):
+        """Texto curto para a interface (ex.: '3.2MiB de 10.0MiB a 1.1MiB/s ETA 7s')."""
+        if self.phase == PHASE_POSTPROCESS:
+            if self.status == 'queued':
+                return "Aguardando conversão..."
+            return "Conversão para MP3..." if self.status != 'finished' else "Conversão concluída"
+        parts = [f"{format_bytes(self.downloaded_bytes)} de {format_bytes(self.total_bytes)}"]
+        if self.speed is not None:
+            parts.append(f"a {format_bytes(self.speed)}/s")
+        if self.eta is not None:
+            parts.append(f"ETA {int(self.eta)}s")
+        return ' '.join(parts)
+
+    def to_dict(self):
+        data = self._asdict()
+        data['percent'] = self.percent
+        return data
+
+
+def _number(field):
+    if field in ('NA', 'None', ''):
+        return None
+    try:
+        return float(field)
+    except ValueError:
+        return None
+
+
+def parse_progress_line(line):
+    """Converte uma linha marcada do yt-dlp em ProgressRecord; retorna None para as demais."""
+    if not line.startswith(PROGRESS_MARKER):
+        return None
+    fields = line.rstrip('\r\n').split(' ', 8)
+    if len(fields) < 3:
+        return None
+    phase, status = fields[1], fields[2]
+
+    if phase == PHASE_DOWNLOAD and len(fields) >= 8:
+        downloaded, total, estimate, speed, eta = (_number(f) for f in fields[3:8])
+        filename = fields[8] if len(fields) > 8 and fields[8] != 'NA' else None
+        return ProgressRecord(phase, status,
+                              downloaded_bytes=int(downloaded) if downloaded is not None else None,
+                              total_bytes=int(total or estimate) if (total or estimate) else None,
+                              speed=speed, eta=eta, filename=filename)
+    if phase == PHASE_POSTPROCESS:
+        return ProgressRecord(phase, status, postprocessor=fields[3].strip() if len(fields) > 3 else None)
+    return None
+
+
+class ProgressRateLimiter:
+    """
+    Limita cada download a no máximo max_rate atualizações/s. Mudanças de fase/status e
+    registros 'finished' (que carregam o arquivo final) sempre passam.
+    """
+
+    def __init__(self, max_rate=DEFAULT_MAX_PROGRESS_RATE):
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.last_sent = 0.0
+        self.last_key = None
+
+    def allow(self, record):
+        now = time.monotonic()
+        key = (record.phase, record.status)
+        if record.status == 'finished' or key != self.last_key or now - self.last_sent >= self.min_interval:
+            self.last_key = key
+            self.last_sent = now
+            return True
+        return False
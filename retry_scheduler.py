@@ -0,0 +1,167 @@
+import heapq
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Retentativas de jobs que falharam.
+# A saída do yt-dlp de cada tentativa é classificada (throttling, rede,
+# indisponível/privado, pós-processamento); só as falhas transitórias voltam
+# para a fila, com backoff exponencial com jitter e um período de resfriamento
+# por host após throttling. A espera acontece na thread do agendador, sem
+# ocupar vaga de worker. As falhas permanentes formam o relatório do lote.
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 5.0
+DEFAULT_MAX_DELAY = 300.0
+DEFAULT_HOST_COOLDOWN = 60.0
+JOB_OUTPUT_LINES = 30       # Linhas finais da saída de cada job guardadas para a classificação
+
+# Categorias de falha
+FAILURE_THROTTLED = 'throttled'
+FAILURE_NETWORK = 'network'
+FAILURE_UNAVAILABLE = 'unavailable'
+FAILURE_POSTPROCESS = 'postprocess'
+FAILURE_UNKNOWN = 'unknown'
+
+RETRYABLE_FAILURES = (FAILURE_THROTTLED, FAILURE_NETWORK)
+
+# A ordem importa: a primeira categoria que casar com alguma linha vence
+FAILURE_PATTERNS = [
+    (FAILURE_UNAVAILABLE, re.compile(
+        r'Video unavailable|Private video|This video is (private|unavailable|not available)|'
+        r'has been removed|members-only|Sign in to confirm your age|not available in your country|'
+        r'HTTP Error 404|Unsupported URL|is not a valid URL|Premieres in', re.IGNORECASE)),
+    (FAILURE_THROTTLED, re.compile(
+        r'HTTP Error 429|Too Many Requests|HTTP Error 403|rate.?limit|Sign in to confirm you.re not a bot',
+        re.IGNORECASE)),
+    (FAILURE_NETWORK, re.compile(
+        r'Connection (reset|refused|aborted)|timed out|Temporary failure in name resolution|'
+        r'Name or service not known|Network is unreachable|Remote end closed|IncompleteRead|'
+        r'HTTP Error 5\d\d|Unable to download (webpage|video data)|urlopen error|SSL', re.IGNORECASE)),
+    (FAILURE_POSTPROCESS, re.compile(
+        r'Postprocessing|ffmpeg|ffprobe|Conversion failed|Error opening (input|output)', re.IGNORECASE)),
+]
+
+
+def classify_failure(lines):
+    """Retorna (categoria, linha que a identificou) para a saída de uma tentativa que falhou."""
+    error_lines = [line for line in lines if 'ERROR' in line] or list(lines)
+    for category, pattern in FAILURE_PATTERNS:
+        for line in reversed(error_lines):
+            if pattern.search(line):
+                return category, line.strip()
+    return FAILURE_UNKNOWN, (error_lines[-1].strip() if error_lines else '')
+
+
+def url_host(url):
+    return urlsplit(url).netloc.lower()
+
+
+class RetryScheduler:
+    """Fila de retentativas por horário (heap) atendida por uma thread própria."""
+
+    def __init__(self, engine, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, host_cooldown=DEFAULT_HOST_COOLDOWN):
+        self.engine = engine
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.host_cooldown = host_cooldown
+
+        self.condition = threading.Condition()
+        self.heap = []              # (pronto_em, seq, url)
+        self.sequence = 0
+        self.in_transit = 0         # Retirados do heap e ainda não resubmetidos
+        self.attempts = {}          # url -> retentativas já agendadas
+        self.cooldown_until = {}    # host -> time.monotonic() do fim do resfriamento
+        self.failures = []          # Falhas permanentes (relatório)
+        self.retried = 0
+        self.closed = False
+        self.thread = None
+
+    # --- Decisões ---
+    def cooldown_remaining(self, url):
+        with self.condition:
+            return max(0.0, self.cooldown_until.get(url_host(url), 0.0) - time.monotonic())
+
+    def retry(self, url, category):
+        """Agenda uma nova tentativa se a falha for transitória e houver tentativas; retorna o atraso ou None."""
+        if category not in RETRYABLE_FAILURES or self.engine.stop_event.is_set():
+            return None
+        with self.condition:
+            attempt = self.attempts.get(url, 0) + 1
+            if attempt > self.max_retries:
+                return None
+            self.attempts[url] = attempt
+            self.retried += 1
+            # Backoff exponencial (limitado a max_delay) com jitter de ±50% para não sincronizar os jobs
+            delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+            now = time.monotonic()
+            host = url_host(url)
+            if category == FAILURE_THROTTLED:
+                self.cooldown_until[host] = max(self.cooldown_until.get(host, 0.0), now + self.host_cooldown)
+            delay = max(delay, self.cooldown_until.get(host, 0.0) - now)
+            self.push(url, now + delay)
+        return delay
+
+    def defer(self, url):
+        """Adia um job cujo host está em resfriamento (sem contar como tentativa)."""
+        with self.condition:
+            self.push(url, self.cooldown_until.get(url_host(url), 0.0))
+
+    def mark_permanent(self, url, category, detail, return_code=None):
+        with self.condition:
+            self.failures.append({'url': url, 'category': category, 'detail': detail,
+                                  'attempts': self.attempts.get(url, 0) + 1, 'return_code': return_code})
+
+    # --- Fila ---
+    def push(self, url, ready_at):
+        # Chamado com self.condition adquirida
+        heapq.heappush(self.heap, (ready_at, self.sequence, url))
+        self.sequence += 1
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
+        self.condition.notify_all()
+
+    def idle(self):
+        """True se não houver retentativa aguardando nem a caminho do orquestrador."""
+        with self.condition:
+            return not self.heap and not self.in_transit
+
+    def loop(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.condition.wait(timeout)
+                if self.closed:
+                    return
+                _, _, url = heapq.heappop(self.heap)
+                self.in_transit += 1
+            try:
+                # Sem segurar a trava: o orquestrador pode bloquear ao agendar
+                if not self.engine.stop_event.is_set():
+                    self.engine.submit_job(url)
+            except Exception as e:
+                self.engine.log_message(f"🚨 Falha ao reagendar {url[:50]}: {e}", 'error')
+            finally:
+                with self.condition:
+                    self.in_transit -= 1
+                    self.condition.notify_all()
+
+    def cancel_pending(self):
+        """Descarta as retentativas ainda não iniciadas (botão de parar)."""
+        with self.condition:
+            self.heap = []
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.heap = []
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
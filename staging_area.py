@@ -0,0 +1,226 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from batch_journal import find_resumable
+from download_index import FILENAME_ID_RE
+
+# Área de staging em disco local para o I/O temporário dos jobs.
+# Fragmentos, arquivos .part e o áudio intermediário da conversão ficam num
+# diretório por job dentro do diretório do lote (ex.: tmpfs ou SSD local); só
+# os MP3 prontos vão para o diretório de saída (às vezes um compartilhamento de
+# rede), num único passo atômico: rename no mesmo sistema de arquivos ou cópia
+# para um temporário seguida de rename no destino. Títulos repetidos ganham um
+# sufixo " (2)", " (3)"...; um "Título [ID].mp3" que já existe é o mesmo vídeo
+# e é substituído. O diretório do lote é derivado do diretório de saída,
+# como o diário: um lote parado ou interrompido deixa os .part onde a retomada
+# (--resume) os encontra. Ele some ao fim de um lote concluído; os de processos
+# que morreram são limpos na próxima execução, exceto enquanto o diário do
+# diretório de saída ainda puder ser retomado.
+
+DEFAULT_STAGING_DIR = os.path.join(tempfile.gettempdir(), 'mp3-baixar-staging')
+BATCH_DIR_PREFIX = 'lote-'
+STALE_AGE_SECONDS = 24 * 3600     # Sem como checar o processo dono: limpa lotes com mais de um dia
+RESUMABLE_MAX_AGE = 7 * 24 * 3600 # Lotes retomáveis esquecidos por mais tempo também são limpos
+OWNER_FILENAME = '.dono'          # PID do processo que está usando o diretório do lote
+OUTPUT_FILENAME = '.saida'        # Diretório de saída do lote (para conferir o diário na limpeza)
+USAGE_REFRESH_INTERVAL = 1.0
+SPACE_POLL_INTERVAL = 0.5
+PARTIAL_SUFFIX = '.part.mp3'      # Saída temporária do TranscodeStage
+
+
+def process_alive(pid):
+    """True/False se o processo existe; None quando não há como saber (Windows sem psutil)."""
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == 'nt':
+        return None # os.kill(pid, 0) encerraria o processo no Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def unique_target(directory, filename):
+    """Caminho livre para filename em directory: 'Título.mp3', 'Título (2).mp3', ..."""
+    base, ext = os.path.splitext(filename)
+    candidate = os.path.join(directory, filename)
+    if FILENAME_ID_RE.search(filename):
+        return candidate # 'Título [ID].mp3' já existente é o mesmo vídeo: substitui em vez de duplicar
+    counter = 2
+    while os.path.exists(candidate):
+        candidate = os.path.join(directory, f"{base} ({counter}){ext}")
+        counter += 1
+    return candidate
+
+
+def read_marker(directory, filename):
+    try:
+        with open(os.path.join(directory, filename), encoding='utf-8') as handle:
+            return handle.read().strip()
+    except OSError:
+        return None
+
+
+def write_marker(directory, filename, value):
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as handle:
+        handle.write(str(value))
+
+
+def directory_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass # Arquivo renomeado/removido durante a varredura
+    return total
+
+
+class StagingArea:
+    """Diretório de staging do lote atual: um subdiretório por job, publicação atômica e limite de espaço."""
+
+    def __init__(self, root, output_dir, max_bytes=None):
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.abspath(output_dir)
+        self.max_bytes = max_bytes
+        digest = hashlib.sha1(os.path.normcase(self.output_dir).encode('utf-8')).hexdigest()[:12]
+        self.batch_dir = os.path.join(self.root, f"{BATCH_DIR_PREFIX}{digest}")
+        self.publish_lock = threading.Lock()
+        self.usage_lock = threading.Lock()
+        self.usage_value = 0
+        self.usage_checked = 0.0
+
+    # --- Ciclo de Vida ---
+    def open(self):
+        """Cria (ou reabre) o diretório do lote e remove os de lotes abandonados; retorna quantos foram removidos."""
+        if self.owner_alive(self.batch_dir):
+            # Outro processo com o mesmo diretório de saída (ex.: dois workers): diretório próprio
+            self.batch_dir += f"-{os.getpid()}"
+        os.makedirs(self.batch_dir, exist_ok=True)
+        write_marker(self.batch_dir, OWNER_FILENAME, os.getpid())
+        write_marker(self.batch_dir, OUTPUT_FILENAME, self.output_dir)
+        return self.clean_stale()
+
+    @staticmethod
+    def owner_alive(path):
+        """True/False se há um processo usando o diretório do lote; None quando não há como saber."""
+        owner = read_marker(path, OWNER_FILENAME)
+        if not owner or not owner.isdigit() or int(owner) == os.getpid():
+            return False # Sem dono: lote encerrado (parado) ou marcador nosso que sobrou
+        return process_alive(int(owner))
+
+    def clean_stale(self):
+        removed = 0
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or not entry.name.startswith(BATCH_DIR_PREFIX) or entry.path == self.batch_dir:
+                continue
+            alive = self.owner_alive(entry.path)
+            if alive:
+                continue
+            age = now - entry.stat().st_mtime
+            output_dir = read_marker(entry.path, OUTPUT_FILENAME)
+            if output_dir and age < RESUMABLE_MAX_AGE and find_resumable(output_dir) is not None:
+                continue # Os .part ainda servem para o --resume desse diretório de saída
+            if alive is False or age > STALE_AGE_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def close(self, keep=False):
+        """
+        Encerra o uso do diretório do lote. keep=True (lote parado) mantém os .part para a
+        retomada; senão remove o que restou (jobs com falha permanente).
+        """
+        if keep:
+            try:
+                os.remove(os.path.join(self.batch_dir, OWNER_FILENAME))
+            except OSError:
+                pass
+        else:
+            shutil.rmtree(self.batch_dir, ignore_errors=True)
+
+    # --- Jobs ---
+    def job_path(self, key):
+        return os.path.join(self.batch_dir, re.sub(r'[^\w.-]', '_', key)[:100])
+
+    def job_dir(self, key):
+        """Diretório do job (mantido entre tentativas para o yt-dlp continuar os .part)."""
+        path = self.job_path(key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def has_job_dir(self, key):
+        return os.path.isdir(self.job_path(key))
+
+    def active_jobs(self):
+        try:
+            return sum(1 for name in os.listdir(self.batch_dir) if not name.startswith('.'))
+        except OSError:
+            return 0
+
+    def discard(self, key):
+        shutil.rmtree(self.job_path(key), ignore_errors=True)
+
+    # --- Espaço ---
+    def usage(self):
+        """Bytes ocupados pelo lote (varredura reaproveitada por até USAGE_REFRESH_INTERVAL)."""
+        with self.usage_lock:
+            now = time.monotonic()
+            if now - self.usage_checked >= USAGE_REFRESH_INTERVAL:
+                self.usage_value = directory_size(self.batch_dir)
+                self.usage_checked = now
+            return self.usage_value
+
+    def full(self):
+        return self.max_bytes is not None and self.usage() >= self.max_bytes
+
+    # --- Publicação ---
+    def publish(self, key, output_dir):
+        """Move os MP3 prontos do job para output_dir e descarta o resto; retorna os caminhos finais."""
+        job_path = self.job_path(key)
+        published = []
+        for directory, _, files in os.walk(job_path):
+            for name in sorted(files):
+                if name.lower().endswith('.mp3') and not name.endswith(PARTIAL_SUFFIX):
+                    published.append(self.publish_file(os.path.join(directory, name), output_dir))
+        self.discard(key)
+        return published
+
+    def publish_file(self, source, output_dir):
+        name = os.path.basename(source)
+        if os.stat(source).st_dev == os.stat(output_dir).st_dev:
+            # Mesmo sistema de arquivos: um rename basta
+            with self.publish_lock:
+                target = unique_target(output_dir, name)
+                os.replace(source, target)
+            return target
+        # Outro dispositivo: copia para um temporário oculto no destino e publica com rename
+        partial = os.path.join(output_dir, f".{name}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(source, partial)
+            with self.publish_lock:
+                target = unique_target(output_dir, name)
+                os.replace(partial, target)
+        except OSError:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        os.remove(source)
+        return target
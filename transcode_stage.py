@@ -0,0 +1,182 @@
+import threading
+import os
+from queue import Queue
+
+from engine_events import EVENT_PROGRESS, EVENT_JOB_END
+from progress_protocol import ProgressRecord, PHASE_POSTPROCESS
+from retry_scheduler import FAILURE_UNKNOWN, FAILURE_POSTPROCESS
+
+# Segunda etapa do pipeline: conversão para MP3 com ffmpeg.
+# Os workers de download (limitados por rede) entregam o áudio original numa
+# fila limitada; um pool próprio, dimensionado pelos núcleos da máquina,
+# consome essa fila e faz a conversão (limitada por CPU).
+# Fontes que já são MP3 com a qualidade pedida não passam pelo codificador: a
+# seleção de formato as prefere e o arquivo é só copiado (caminho 'copy').
+
+DEFAULT_FFMPEG_EXECUTABLE = ['ffmpeg']
+DEFAULT_TRANSCODE_WORKERS = os.cpu_count() or 2
+DEFAULT_HANDOFF_SIZE = 16
+
+DEFAULT_MP3_ENCODER = 'libmp3lame'
+MP3_ENCODERS = (DEFAULT_MP3_ENCODER, 'libshine')    # libshine: ponto fixo, mais rápido, só CBR
+
+# Caminho do áudio de cada item concluído
+AUDIO_PATH_COPY = 'copy'
+AUDIO_PATH_TRANSCODE = 'transcode'
+
+# Linhas do ExtractAudio do yt-dlp que revelam o caminho tomado
+COPY_MARKER = 'Not converting audio'
+TRANSCODE_MARKER = '[ExtractAudio] Destination:'
+
+
+def min_copy_bitrate(audio_quality_flag):
+    """Bitrate (kbps) equivalente ao flag de qualidade: 0 = 320, 5 = 192, 10 = 128 (como na GUI) ou '192K'."""
+    flag = str(audio_quality_flag).strip()
+    try:
+        if flag.upper().endswith('K'):
+            return int(float(flag[:-1]))
+        quality = min(10.0, max(0.0, float(flag)))
+    except ValueError:
+        return 320
+    if quality <= 5:
+        return int(round(320 - quality * 25.6))
+    return int(round(192 - (quality - 5) * 12.8))
+
+
+def format_selector(audio_quality_flag, prefer_copy=False):
+    """Seleção de formato do yt-dlp; com prefer_copy, um MP3 de qualidade suficiente vence os demais."""
+    if not prefer_copy:
+        return 'bestaudio/best'
+    # abr desconhecido não passa no filtro: sem garantia de qualidade, recodifica
+    return f'bestaudio[acodec=mp3][abr>={min_copy_bitrate(audio_quality_flag)}]/bestaudio/best'
+
+
+def mp3_quality_args(audio_quality_flag, encoder=DEFAULT_MP3_ENCODER):
+    """Converte o flag de qualidade do yt-dlp (0-10 VBR ou '192K') em argumentos do codificador."""
+    flag = str(audio_quality_flag).strip()
+    if encoder != DEFAULT_MP3_ENCODER:
+        return ['-b:a', f'{min_copy_bitrate(flag)}k'] # Sem VBR fora do libmp3lame
+    if flag.upper().endswith('K'):
+        return ['-b:a', flag.upper()]
+    try:
+        return ['-q:a', str(min(9, max(0, int(float(flag)))))]
+    except ValueError:
+        return ['-q:a', '0']
+
+
+def remove_partial(path):
+    """Apaga a saída parcial do ffmpeg; a conversão sempre recomeça do zero (-y)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def encoder_args(audio_quality_flag, encoder=DEFAULT_MP3_ENCODER, threads=None):
+    """Argumentos de saída do ffmpeg para a codificação MP3 (codificador, qualidade e threads)."""
+    args = ['-codec:a', encoder] + mp3_quality_args(audio_quality_flag, encoder)
+    if threads:
+        args += ['-threads', str(threads)]
+    return args
+
+
+class TranscodeStage:
+    """Pool de conversão alimentado por uma fila limitada (handoff) entre as etapas."""
+
+    def __init__(self, engine, workers=DEFAULT_TRANSCODE_WORKERS, handoff_size=DEFAULT_HANDOFF_SIZE,
+                 ffmpeg_executable=None):
+        self.engine = engine
+        self.workers = max(1, workers)
+        self.handoff_queue = Queue(maxsize=max(1, handoff_size))
+        self.FFMPEG_EXECUTABLE = list(ffmpeg_executable or DEFAULT_FFMPEG_EXECUTABLE)
+        self.threads = []
+        self.active = 0
+        self.active_lock = threading.Lock()
+
+    # --- Ciclo de Vida ---
+    def start(self):
+        self.threads = [threading.Thread(target=self.worker_loop, daemon=True)
+                        for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, url, files):
+        """Entrega arquivos baixados para conversão (bloqueia se a fila estiver cheia)."""
+        # Os workers de conversão só saem ao receber o sentinela, então a fila sempre é drenada
+        self.handoff_queue.put((url, files))
+        self.engine.emit_stage_stats()
+
+    def finish(self):
+        """Sinaliza o fim da etapa de download e aguarda as conversões pendentes."""
+        for _ in self.threads:
+            self.handoff_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def queue_depth(self):
+        return self.handoff_queue.qsize()
+
+    # --- Workers ---
+    def worker_loop(self):
+        while True:
+            item = self.handoff_queue.get()
+            if item is None:
+                return
+            url, files = item
+            with self.active_lock:
+                self.active += 1
+            self.engine.emit_stage_stats()
+            try:
+                self.transcode_job(url, files)
+            finally:
+                with self.active_lock:
+                    self.active -= 1
+                self.engine.emit_stage_stats()
+
+    def build_command(self, source, target):
+        return self.FFMPEG_EXECUTABLE + [
+            '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+            '-i', source,
+            '-vn',
+        ] + encoder_args(self.engine.audio_quality_flag, self.engine.mp3_encoder,
+                         self.engine.transcode_threads) + [target]
+
+    def transcode_job(self, url, files):
+        engine = self.engine
+        ok = True
+        return_code = 0
+        try:
+            if engine.stop_event.is_set():
+                engine.log_message(f"🚫 [CANCELADO] Conversão não iniciada: {url[:40]}...", 'warn')
+                return
+
+            engine.emit(EVENT_PROGRESS, url, ProgressRecord(PHASE_POSTPROCESS, 'started', postprocessor='ffmpeg'))
+            audio_path = AUDIO_PATH_COPY
+            for source in files:
+                if source.lower().endswith('.mp3'):
+                    continue # Já está no formato final (fonte MP3 escolhida pela seleção de formato)
+                audio_path = AUDIO_PATH_TRANSCODE
+                base = os.path.splitext(source)[0]
+                # Escreve em um arquivo temporário e publica com rename atômico
+                partial = base + '.part.mp3'
+                return_code = engine.run_process(url, self.build_command(source, partial))
+                if engine.stop_event.is_set():
+                    remove_partial(partial) # A fonte fica para a retomada; o parcial não serve
+                    return
+                if return_code != 0:
+                    remove_partial(partial)
+                    ok = False
+                    break
+                os.replace(partial, base + '.mp3')
+                os.remove(source)
+
+            engine.emit(EVENT_PROGRESS, url, ProgressRecord(PHASE_POSTPROCESS, 'finished', postprocessor='ffmpeg'))
+            engine.finish_job(url, ok, return_code, files, category=None if ok else FAILURE_POSTPROCESS,
+                              audio_path=audio_path)
+
+        except Exception as e:
+            engine.record_failure(url, FAILURE_UNKNOWN, str(e))
+            engine.record_result(url, False)
+            engine.log_message(f"🚨 [ERRO FATAL] Conversão falhou em {url[:50]}: {e}", 'error')
+        finally:
+            engine.emit(EVENT_JOB_END, url)
@@ -0,0 +1,94 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+# Leitura e normalização das listas de URLs.
+# Um arquivo de URLs é lido sob demanda, uma linha por vez, enquanto o lote é
+# agendado: nada da lista fica inteiro na memória nem no campo de texto da GUI
+# (a deduplicação do motor guarda só a chave de cada item).
+# Cada linha é normalizada (espaços, aspas/<>, esquema ausente, host em
+# minúsculas, fragmento) e validada na mesma passada; linhas inválidas são
+# contadas e as primeiras são guardadas como exemplo para o log.
+
+VALID_SCHEMES = ('http', 'https')
+INVALID_SAMPLES = 5
+BARE_HOST_PATTERN = re.compile(r'^(www\.|m\.|music\.)?[a-z0-9-]+(\.[a-z0-9-]+)+/', re.IGNORECASE)
+
+
+def normalize_url(line):
+    """
+    Normaliza uma linha da lista. Retorna (url, erro): (url, None) para uma URL válida,
+    (None, None) para linhas vazias/comentários e (None, motivo) para linhas inválidas.
+    """
+    text = line.strip().strip('<>"\'').strip()
+    if not text or text.startswith('#'):
+        return None, None
+    if '://' not in text and BARE_HOST_PATTERN.match(text):
+        text = 'https://' + text # Ex.: "youtu.be/abc" copiado sem o esquema
+    if any(char.isspace() for char in text):
+        return None, "contém espaços"
+    parts = urlsplit(text)
+    if parts.scheme.lower() not in VALID_SCHEMES:
+        return None, "esquema não suportado"
+    if not parts.hostname or '.' not in parts.hostname:
+        return None, "host inválido"
+    # O fragmento (#...) nunca chega ao servidor e faria a mesma URL parecer diferente
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, '')), None
+
+
+class UrlLines:
+    """Iterável de URLs normalizadas sobre linhas quaisquer, com as contagens da última passada."""
+
+    def __init__(self, lines=()):
+        self.lines = lines
+        self.read = 0
+        self.accepted = 0
+        self.invalid = 0
+        self.invalid_samples = []
+
+    def __iter__(self):
+        return self.normalize(self.lines)
+
+    def normalize(self, lines):
+        self.read = self.accepted = self.invalid = 0
+        self.invalid_samples = []
+        for number, line in enumerate(lines, 1):
+            self.read = number
+            url, error = normalize_url(line)
+            if url is not None:
+                self.accepted += 1
+                yield url
+            elif error is not None:
+                self.invalid += 1
+                if len(self.invalid_samples) < INVALID_SAMPLES:
+                    self.invalid_samples.append((number, line.strip()[:80], error))
+
+    def describe_invalid(self):
+        """Resumo das linhas descartadas para o log, ou None se todas eram válidas."""
+        if not self.invalid:
+            return None
+        samples = '; '.join(f"linha {number}: {text!r} ({error})" for number, text, error in self.invalid_samples)
+        return f"{self.invalid} linhas inválidas ignoradas ({samples}{'; ...' if self.invalid > INVALID_SAMPLES else ''})"
+
+
+class UrlFileSource(UrlLines):
+    """Arquivo de URLs lido sob demanda; pode ser percorrido de novo (ex.: na retomada do lote)."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = os.path.abspath(path)
+
+    def __iter__(self):
+        # errors='replace': um byte inválido não deve derrubar a leitura de um arquivo enorme
+        with open(self.path, encoding='utf-8-sig', errors='replace') as handle:
+            yield from self.normalize(handle)
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    def size_bytes(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return None
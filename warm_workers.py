@@ -0,0 +1,169 @@
+import importlib
+import multiprocessing
+import signal
+from queue import Queue
+
+from progress_protocol import ProgressRecord, ProgressRateLimiter, PHASE_DOWNLOAD, PHASE_POSTPROCESS
+
+# Modo de execução com workers persistentes ("quentes").
+# Cada processo importa o yt-dlp uma única vez e atende vários jobs pela API
+# Python (YoutubeDL), reportando progresso por hooks em vez de stdout. Isso
+# elimina o custo de subir um interpretador e carregar os extratores por URL.
+
+MSG_PROGRESS = 'progress'   # (MSG_PROGRESS, ProgressRecord)
+MSG_LOG = 'log'             # (MSG_LOG, mensagem, nível)
+MSG_DONE = 'done'           # (MSG_DONE, código de retorno)
+
+DEFAULT_YTDLP_MODULE = 'yt_dlp'
+
+
+class _PipeLogger:
+    """Logger do yt-dlp que encaminha as mensagens pelo pipe do worker."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def debug(self, msg):
+        # O yt-dlp manda mensagens informativas via debug(); só o debug real tem o prefixo
+        if not msg.startswith('[debug] '):
+            self.conn.send((MSG_LOG, msg, 'process'))
+
+    def info(self, msg):
+        self.conn.send((MSG_LOG, msg, 'process'))
+
+    def warning(self, msg):
+        self.conn.send((MSG_LOG, msg, 'warn'))
+
+    def error(self, msg):
+        self.conn.send((MSG_LOG, msg, 'error'))
+
+
+def worker_main(conn, ytdlp_module):
+    """Loop de um worker persistente: importa o yt-dlp uma vez e atende jobs até receber None."""
+    # Ctrl+C chega a todo o grupo de processos; quem encerra o worker é o processo pai
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    module = importlib.import_module(ytdlp_module)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        url, options, max_progress_rate, info_json = job
+        rate_limiter = ProgressRateLimiter(max_progress_rate)
+
+        def send_record(record):
+            if rate_limiter.allow(record):
+                conn.send((MSG_PROGRESS, record))
+
+        def progress_hook(d):
+            send_record(ProgressRecord(PHASE_DOWNLOAD, d.get('status'),
+                                       downloaded_bytes=d.get('downloaded_bytes'),
+                                       total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                                       speed=d.get('speed'), eta=d.get('eta'), filename=d.get('filename')))
+
+        def postprocessor_hook(d):
+            send_record(ProgressRecord(PHASE_POSTPROCESS, d.get('status'), postprocessor=d.get('postprocessor')))
+
+        params = dict(options, logger=_PipeLogger(conn),
+                      progress_hooks=[progress_hook], postprocessor_hooks=[postprocessor_hook])
+        try:
+            with module.YoutubeDL(params) as ydl:
+                if info_json is not None:
+                    # Metadados em cache: pula a extração
+                    return_code = ydl.download_with_info_file(info_json)
+                else:
+                    return_code = ydl.download([url])
+        except Exception as e:
+            # DownloadError já foi reportado pelo logger do yt-dlp
+            if type(e).__name__ != 'DownloadError':
+                conn.send((MSG_LOG, f"Erro no worker persistente: {e}", 'error'))
+            return_code = 1
+        conn.send((MSG_DONE, return_code))
+
+
+class WarmWorker:
+    def __init__(self, ctx, ytdlp_module):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn, ytdlp_module), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+
+class WarmJobHandle:
+    """Imita a interface de subprocess.Popen usada por DownloadEngine.stop() (poll/terminate)."""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        # Encerrar o processo é a única forma de interromper o yt-dlp no meio de um job
+        self.worker.process.terminate()
+
+
+class WarmWorkerPool:
+    """Pool de processos persistentes; run_job() bloqueia a thread chamadora até o fim do job."""
+
+    def __init__(self, size, ytdlp_module=DEFAULT_YTDLP_MODULE):
+        self.ctx = multiprocessing.get_context('spawn')
+        self.ytdlp_module = ytdlp_module
+        self.idle = Queue()
+        self.all_workers = []
+        for _ in range(size):
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        worker = WarmWorker(self.ctx, self.ytdlp_module)
+        self.all_workers.append(worker)
+        return worker
+
+    def run_job(self, url, options, max_progress_rate, on_message, on_start=None, info_json=None):
+        """Envia um job a um worker ocioso e repassa as mensagens a on_message até o término."""
+        worker = self.idle.get()
+        if worker is None:
+            # Um worker anterior morreu (ex.: botão de parar); sobe um novo sob demanda
+            worker = self.spawn()
+
+        handle = WarmJobHandle(worker)
+        if on_start is not None:
+            on_start(handle)
+
+        return_code = None
+        try:
+            worker.conn.send((url, options, max_progress_rate, info_json))
+            while True:
+                message = worker.conn.recv()
+                if message[0] == MSG_DONE:
+                    return_code = message[1]
+                    break
+                on_message(message)
+        except (EOFError, OSError):
+            # O processo foi encerrado no meio do job
+            worker.process.join(timeout=5)
+            return_code = worker.process.exitcode if worker.process.exitcode is not None else -1
+            worker.conn.close()
+            worker = None
+        finally:
+            handle.returncode = return_code
+            self.idle.put(worker)
+        return return_code
+
+    def close(self):
+        """Encerra todos os workers (os ociosos recebem None; os demais são terminados)."""
+        for worker in self.all_workers:
+            try:
+                if worker.process.is_alive():
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self.all_workers:
+            worker.process.join(timeout=2)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(timeout=2)
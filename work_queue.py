@@ -0,0 +1,397 @@
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue, Empty
+
+from engine_events import EVENT_PROGRESS, EVENT_ITEM_DONE, EVENT_JOB_END
+from download_index import extract_video_key
+from progress_protocol import ProgressRecord
+from warm_workers import MSG_PROGRESS, MSG_LOG, MSG_DONE
+
+# Fila de jobs compartilhada entre máquinas (coordenador e workers remotos).
+# O coordenador é um DownloadEngine no modo 'remote': faz a expansão, o índice,
+# o diário e as retentativas como sempre, mas cada job vira uma entrada numa
+# fila servida por HTTP/JSON. Workers (outros DownloadEngine) arrendam um job
+# por vaga livre, executam download e conversão localmente e mandam progresso
+# em heartbeats; um arrendamento sem heartbeat por lease_timeout volta para a
+# fila. Não há autenticação: por padrão o coordenador escuta só em localhost.
+#
+# Protocolo (POST com corpo JSON, resposta JSON):
+#   /lease      {worker}                 -> {lease, url} | {wait: s} | {done: true}
+#   /heartbeat  {worker, leases: {lease: progresso ou null}} -> {cancel: [lease, ...]}
+#   /result     {lease, return_code, detail, audio_path, requeue}
+#   GET /status                          -> jobs na fila e arrendados por worker
+
+DEFAULT_PORT = 8765
+DEFAULT_ADDRESS = ('127.0.0.1', DEFAULT_PORT)
+COORDINATOR_ENV_VAR = 'MP3_BAIXAR_COORDINATOR'   # host:porta do coordenador na GUI
+DEFAULT_LEASE_TIMEOUT = 30.0
+LEASE_POLL_INTERVAL = 1.0       # Espera sugerida a um worker quando a fila está vazia
+HEARTBEAT_INTERVAL = 1.0
+REQUEST_TIMEOUT = 10.0
+CONNECT_RETRIES = 5             # Falhas seguidas antes de o worker desistir do coordenador
+
+MSG_LEASED = 'leased'           # (MSG_LEASED, nome do worker)
+RETURN_CODE_CANCELLED = -1
+
+
+def parse_address(text, default_host=DEFAULT_ADDRESS[0]):
+    """'porta', 'host:porta' ou 'host' -> (host, porta)."""
+    host, _, port = text.rpartition(':') if ':' in text else ('', '', text)
+    if not port.isdigit():
+        host, port = text, DEFAULT_PORT
+    return host or default_host, int(port)
+
+
+# --- Coordenador ---
+class RemoteJob:
+    def __init__(self, url):
+        self.url = url
+        self.lease = None
+        self.worker = None
+        self.last_seen = 0.0
+        self.cancelled = False
+        self.messages = Queue()
+
+
+class RemoteJobHandle:
+    """Imita subprocess.Popen (poll/terminate) para DownloadEngine.stop()."""
+
+    def __init__(self, coordinator, job):
+        self.coordinator = coordinator
+        self.job = job
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.coordinator.cancel(self.job)
+
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_error(404)
+            return
+        self.reply(self.server.coordinator.status())
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        routes = {'/lease': coordinator.lease, '/heartbeat': coordinator.heartbeat, '/result': coordinator.result}
+        route = routes.get(self.path)
+        if route is None:
+            self.send_error(404)
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self.send_error(400)
+            return
+        self.reply(route(payload))
+
+    def reply(self, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Sem log de acesso no stderr (um heartbeat por segundo por worker)
+
+
+class WorkQueueCoordinator:
+    """Fila de jobs servida por HTTP; run_job() bloqueia a thread chamadora até um worker reportar o resultado."""
+
+    def __init__(self, address=DEFAULT_ADDRESS, lease_timeout=DEFAULT_LEASE_TIMEOUT):
+        self.address = address
+        self.lease_timeout = lease_timeout
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.leases = {}
+        self.lease_ids = itertools.count(1)
+        self.workers = {}
+        self.closed = False
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(self.address, CoordinatorRequestHandler)
+        self.server.daemon_threads = True
+        self.server.coordinator = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            seen_workers = bool(self.workers)
+        if seen_workers:
+            time.sleep(LEASE_POLL_INTERVAL) # Workers aguardando a fila recebem {done} em vez de conexão recusada
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- Lado do motor ---
+    def run_job(self, url, on_message, on_start=None):
+        """Enfileira a URL e repassa as mensagens do worker a on_message; retorna o resultado (dict)."""
+        job = RemoteJob(url)
+        handle = RemoteJobHandle(self, job)
+        if on_start is not None:
+            on_start(handle)
+        with self.lock:
+            self.pending.append(job)
+        result = {'return_code': RETURN_CODE_CANCELLED}
+        try:
+            while not job.cancelled:
+                try:
+                    message = job.messages.get(timeout=LEASE_POLL_INTERVAL)
+                except Empty:
+                    self.expire(job, on_message)
+                    continue
+                if message[0] == MSG_DONE:
+                    result = message[1]
+                    break
+                on_message(message)
+        finally:
+            handle.returncode = result['return_code']
+        return result
+
+    def expire(self, job, on_message):
+        """Devolve à fila um job cujo worker parou de mandar heartbeats."""
+        with self.lock:
+            if job.lease is None or time.monotonic() - job.last_seen <= self.lease_timeout:
+                return
+            worker = job.worker
+            self.leases.pop(job.lease, None)
+            job.lease = None
+            job.worker = None
+            self.pending.appendleft(job)
+        on_message((MSG_LOG, f"🌐 Worker {worker} sem resposta há {self.lease_timeout:.0f}s; "
+                             f"job volta para a fila: {job.url[:50]}...", 'warn'))
+
+    def cancel(self, job):
+        with self.lock:
+            job.cancelled = True
+            if job.lease is None and job in self.pending:
+                self.pending.remove(job)
+
+    # --- Lado HTTP ---
+    def lease(self, payload):
+        worker = str(payload.get('worker', '?'))
+        with self.lock:
+            self.workers[worker] = time.monotonic()
+            if self.closed:
+                return {'done': True}
+            while self.pending:
+                job = self.pending.popleft()
+                if job.cancelled:
+                    continue
+                job.lease = str(next(self.lease_ids))
+                job.worker = worker
+                job.last_seen = time.monotonic()
+                self.leases[job.lease] = job
+                job.messages.put((MSG_LEASED, worker))
+                return {'lease': job.lease, 'url': job.url}
+        return {'wait': LEASE_POLL_INTERVAL}
+
+    def heartbeat(self, payload):
+        now = time.monotonic()
+        cancel = []
+        with self.lock:
+            self.workers[str(payload.get('worker', '?'))] = now
+            for lease, progress in (payload.get('leases') or {}).items():
+                job = self.leases.get(lease)
+                if job is None or job.cancelled:
+                    cancel.append(lease)
+                    continue
+                job.last_seen = now
+                if progress:
+                    job.messages.put((MSG_PROGRESS, ProgressRecord(**progress)))
+        return {'cancel': cancel}
+
+    def result(self, payload):
+        with self.lock:
+            job = self.leases.pop(str(payload.get('lease')), None)
+            if job is None:
+                return {} # Arrendamento já expirado/cancelado: o job foi para outro worker
+            job.lease = None
+            if payload.get('requeue') and not job.cancelled:
+                # Worker parado no meio do job: outro worker assume
+                self.pending.appendleft(job)
+                return {}
+            payload['worker'] = job.worker
+        job.messages.put((MSG_DONE, payload))
+        return {}
+
+    def status(self):
+        with self.lock:
+            leased = {}
+            for job in self.leases.values():
+                leased.setdefault(job.worker, []).append(job.url)
+            return {'pending': len(self.pending), 'leased': leased, 'closed': self.closed}
+
+
+# --- Worker ---
+class WorkQueueClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def post(self, path, payload):
+        request = urllib.request.Request(self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read() or b'{}')
+
+
+class WorkQueueWorker:
+    """
+    Executa no DownloadEngine local os jobs arrendados do coordenador: uma thread de
+    arrendamento por vaga, progresso e logs em heartbeats e o resultado ao fim de cada job.
+    """
+
+    def __init__(self, engine, coordinator_url, name=None):
+        self.engine = engine
+        self.client = WorkQueueClient(coordinator_url)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.lock = threading.Lock()
+        self.leases = {}            # url -> arrendamento
+        self.progress = {}          # url -> último ProgressRecord (só o mais recente vai no heartbeat)
+        self.results = {}           # url -> dados do ITEM_DONE
+        self.finished = threading.Event()
+        self.failures = 0
+
+    def run(self, pool_size):
+        """Bloqueia até o coordenador encerrar o lote (ou sumir) e os jobs locais terminarem."""
+        engine = self.engine
+        engine.subscribe(self.on_event)
+        engine.log_message(f"🌐 Worker {self.name} conectado a {self.client.base_url} ({pool_size} vagas).", 'info')
+        heartbeat = threading.Thread(target=self.heartbeat_loop, daemon=True)
+        heartbeat.start()
+        threads = [threading.Thread(target=self.lease_loop, daemon=True) for _ in range(pool_size)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+            # Jobs entregues à conversão ainda terminam (e precisam de heartbeat) depois das threads
+            while not engine.stop_event.is_set():
+                with self.lock:
+                    if not self.leases:
+                        break
+                time.sleep(HEARTBEAT_INTERVAL / 4)
+        finally:
+            self.finished.set()
+            heartbeat.join()
+            engine.unsubscribe(self.on_event)
+
+    def request(self, path, payload):
+        """POST ao coordenador; None se ele não respondeu."""
+        try:
+            reply = self.client.post(path, payload)
+        except (OSError, ValueError) as e:
+            with self.lock:
+                self.failures += 1
+                first = self.failures == 1
+            if first:
+                self.engine.log_message(f"🌐 Coordenador inacessível ({path}): {e}", 'warn')
+            return None
+        with self.lock:
+            self.failures = 0
+        return reply
+
+    def lease_loop(self):
+        engine = self.engine
+        while not engine.stop_event.is_set():
+            reply = self.request('/lease', {'worker': self.name})
+            if reply is None:
+                if self.failures >= CONNECT_RETRIES:
+                    return
+                time.sleep(LEASE_POLL_INTERVAL)
+                continue
+            if reply.get('done'):
+                return
+            if 'url' not in reply:
+                time.sleep(reply.get('wait', LEASE_POLL_INTERVAL))
+                continue
+            url = reply['url']
+            with self.lock:
+                self.leases[url] = reply['lease']
+            # O coordenador já removeu duplicatas e pode reenviar a mesma URL (retentativa)
+            if engine.admit(url, set()):
+                engine.update_total()
+                engine.download_single_url(url)
+            else:
+                self.report(url) # Já presente no índice local: conta como concluído
+
+    def on_event(self, event_type, url, data):
+        if url is None or event_type not in (EVENT_PROGRESS, EVENT_ITEM_DONE, EVENT_JOB_END):
+            return
+        with self.lock:
+            # Mesma trava do report(): um resultado nunca chega depois de o arrendamento ser devolvido
+            if url not in self.leases:
+                return
+            if event_type == EVENT_PROGRESS:
+                self.progress[url] = data
+            elif event_type == EVENT_ITEM_DONE:
+                self.results[url] = data
+        if event_type == EVENT_JOB_END:
+            self.report(url)
+
+    def report(self, url):
+        with self.lock:
+            lease = self.leases.pop(url, None)
+            self.progress.pop(url, None)
+            data = self.results.pop(url, None)
+        if lease is None:
+            return
+        if data is None:
+            # Terminou sem resultado (parado): devolve o job para outro worker
+            self.request('/result', {'lease': lease, 'requeue': True})
+            return
+        payload = {'lease': lease, 'return_code': 0 if data['ok'] else (data.get('return_code') or 1),
+                   'audio_path': data.get('audio_path'), 'detail': None, 'file': None}
+        index = self.engine.index
+        if data['ok'] and index is not None:
+            # O MP3 fica nesta máquina: o coordenador registra onde e em que qualidade (para pular na próxima vez)
+            path = index.lookup(extract_video_key(url))
+            if path is not None:
+                payload['file'] = {'path': path, 'size': os.path.getsize(path),
+                                   'quality': self.engine.audio_quality_flag}
+        if not data['ok']:
+            # A classificação da falha é refeita pelo coordenador a partir da mesma linha de erro
+            for failure in reversed(self.engine.retry_scheduler.failures):
+                if failure['url'] == url:
+                    payload['detail'] = failure['detail']
+                    break
+        self.request('/result', payload)
+
+    def heartbeat_loop(self):
+        while not self.finished.wait(HEARTBEAT_INTERVAL):
+            with self.lock:
+                if not self.leases:
+                    continue
+                leases = {lease: self.progress.pop(url)._asdict() if url in self.progress else None
+                          for url, lease in self.leases.items()}
+                by_lease = {lease: url for url, lease in self.leases.items()}
+            reply = self.request('/heartbeat', {'worker': self.name, 'leases': leases})
+            for lease in (reply or {}).get('cancel', ()):
+                # Cancelado no coordenador (botão de parar) ou arrendamento expirado
+                url = by_lease.get(lease)
+                process = self.engine.active_processes.get(url)
+                if process is not None and process.poll() is None:
+                    self.engine.log_message(f"🚫 Cancelado pelo coordenador: {url[:40]}...", 'warn')
+                    process.terminate()
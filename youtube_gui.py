@@ -1,18 +1,37 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, filedialog, ttk
 import threading
-import subprocess
 import os
-import sys
-import re
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue # Importação necessária para a fila de comunicação
+import time
+from queue import Queue, Empty # Importação necessária para a fila de comunicação
+
+from download_engine import (DownloadEngine, DEFAULT_MAX_WORKERS, DEFAULT_CONCURRENT_FRAGMENTS,
+                             DEFAULT_YTDLP_EXECUTABLE, EXECUTION_SUBPROCESS, EXECUTION_WARM, EXECUTION_ASYNC, EXECUTION_REMOTE, EVENT_LOG, EVENT_BATCH_START, EVENT_JOB_START,
+                             EVENT_PROGRESS, EVENT_JOB_END, EVENT_ITEM_DONE, EVENT_BATCH_END,
+                             EVENT_STAGE_STATS, EVENT_BATCH_TOTAL, EVENT_CONCURRENCY)
+from engine_events import EVENT_BANDWIDTH
+from progress_protocol import format_bytes
+from download_index import DownloadIndex
+from metadata_cache import DEFAULT_CACHE_DIR
+from staging_area import DEFAULT_STAGING_DIR
+from batch_journal import find_resumable, IN_FLIGHT_STATES, STATE_DONE
+from log_console import LogConsole, LOG_LEVELS, DEFAULT_MAX_LINES
+from progress_panel import ProgressPanel
+from url_source import UrlLines, UrlFileSource
+from profiling_hook import ProfileHook, PROFILE_ENV_VAR, PROFILE_MODES
+from work_queue import COORDINATOR_ENV_VAR, DEFAULT_ADDRESS, parse_address
+from bandwidth_budget import parse_rate
 
 # PRÉ-REQUISITOS (Obrigatórios):
 # 1. Instalar o yt-dlp: pip install yt-dlp
 # 2. Instalar o ffmpeg: Necessário para a conversão para MP3. Deve estar no PATH do sistema.
 
 class YouTubeDownloaderApp:
+    # Eventos que são fotografias de estado: na drenagem coalescida só o último de cada tick é aplicado
+    SNAPSHOT_EVENTS = (EVENT_STAGE_STATS, EVENT_BATCH_TOTAL, EVENT_CONCURRENCY, EVENT_BANDWIDTH)
+    # Colunas da grade de opções do lote (cabe na largura mínima da janela)
+    OPTION_COLUMNS = 2
+
     def __init__(self, master):
         self.master = master
         master.title("Downloader de MP3 em Lote - Estilo Moderno e Interativo")
@@ -21,16 +40,26 @@ class YouTubeDownloaderApp:
 
         # --- Variáveis de Controle de Estado e Interrupção ---
         self.is_downloading = False
-        self.stop_event = threading.Event()
-        self.active_processes = {}
-        self.max_workers = 4
-        self.YTDLP_EXECUTABLE = [sys.executable, '-m', 'yt_dlp']
+        self.engine = None # Motor headless (download_engine.DownloadEngine) do lote atual
+        self.max_workers = DEFAULT_MAX_WORKERS
+        self.concurrent_fragments = DEFAULT_CONCURRENT_FRAGMENTS
+        self.YTDLP_EXECUTABLE = list(DEFAULT_YTDLP_EXECUTABLE)
         
         # --- NOVO: Fila de comunicação para Thread-Safe UI Updates ---
         # (tipo, url, mensagem)
         self.ui_update_queue = Queue() 
         self.check_queue_interval = 50 # Verifica a fila a cada 50ms
         
+        # Drenagem coalescida: por tick, só o último progresso de cada URL é aplicado,
+        # os logs entram num único insert e o tick para ao estourar o orçamento de tempo.
+        self.coalesce_ui_events = True
+        self.ui_drain_budget_ms = 25
+        self.ui_queue_depth = 0
+        self.ui_drain_ms = 0.0
+        self.ui_drain_max_ms = 0.0
+        self.ui_queue_stats_var = tk.StringVar(value="")
+        self.ui_queue_stats_text = "" # Último texto aplicado (ticks ociosos não tocam no Tk)
+        
         # --- Configuração de Estilo Dark Moderno ---
         self.style = ttk.Style(self.master)
         
@@ -96,14 +125,74 @@ class YouTubeDownloaderApp:
         self.output_dir_var = tk.StringVar(value=default_dir)
         self.audio_quality_var = tk.StringVar(value='0 (320 kbps - Melhor)')
         
+        # Arquivo de URLs importado: lido sob demanda pelo motor, sem passar pelo campo de texto
+        self.url_source = None
+        self.url_source_var = tk.StringVar(value="")
+        
         self.progress_count = tk.DoubleVar(value=0.0)
+        self.batch_total_final = True
         self.progress_text_var = tk.StringVar(value="")
 
-        # Dicionário para rastrear o progresso individual de cada URL
-        self.individual_progress = {} 
-        self.individual_progress_lock = threading.Lock()
+        # Falhas do lote atual (linha de resumo do painel de progresso individual)
+        self.batch_failed = 0
+        
+        # Configuração do console de log (limite de linhas, filtro de níveis e arquivo de excedente)
+        self.log_max_lines_var = tk.IntVar(value=DEFAULT_MAX_LINES)
+        self.log_level_vars = {level: tk.BooleanVar(value=True) for level in LOG_LEVELS}
+        self.log_spill_var = tk.BooleanVar(value=False)
+        
+        # Pipeline em duas etapas (download em I/O, conversão em pool de CPU)
+        self.split_transcode_var = tk.BooleanVar(value=False)
+        self.stage_stats_var = tk.StringVar(value="")
+        
+        # Workers persistentes: importam o yt-dlp uma vez e reaproveitam o interpretador entre URLs
+        self.warm_workers_var = tk.BooleanVar(value=False)
+        
+        # Orquestrador asyncio: um único event loop lê todos os subprocessos (sem uma thread por job)
+        self.async_orchestrator_var = tk.BooleanVar(value=False)
+        
+        # Coordenador: a fila do lote é servida a workers remotos (MP3_BAIXAR_COORDINATOR=host:porta)
+        self.coordinator_var = tk.BooleanVar(value=False)
+        coordinator = os.environ.get(COORDINATOR_ENV_VAR, '').strip()
+        self.coordinator_address = parse_address(coordinator) if coordinator else DEFAULT_ADDRESS
+        
+        # Índice persistente de itens já baixados (SQLite no diretório de saída)
+        self.use_index_var = tk.BooleanVar(value=True)
+        
+        # Cache de metadados extraídos (retentativas e lotes repetidos pulam a extração)
+        self.metadata_cache_var = tk.BooleanVar(value=True)
+        
+        # Concorrência adaptativa: jobs e fragmentos ajustados durante o lote (o banner mostra os valores atuais)
+        self.adaptive_var = tk.BooleanVar(value=True)
+        
+        # Fontes já em MP3 com a qualidade escolhida são copiadas sem recodificar
+        self.prefer_copy_var = tk.BooleanVar(value=True)
+        
+        # Arquivos temporários no disco local (útil quando a saída é um compartilhamento de rede)
+        self.staging_var = tk.BooleanVar(value=False)
+        
+        # Orçamento global de banda: conexões (0 = sem limite) e taxa total (ex.: 8M), ajustáveis durante o lote
+        self.max_connections_var = tk.IntVar(value=0)
+        self.max_rate_var = tk.StringVar(value="")
+        self.bandwidth_var = tk.StringVar()
+        self.update_bandwidth_banner({'jobs': 0, 'connections': 0, 'max_connections': None,
+                                      'rate': 0, 'max_rate': None, 'hosts': {}})
+        
+        # Métricas por fase (JSON + Prometheus no diretório de saída)
+        self.metrics_var = tk.BooleanVar(value=False)
+        
+        # Profiling opcional (MP3_BAIXAR_PROFILE=cprofile|tracemalloc): thread da UI e orquestrador
+        self.profile_mode = os.environ.get(PROFILE_ENV_VAR, '').strip().lower() or None
+        if self.profile_mode not in PROFILE_MODES:
+            self.profile_mode = None
+        self.ui_profiler = None
+        self.concurrency_var = tk.StringVar()
+        self.update_concurrency_banner({'jobs': self.max_workers, 'fragments': self.concurrent_fragments,
+                                        'throughput': None, 'cpu': None, 'adaptive': False})
         
         self.create_widgets()
+        self.log_console = LogConsole(self.log_text, max_lines=self.log_max_lines_var.get())
+        self.progress_panel = ProgressPanel(self.progress_display_frame)
         
         # Configuração de Cores para o Log Interativo
         self.log_text.tag_config('success', foreground='#00FF7F')
@@ -115,17 +204,52 @@ class YouTubeDownloaderApp:
 
         # Inicia o loop de verificação da fila de eventos
         self.master.after(self.check_queue_interval, self.check_ui_queue)
+        
+        # Lote interrompido no diretório padrão (app fechado ou travado no meio do lote)?
+        self.master.after(200, self.offer_resume)
+        
+        if self.profile_mode:
+            self.ui_profiler = ProfileHook(self.profile_mode, self.output_dir_var.get(), 'ui').start()
+            self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+            self.log_internal(f"🔬 Profiling ({self.profile_mode}) ativo na thread da UI e no orquestrador.", 'info')
+
+    def on_close(self):
+        """Grava o profiling da thread da UI antes de fechar a janela."""
+        if self.ui_profiler is not None:
+            print(f"Profiling da UI salvo em {self.ui_profiler.stop()}")
+            self.ui_profiler = None
+        self.master.destroy()
 
 
     # --- Funções de Log e Utilidade ---
     def log_internal(self, message, level='process'):
         """Adiciona uma mensagem ao console de log e aplica a cor (somente thread principal)."""
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, message + "\n", level)
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
+        self.log_console.write(message, level)
         self.master.update_idletasks() # Atualiza imediatamente para responsividade
 
+    def log_bulk(self, entries):
+        """Adiciona várias mensagens (mensagem, nível) ao log com um único insert (somente thread principal)."""
+        if entries:
+            self.log_console.write_many(entries)
+
+    def apply_log_settings(self, event=None):
+        """Aplica limite de linhas, filtro de níveis e gravação em disco do console de log."""
+        try:
+            self.log_console.set_max_lines(self.log_max_lines_var.get())
+        except (tk.TclError, ValueError):
+            self.log_max_lines_var.set(self.log_console.max_lines)
+
+        levels = [level for level, var in self.log_level_vars.items() if var.get()]
+        if set(levels) != self.log_console.visible_levels:
+            self.log_console.set_visible_levels(levels)
+
+        if self.log_spill_var.get():
+            spill_path = os.path.join(self.output_dir_var.get(), 'mp3-baixar.log')
+            if self.log_console.spill_handler is None or self.log_console.spill_handler.baseFilename != os.path.abspath(spill_path):
+                self.log_console.enable_spill(spill_path)
+        else:
+            self.log_console.disable_spill()
+
     def log_message(self, message, level='process'):
         """Thread-safe: Adiciona mensagem à fila para processamento na thread principal."""
         self.ui_update_queue.put(('LOG', None, (message, level)))
@@ -137,123 +261,286 @@ class YouTubeDownloaderApp:
         )
         if new_dir:
             self.output_dir_var.set(new_dir)
+            self.apply_log_settings() # O arquivo de excedente acompanha o diretório de saída
             self.log_internal(f"Diretório de saída alterado para: {new_dir}", 'info')
+            self.offer_resume()
             
+    def import_url_file(self):
+        """Seleciona um arquivo de URLs (uma por linha) que será lido sob demanda durante o lote."""
+        path = filedialog.askopenfilename(
+            title="Importar Lista de URLs",
+            filetypes=[("Listas de URLs", "*.txt *.csv *.list"), ("Todos os arquivos", "*.*")]
+        )
+        if path:
+            self.set_url_source(UrlFileSource(path))
+
+    def set_url_source(self, source):
+        self.url_source = source
+        if source is None:
+            self.url_source_var.set("")
+            return
+        size = source.size_bytes()
+        self.url_source_var.set(f"📄 {source.name} ({format_bytes(size)}) - lido sob demanda; "
+                                f"o campo de texto será ignorado")
+        self.log_internal(f"Lista de URLs importada: {source.path}", 'info')
+
+    def rebuild_index(self):
+        """Reescaneia o diretório de saída e reconstrói o índice em segundo plano."""
+        output_dir = self.output_dir_var.get()
+
+        def worker():
+            try:
+                index = DownloadIndex(output_dir)
+                kept, removed, added = index.rebuild()
+                index.close()
+                self.log_message(f"🔁 Índice reconstruído: {kept} mantidos, {removed} removidos, {added} adicionados.", 'info')
+            except Exception as e:
+                self.log_message(f"🚨 Falha ao reconstruir o índice: {e}", 'error')
+
+        self.log_internal(f"🔁 Reconstruindo índice de {output_dir}...", 'info')
+        threading.Thread(target=worker, daemon=True).start()
+
+    def offer_resume(self):
+        """Se o diretório de saída tiver um lote interrompido, pergunta se deve retomá-lo."""
+        if self.is_downloading:
+            return
+        snapshot = find_resumable(self.output_dir_var.get())
+        if snapshot is None:
+            return
+        done = snapshot.count(STATE_DONE)
+        in_flight = snapshot.count(*IN_FLIGHT_STATES)
+        origin = (f"a lista {os.path.basename(snapshot.source)}" if snapshot.source
+                  else f"{len(snapshot.urls)} URLs informadas")
+        if messagebox.askyesno(
+                "Retomar lote",
+                f"Foi encontrado um lote interrompido com {origin} "
+                f"({done} itens concluídos, {in_flight} em andamento).\n\n"
+                "Deseja retomá-lo? Os concluídos serão pulados e os downloads parciais continuarão."):
+            if snapshot.source:
+                self.set_url_source(UrlFileSource(snapshot.source))
+            else:
+                self.set_url_source(None)
+                self.url_text.delete(1.0, tk.END)
+                self.url_text.insert(tk.END, "\n".join(snapshot.urls))
+            self.start_downloads(resume=True)
+
+    def select_execution_mode(self, selected_var):
+        """Workers persistentes, orquestrador asyncio e coordenador são exclusivos: marcar um desmarca os outros."""
+        if selected_var.get():
+            for var in (self.warm_workers_var, self.async_orchestrator_var, self.coordinator_var):
+                if var is not selected_var:
+                    var.set(False)
+
+    def get_execution_mode(self):
+        if self.warm_workers_var.get():
+            return EXECUTION_WARM
+        if self.async_orchestrator_var.get():
+            return EXECUTION_ASYNC
+        if self.coordinator_var.get():
+            return EXECUTION_REMOTE
+        return EXECUTION_SUBPROCESS
+
     def get_audio_quality_flag(self):
         return self.audio_quality_var.get().split(' ')[0]
 
     def update_progress_text(self, total):
         """Atualiza o texto de progresso geral (Thread Principal)."""
         completed = int(self.progress_count.get())
-        if total > 0:
-            self.progress_text_var.set(f"Progresso do Lote: {completed} de {total} itens concluídos.")
+        if self.batch_total_final:
+            text = f"Progresso do Lote: {completed} de {total} itens concluídos." if total > 0 else ""
+        elif total > 0:
+            # Lista ainda sendo lida/expandida: o total conhecido é só um mínimo
+            text = f"Progresso do Lote: {completed} de {total}+ itens concluídos (lendo a lista...)."
         else:
-            self.progress_text_var.set("")
+            text = "Progresso do Lote: lendo a lista de URLs..."
+        self.progress_text_var.set(text)
 
     # --- Gerenciamento de UI de Progresso Individual ---
     def create_individual_progress_ui(self, url):
-        """Cria a UI para uma única tarefa de download/conversão (Thread Principal)."""
-        
-        with self.individual_progress_lock:
-            if url in self.individual_progress:
-                return
+        """Ocupa uma linha do painel para a tarefa que começou (Thread Principal)."""
+        self.progress_panel.start_job(url)
 
-            row_num = len(self.individual_progress)
-            
-            # 1. Frame para o item (Label + Bar)
-            item_frame = ttk.Frame(self.progress_display_frame)
-            item_frame.grid(row=row_num, column=0, sticky='ew', pady=2)
-            self.progress_display_frame.grid_columnconfigure(0, weight=1)
-
-            # 2. Variáveis de Estado
-            progress_var = tk.DoubleVar(value=0.0)
-            label_var = tk.StringVar(value=f"⏳ {url[:60]}... (0.0%)")
-
-            # 3. Label de Título/Status
-            title_label = ttk.Label(item_frame, textvariable=label_var, anchor='w', font=("Helvetica", 9, "bold"))
-            title_label.grid(row=0, column=0, sticky='ew')
-
-            # 4. Barra de Progresso
-            progress_bar = ttk.Progressbar(item_frame, orient='horizontal', mode='determinate', 
-                                         style="Red.Horizontal.TProgressbar", variable=progress_var)
-            progress_bar.grid(row=1, column=0, sticky='ew')
-
-            # 5. Armazenamento
-            self.individual_progress[url] = {
-                'var': progress_var,
-                'label_var': label_var,
-                'frame': item_frame,
-                'bar': progress_bar
-            }
-            
     def remove_individual_progress_ui(self, url):
-        """Remove a UI de uma tarefa de download/conversão concluída (Thread Principal)."""
-        with self.individual_progress_lock:
-            if url in self.individual_progress:
-                self.individual_progress[url]['frame'].destroy()
-                del self.individual_progress[url]
-                
-                # Reposiciona os elementos restantes para preencher o espaço
-                for i, (url, data) in enumerate(self.individual_progress.items()):
-                    data['frame'].grid(row=i, column=0, sticky='ew', pady=2)
-
-    def parse_and_update_progress(self, url, line):
-        """Atualiza a barra de progresso individual baseada na linha de log (Thread Principal)."""
-        
-        with self.individual_progress_lock:
-            if url not in self.individual_progress:
-                return 
-
-            data = self.individual_progress[url]
-
-            progress_match = re.search(r'\[download\]\s+(\d+\.\d+)%', line)
-            if progress_match:
-                percent = float(progress_match.group(1))
-                # Tenta extrair status, se falhar usa a linha inteira
-                status_text = line.split('[download]')[1].strip() if '[download]' in line else line.strip()
-                data['var'].set(percent)
-                data['label_var'].set(f"⬇️ {url[:60]}... ({percent:.1f}%) - {status_text}")
-            elif 'Post-processing' in line:
-                data['label_var'].set(f"🔄 {url[:60]}... (100%) - Conversão para MP3...")
-                data['var'].set(99.0)
-            
-            self.log_internal(line.strip(), 'process')
+        """Devolve a linha da tarefa concluída ao painel (Thread Principal)."""
+        self.progress_panel.end_job(url)
+
+    def update_individual_progress(self, url, progress):
+        """Aplica o ProgressRecord recebido do motor à linha da tarefa (Thread Principal)."""
+        self.progress_panel.update_job(url, progress)
     
     # --- NOVO: Verificador de Fila de Eventos ---
+    def handle_ui_event(self, msg_type, url, data):
+        """Aplica um único evento do motor à interface (Thread Principal)."""
+        if msg_type == EVENT_LOG:
+            message, level = data
+            self.log_internal(message, level)
+        elif msg_type == EVENT_JOB_START:
+            self.create_individual_progress_ui(url)
+        elif msg_type == EVENT_PROGRESS:
+            self.update_individual_progress(url, data)
+        elif msg_type == EVENT_JOB_END:
+            self.remove_individual_progress_ui(url)
+        elif msg_type == EVENT_BATCH_START:
+            self.ui_drain_max_ms = 0.0
+            self.batch_total_final = False
+            self.batch_failed = 0
+            self.progress_panel.set_counts(total=data, finished=0, failed=0)
+            self.update_progress_text(data)
+        elif msg_type == EVENT_BATCH_TOTAL:
+            # O total cresce conforme as playlists são expandidas (e exclui duplicadas)
+            self.batch_total_final = data['final']
+            self.progress_bar.config(maximum=max(data['total'], 1))
+            self.progress_panel.set_counts(total=data['total'])
+            self.update_progress_text(data['total'])
+        elif msg_type == EVENT_ITEM_DONE:
+            total_items = data['total']
+            self.progress_count.set(self.progress_count.get() + 1.0)
+            if not data['ok']:
+                self.batch_failed += 1
+            self.progress_panel.set_counts(total=total_items, finished=int(self.progress_count.get()),
+                                           failed=self.batch_failed)
+            self.update_progress_text(total_items)
+        elif msg_type == EVENT_BATCH_END:
+            self.finalize_download_process()
+        elif msg_type == EVENT_STAGE_STATS:
+            self.update_stage_stats(data)
+        elif msg_type == EVENT_CONCURRENCY:
+            self.update_concurrency_banner(data)
+        elif msg_type == EVENT_BANDWIDTH:
+            self.update_bandwidth_banner(data)
+
+    def update_concurrency_banner(self, state):
+        """Mostra os valores atuais de jobs/fragmentos no banner de otimização (Thread Principal)."""
+        text = (f"⚡ Otimização: {state['jobs']} downloads simultâneos e "
+                f"{state['fragments']} fragmentos concorrentes ativados")
+        if state['adaptive']:
+            text += " (adaptativo"
+            if state['throughput'] is not None:
+                text += f", {format_bytes(state['throughput'])}/s"
+            if state['cpu'] is not None:
+                text += f", CPU {state['cpu']:.0%}"
+            text += ")"
+        self.concurrency_var.set(text + ".")
+
+    def update_bandwidth_banner(self, state):
+        """Mostra as conexões e a banda reservadas pelos downloads em andamento (Thread Principal)."""
+        text = f"🚦 Banda: {state['jobs']} downloads com {state['connections']}"
+        text += " conexões" if state['max_connections'] is None else f"/{state['max_connections']} conexões"
+        if state['max_rate'] is None:
+            text += ", sem limite de taxa"
+        else:
+            text += f", {format_bytes(state['rate'])}/s de {format_bytes(state['max_rate'])}/s"
+        if len(state['hosts']) > 1:
+            text += " (" + ", ".join(f"{host}: {host_state['jobs']}"
+                                     for host, host_state in sorted(state['hosts'].items())) + ")"
+        self.bandwidth_var.set(text)
+
+    def get_bandwidth_limits(self):
+        """(conexões, bytes/s) dos campos de orçamento; None = sem limite. ValueError se inválidos."""
+        try:
+            max_connections = self.max_connections_var.get()
+        except tk.TclError:
+            raise ValueError("o número de conexões deve ser um inteiro (0 = sem limite)")
+        if max_connections < 0:
+            raise ValueError("o número de conexões não pode ser negativo")
+        return max_connections or None, parse_rate(self.max_rate_var.get())
+
+    def apply_bandwidth_limits(self, event=None):
+        """Aplica o orçamento digitado; com um lote em andamento vale a partir dos próximos downloads."""
+        try:
+            max_connections, max_rate = self.get_bandwidth_limits()
+        except ValueError as e:
+            messagebox.showerror("Erro", f"Orçamento de banda inválido: {e}")
+            return
+        if self.is_downloading and self.engine is not None:
+            self.engine.set_bandwidth_limits(max_connections, max_rate)
+        else:
+            self.update_bandwidth_banner({'jobs': 0, 'connections': 0, 'max_connections': max_connections,
+                                          'rate': 0, 'max_rate': max_rate, 'hosts': {}})
+
+    def update_stage_stats(self, stats):
+        """Mostra a ocupação das etapas de download/conversão e a fila entre elas (Thread Principal)."""
+        if not stats['transcode_workers']:
+            self.stage_stats_var.set(f"⬇️ Baixando: {stats['downloading']}/{stats['download_workers']}")
+            return
+        self.stage_stats_var.set(
+            f"⬇️ Baixando: {stats['downloading']}/{stats['download_workers']}  |  "
+            f"📥 Fila de conversão: {stats['handoff_queue']}/{stats['handoff_size']}  |  "
+            f"🔄 Convertendo: {stats['transcoding']}/{stats['transcode_workers']}")
+
+    def drain_ui_queue_coalesced(self, deadline):
+        """
+        Drena a fila até esvaziar ou até o prazo do tick. Progresso é coalescido por URL
+        e os logs do tick são inseridos de uma vez. Retorna True se sobrou trabalho.
+        """
+        latest_progress = {}
+        latest_snapshots = {}
+        log_entries = []
+
+        def flush():
+            self.log_bulk(log_entries)
+            for url, progress in latest_progress.items():
+                self.update_individual_progress(url, progress)
+            for msg_type, data in latest_snapshots.items():
+                self.handle_ui_event(msg_type, None, data)
+            log_entries.clear()
+            latest_progress.clear()
+            latest_snapshots.clear()
+
+        while time.perf_counter() < deadline:
+            try:
+                msg_type, url, data = self.ui_update_queue.get_nowait()
+            except Empty:
+                flush()
+                return False
+
+            if msg_type == EVENT_LOG:
+                log_entries.append(data)
+            elif msg_type == EVENT_PROGRESS:
+                latest_progress[url] = data
+            elif msg_type in self.SNAPSHOT_EVENTS:
+                latest_snapshots[msg_type] = data
+            else:
+                if msg_type == EVENT_JOB_END:
+                    latest_progress.pop(url, None)
+                elif msg_type == EVENT_BATCH_END:
+                    flush() # Mantém a ordem do log antes do resumo final
+                self.handle_ui_event(msg_type, url, data)
+
+        flush()
+        return not self.ui_update_queue.empty()
+
+    def update_ui_queue_stats(self, drain_ms):
+        """Registra profundidade da fila e latência da drenagem do último tick."""
+        self.ui_queue_depth = self.ui_update_queue.qsize()
+        self.ui_drain_ms = drain_ms
+        self.ui_drain_max_ms = max(self.ui_drain_max_ms, drain_ms)
+        text = f"Fila da UI: {self.ui_queue_depth} eventos | drenagem {drain_ms:.1f} ms (máx {self.ui_drain_max_ms:.1f} ms)"
+        if text != self.ui_queue_stats_text:
+            self.ui_queue_stats_text = text
+            self.ui_queue_stats_var.set(text)
+
     def check_ui_queue(self):
         """
-        Verifica a fila de eventos e processa todas as mensagens de forma segura 
+        Verifica a fila de eventos e processa as mensagens de forma segura 
         na thread principal para evitar congelamento.
         """
+        tick_start = time.perf_counter()
+        has_backlog = False
         try:
-            while not self.ui_update_queue.empty():
-                item = self.ui_update_queue.get_nowait()
-                msg_type, url, data = item
-                
-                if msg_type == 'LOG':
-                    message, level = data
-                    self.log_internal(message, level)
-                elif msg_type == 'CREATE_UI':
-                    self.create_individual_progress_ui(url)
-                elif msg_type == 'UPDATE_PROGRESS':
-                    line = data
-                    self.parse_and_update_progress(url, line)
-                elif msg_type == 'REMOVE_UI':
-                    self.remove_individual_progress_ui(url)
-                elif msg_type == 'UPDATE_BATCH':
-                    total_items = data
-                    self.update_progress_text(total_items)
-                elif msg_type == 'INCREMENT_COUNT':
-                    total_items = data
-                    self.progress_count.set(self.progress_count.get() + 1.0)
-                    self.update_progress_text(total_items)
+            if self.coalesce_ui_events:
+                has_backlog = self.drain_ui_queue_coalesced(tick_start + self.ui_drain_budget_ms / 1000.0)
+            else:
+                while not self.ui_update_queue.empty():
+                    self.handle_ui_event(*self.ui_update_queue.get_nowait())
                     
         except Exception as e:
             # Em caso de erro na fila, loga e continua
             print(f"Erro ao processar fila da UI: {e}") 
         finally:
-            # Agenda a próxima verificação
-            self.master.after(self.check_queue_interval, self.check_ui_queue)
+            self.update_ui_queue_stats((time.perf_counter() - tick_start) * 1000.0)
+            # Agenda a próxima verificação (imediata se o orçamento estourou com fila pendente)
+            self.master.after(1 if has_backlog else self.check_queue_interval, self.check_ui_queue)
             
     # --- Interação Principal e Controle de Estado ---
     
@@ -265,160 +552,85 @@ class YouTubeDownloaderApp:
             self.start_downloads()
 
     def stop_downloads(self):
-        """Sinaliza e tenta encerrar processos ativos."""
+        """Sinaliza o motor para encerrar os processos ativos."""
         if not self.is_downloading:
             return
 
-        self.log_message("🚨 [INTERRUPÇÃO] Sinal de parada enviado. Tentando encerrar processos ativos...", 'warn')
-        self.stop_event.set() 
-        
-        # Tentativa de Terminar Processos
-        for url, process in list(self.active_processes.items()): 
-            if process.poll() is None: 
-                try:
-                    process.terminate() 
-                    self.log_message(f"🚫 Terminado: {url[:40]}...", 'warn')
-                except Exception as e:
-                    self.log_message(f"Erro ao terminar processo {url[:40]}: {e}", 'error')
+        self.engine.stop()
 
         # Desabilita o botão até a finalização completa na thread orquestradora
         self.download_button.config(state='disabled', text="Aguardando threads finalizarem...")
 
 
-    def start_downloads(self):
+    def start_downloads(self, resume=False):
         """Inicia a validação e o thread principal de orquestração."""
-        urls = self.url_text.get(1.0, tk.END).strip()
-        url_list = [url.strip() for url in urls.splitlines() if url.strip()]
-        
-        if not url_list:
-            messagebox.showerror("Erro", "Por favor, cole pelo menos uma URL de vídeo ou playlist.")
+        if self.url_source is not None:
+            url_list = self.url_source
+            if not os.path.isfile(url_list.path):
+                messagebox.showerror("Erro", f"Arquivo de URLs não encontrado:\n{url_list.path}")
+                return
+        else:
+            pasted = UrlLines(self.url_text.get(1.0, tk.END).splitlines())
+            url_list = list(pasted)
+            if pasted.describe_invalid():
+                self.log_internal(f"⚠️ {pasted.describe_invalid()}", 'warn')
+            if not url_list:
+                messagebox.showerror("Erro", "Por favor, cole pelo menos uma URL de vídeo ou playlist.")
+                return
+
+        try:
+            max_connections, max_rate = self.get_bandwidth_limits()
+        except ValueError as e:
+            messagebox.showerror("Erro", f"Orçamento de banda inválido: {e}")
             return
 
         # --- Configuração de Estado ---
         self.is_downloading = True
-        self.stop_event.clear()
-        self.active_processes = {}
+        self.engine = DownloadEngine(
+            self.output_dir_var.get(),
+            audio_quality_flag=self.get_audio_quality_flag(),
+            max_workers=self.max_workers,
+            concurrent_fragments=self.concurrent_fragments,
+            ytdlp_executable=self.YTDLP_EXECUTABLE,
+            split_transcode=self.split_transcode_var.get(),
+            execution_mode=self.get_execution_mode(),
+            use_index=self.use_index_var.get(),
+            metadata_cache_dir=DEFAULT_CACHE_DIR if self.metadata_cache_var.get() else None,
+            use_journal=True,
+            resume=resume,
+            adaptive=self.adaptive_var.get(),
+            metrics=self.metrics_var.get(),
+            profile_mode=self.profile_mode,
+            prefer_copy=self.prefer_copy_var.get(),
+            staging_dir=DEFAULT_STAGING_DIR if self.staging_var.get() else None,
+            coordinator_address=self.coordinator_address,
+            max_connections=max_connections,
+            max_rate=max_rate,
+        )
+        # A GUI assina os mesmos eventos da CLI; a fila os leva para a thread principal
+        self.engine.subscribe(lambda msg_type, url, data: self.ui_update_queue.put((msg_type, url, data)))
 
         # --- Configuração de UI (Modo STOP) ---
         self.download_button.config(style='Stop.TButton', text="🛑 Parar Downloads")
         self.download_button.config(state='normal')
         
-        self.progress_bar.config(maximum=len(url_list))
+        # Com um arquivo importado o total só é conhecido ao fim da leitura (BATCH_TOTAL)
+        self.progress_bar.config(maximum=max(len(url_list), 1) if isinstance(url_list, list) else 1)
         self.progress_count.set(0.0)
         
-        # Adiciona à fila
-        self.ui_update_queue.put(('UPDATE_BATCH', None, len(url_list)))
-        
         self.log_message("-" * 40, 'warn')
         self.log_message("Iniciando o processo de download em segundo plano...", 'warn')
-        self.log_message(f"Total de {len(url_list)} itens a serem processados.", 'info')
+        if isinstance(url_list, list):
+            self.log_message(f"Total de {len(url_list)} URLs informadas (playlists serão expandidas por faixa).", 'info')
+        else:
+            self.log_message(f"Lendo as URLs de {url_list.name} sob demanda (o total cresce durante o lote).", 'info')
         self.log_message("-" * 40, 'warn')
 
-        download_orchestrator_thread = threading.Thread(target=self.orchestrate_downloads, args=(url_list,))
-        download_orchestrator_thread.start()
-
-    # --- Funções de Processamento ---
-    def download_single_url(self, url, output_dir, audio_quality_flag, total_items):
-        """Lógica de download para uma única URL em uma thread."""
-        
-        # Envia comando para criar a UI individual na thread principal
-        self.ui_update_queue.put(('CREATE_UI', url, None))
-
-        if self.stop_event.is_set():
-            self.log_message(f"🚫 [CANCELADO] Pulando {url[:40]}... (Orquestrador Parou)", 'warn')
-            self.ui_update_queue.put(('REMOVE_UI', url, None))
-            return
-
-        self.log_message(f"[INÍCIO] Processando URL: {url[:50]}...", 'process')
-        
-        CONCURRENT_FRAGMENTS = '64' 
-        
-        command = self.YTDLP_EXECUTABLE + [
-            '-x',
-            '--audio-format', 'mp3',
-            '--audio-quality', audio_quality_flag,
-            '--concurrent-fragments', CONCURRENT_FRAGMENTS, 
-            '-f', 'bestaudio/best', 
-            '-o', os.path.join(output_dir, '%(title)s.%(ext)s'),
-            url
-        ]
-        
-        process = None
-        try:
-            process = subprocess.Popen(
-                command, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT, 
-                universal_newlines=True,
-                bufsize=1
-            )
-            
-            self.active_processes[url] = process
-
-            # Log em tempo real, parse e checagem de interrupção
-            for line in iter(process.stdout.readline, ''):
-                if self.stop_event.is_set():
-                    self.log_message(f"🚫 [INTERROMPENDO] Encerrando subprocesso de {url[:40]}...", 'warn')
-                    process.terminate()
-                    break 
-
-                # NOVO: Envia a linha para a fila. A thread principal fará o parse e a atualização da UI.
-                self.ui_update_queue.put(('UPDATE_PROGRESS', url, line))
-
-            process.stdout.close()
-            return_code = process.wait()
-
-            # Atualização de Progresso Geral e Log Final
-            if not self.stop_event.is_set() and return_code == 0:
-                self.ui_update_queue.put(('INCREMENT_COUNT', None, total_items))
-                self.log_message(f"✅ [SUCESSO] Concluído: {url[:50]}...", 'success')
-            elif not self.stop_event.is_set() and return_code != 0:
-                self.ui_update_queue.put(('INCREMENT_COUNT', None, total_items))
-                self.log_message(f"❌ [FALHA] URL falhou com código {return_code}: {url[:50]}...", 'warn')
-                
-        except Exception as e:
-            self.ui_update_queue.put(('INCREMENT_COUNT', None, total_items))
-            self.log_message(f"🚨 [ERRO FATAL] Falha em {url[:50]}: {e}", 'error')
-        
-        finally:
-            if url in self.active_processes:
-                del self.active_processes[url]
-            
-            # Envia comando para remover a UI individual
-            self.ui_update_queue.put(('REMOVE_UI', url, None))
-            
-    def orchestrate_downloads(self, url_list):
-        """Orquestra os downloads usando um Pool de Threads."""
-        output_dir = self.output_dir_var.get()
-        audio_quality_flag = self.get_audio_quality_flag()
-        total_items = len(url_list)
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        try:
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = [executor.submit(self.download_single_url, url, output_dir, audio_quality_flag, total_items)
-                           for url in url_list]
-                
-                # Aguarda todos os futures, mas permite interrupção/exceções
-                for future in futures:
-                    try:
-                        future.result() 
-                    except Exception as e:
-                        self.log_message(f"🚨 [ERRO NA THREAD DE DOWNLOAD]: {e}", 'error')
-
-
-        except Exception as e:
-            self.log_message(f"🚨 [ERRO FATAL NO ORQUESTRADOR]: {e}", 'error')
-        finally:
-            # Chama a finalização da thread principal
-            self.master.after(0, self.finalize_download_process)
+        self.engine.start(url_list)
 
     def finalize_download_process(self):
         """Restaura o estado da UI e loga a conclusão (Thread Principal)."""
         self.is_downloading = False
-        self.stop_event.clear() 
-        self.active_processes = {}
 
         self.log_internal("=" * 40, 'warn')
         if self.progress_count.get() == self.progress_bar['maximum']:
@@ -466,21 +678,53 @@ class YouTubeDownloaderApp:
         
         dir_entry.pack(side=tk.LEFT, fill='x', expand=True, padx=5) 
         
+        ttk.Button(path_frame, text="🔁 Reconstruir Índice", command=self.rebuild_index).pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(path_frame, text="📁 Procurar...", command=self.select_output_directory).pack(side=tk.RIGHT)
         
         # Linha 2: Configuração de Qualidade
         config_frame = ttk.Frame(main_frame)
         config_frame.grid(row=2, column=0, sticky='w', pady=5)
+        quality_frame = ttk.Frame(config_frame)
+        quality_frame.pack(side=tk.TOP, fill='x')
         
-        ttk.Label(config_frame, text="Qualidade MP3:", anchor='w').pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(quality_frame, text="Qualidade MP3:", anchor='w').pack(side=tk.LEFT, padx=(0, 5))
         
         quality_options = ['0 (320 kbps - Melhor)', '5 (192 kbps - Padrão)', '10 (128 kbps - Econômico)']
-        self.quality_combobox = ttk.Combobox(config_frame, textvariable=self.audio_quality_var, values=quality_options, state='readonly', width=30, style='Dark.TCombobox')
+        self.quality_combobox = ttk.Combobox(quality_frame, textvariable=self.audio_quality_var, values=quality_options, state='readonly', width=30, style='Dark.TCombobox')
         self.quality_combobox.pack(side=tk.LEFT)
         self.quality_combobox.current(0)
-
-        # Linha 3: Entrada de URLs Label
-        ttk.Label(main_frame, text="🔗 Cole as URLs dos vídeos/playlists (uma por linha):", anchor='w').grid(row=3, column=0, sticky='ew', pady=(10, 2))
+        
+        # Opções do lote em grade (uma linha só não cabe na largura mínima da janela)
+        options_frame = ttk.Frame(config_frame)
+        options_frame.pack(side=tk.TOP, fill='x', pady=(5, 0))
+        options = [
+            ("⚙️ Separar download e conversão (pool de CPU)", self.split_transcode_var, None),
+            ("♨️ Workers persistentes", self.warm_workers_var,
+             lambda: self.select_execution_mode(self.warm_workers_var)),
+            ("🔀 Orquestrador asyncio", self.async_orchestrator_var,
+             lambda: self.select_execution_mode(self.async_orchestrator_var)),
+            ("🌐 Coordenar workers remotos", self.coordinator_var,
+             lambda: self.select_execution_mode(self.coordinator_var)),
+            ("⏭️ Pular já baixados", self.use_index_var, None),
+            ("🗃️ Cache de metadados", self.metadata_cache_var, None),
+            ("🎛️ Concorrência adaptativa", self.adaptive_var, None),
+            ("⏩ Copiar MP3 sem recodificar", self.prefer_copy_var, None),
+            ("💽 Temporários no disco local", self.staging_var, None),
+            ("📈 Métricas", self.metrics_var, None),
+        ]
+        for position, (text, variable, command) in enumerate(options):
+            ttk.Checkbutton(options_frame, text=text, variable=variable, command=command).grid(
+                row=position // self.OPTION_COLUMNS, column=position % self.OPTION_COLUMNS, sticky='w', padx=(0, 15))
+
+        # Linha 3: Entrada de URLs Label + importação de arquivo
+        urls_header_frame = ttk.Frame(main_frame)
+        urls_header_frame.grid(row=3, column=0, sticky='ew', pady=(10, 2))
+        ttk.Label(urls_header_frame, text="🔗 Cole as URLs dos vídeos/playlists (uma por linha):", anchor='w').pack(side=tk.LEFT)
+        ttk.Button(urls_header_frame, text="✖", width=3,
+                   command=lambda: self.set_url_source(None)).pack(side=tk.RIGHT)
+        ttk.Button(urls_header_frame, text="📄 Importar Arquivo...", command=self.import_url_file).pack(side=tk.RIGHT, padx=(5, 5))
+        ttk.Label(urls_header_frame, textvariable=self.url_source_var, anchor='e',
+                  foreground=ACCENT_YELLOW).pack(side=tk.RIGHT, padx=(10, 0))
 
         # Linha 4: Entrada de URLs Text Area
         self.url_text = scrolledtext.ScrolledText(main_frame, height=8, width=50, wrap=tk.WORD, font=("Arial", 10), 
@@ -491,8 +735,24 @@ class YouTubeDownloaderApp:
         # Linha 5: Feedback de Otimização
         optimization_frame = ttk.Frame(main_frame)
         optimization_frame.grid(row=5, column=0, sticky='ew', pady=5)
-        ttk.Label(optimization_frame, text=f"⚡ Otimização: {self.max_workers} downloads simultâneos e 64 fragmentos concorrentes ativados.", 
+        ttk.Label(optimization_frame, textvariable=self.concurrency_var, 
                   foreground=ACCENT_YELLOW, background='#444444', padding="5").pack(fill='x')
+        ttk.Label(optimization_frame, textvariable=self.stage_stats_var, 
+                  foreground='#909090', background='#444444', padding="5 0 5 5").pack(fill='x')
+        bandwidth_frame = ttk.Frame(optimization_frame)
+        bandwidth_frame.pack(fill='x')
+        ttk.Button(bandwidth_frame, text="Aplicar", command=self.apply_bandwidth_limits).pack(side=tk.RIGHT)
+        rate_entry = ttk.Entry(bandwidth_frame, textvariable=self.max_rate_var, width=7)
+        rate_entry.pack(side=tk.RIGHT, padx=(0, 5))
+        rate_entry.bind('<Return>', self.apply_bandwidth_limits)
+        ttk.Label(bandwidth_frame, text="Banda (ex.: 8M):").pack(side=tk.RIGHT, padx=(10, 5))
+        connections_spinbox = ttk.Spinbox(bandwidth_frame, from_=0, to=1024, increment=8, width=5,
+                                          textvariable=self.max_connections_var)
+        connections_spinbox.pack(side=tk.RIGHT)
+        connections_spinbox.bind('<Return>', self.apply_bandwidth_limits)
+        ttk.Label(bandwidth_frame, text="Conexões (0 = livre):").pack(side=tk.RIGHT, padx=(10, 5))
+        ttk.Label(bandwidth_frame, textvariable=self.bandwidth_var,
+                  foreground='#909090', background='#444444', padding="5 0 5 5").pack(side=tk.LEFT, fill='x', expand=True)
 
         # Linha 6: Botão de Download
         self.download_button = ttk.Button(main_frame, text="🚀 Iniciar Download & Conversão para MP3", 
@@ -508,8 +768,11 @@ class YouTubeDownloaderApp:
                                             style="Red.Horizontal.TProgressbar", variable=self.progress_count)
         self.progress_bar.grid(row=8, column=0, sticky='ew', padx=0, pady=2)
         
-        # Linha 9: Texto de Progresso Detalhado
-        ttk.Label(main_frame, textvariable=self.progress_text_var, anchor='w', foreground='#909090').grid(row=9, column=0, sticky='w', pady=(2, 5))
+        # Linha 9: Texto de Progresso Detalhado + Métricas da Fila da UI
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=9, column=0, sticky='ew', pady=(2, 5))
+        ttk.Label(status_frame, textvariable=self.progress_text_var, anchor='w', foreground='#909090').pack(side=tk.LEFT)
+        ttk.Label(status_frame, textvariable=self.ui_queue_stats_var, anchor='e', foreground='#606060').pack(side=tk.RIGHT)
         
         # Linha 10: Progresso Individual Label
         ttk.Label(main_frame, text="Progresso Individual:", anchor='w', foreground=ACCENT_YELLOW).grid(row=10, column=0, sticky='ew', pady=(10, 2))
@@ -518,11 +781,29 @@ class YouTubeDownloaderApp:
         self.progress_display_frame = ttk.Frame(main_frame)
         self.progress_display_frame.grid(row=11, column=0, sticky='ew', padx=0, pady=5)
         
-        # Linha 12: Log Console (Expansível)
+        # Linha 12: Controles do Log (limite de linhas, níveis visíveis e excedente em disco)
+        log_controls_frame = ttk.Frame(main_frame)
+        log_controls_frame.grid(row=12, column=0, sticky='ew', pady=(5, 0))
+        
+        ttk.Label(log_controls_frame, text="Log - máx. linhas:", anchor='w').pack(side=tk.LEFT, padx=(0, 5))
+        max_lines_spinbox = ttk.Spinbox(log_controls_frame, from_=100, to=100000, increment=500, width=7,
+                                        textvariable=self.log_max_lines_var, command=self.apply_log_settings)
+        max_lines_spinbox.pack(side=tk.LEFT, padx=(0, 10))
+        max_lines_spinbox.bind('<Return>', self.apply_log_settings)
+        max_lines_spinbox.bind('<FocusOut>', self.apply_log_settings)
+        
+        for level in LOG_LEVELS:
+            ttk.Checkbutton(log_controls_frame, text=level, variable=self.log_level_vars[level],
+                            command=self.apply_log_settings).pack(side=tk.LEFT, padx=2)
+        
+        ttk.Checkbutton(log_controls_frame, text="💾 Excedente em disco", variable=self.log_spill_var,
+                        command=self.apply_log_settings).pack(side=tk.RIGHT)
+        
+        # Linha 13: Log Console (Expansível)
         self.log_text = scrolledtext.ScrolledText(main_frame, height=8, width=50, wrap=tk.WORD, font=("Consolas", 9), 
                                                  state='disabled', bg=LOG_BG, fg='#E0E0E0', bd=0, padx=10, pady=10)
-        self.log_text.grid(row=12, column=0, sticky='nsew', padx=0, pady=5)
-        main_frame.grid_rowconfigure(12, weight=1)
+        self.log_text.grid(row=13, column=0, sticky='nsew', padx=0, pady=5)
+        main_frame.grid_rowconfigure(13, weight=1)
 
 
 if __name__ == '__main__':